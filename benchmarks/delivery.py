@@ -0,0 +1,104 @@
+"""Throughput benchmark for the delivery backends, without any network.
+
+Sends messages through the locmem and file backends one at a time and in
+batches, and through the HTTP SMS backend against a local keep-alive server,
+with and without reusing its connection.
+
+Usage::
+
+    python benchmarks/delivery.py [messages]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_phone_auth_project.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from phone_auth.delivery import Message  # noqa: E402
+from phone_auth.delivery import filebased, locmem  # noqa: E402
+from phone_auth.delivery.httpsms import SmsBackend  # noqa: E402
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def run(label, count, send):
+    start = time.perf_counter()
+    send()
+    elapsed = time.perf_counter() - start
+    print(f"{label:40} {count / elapsed:12.0f} messages/s")
+
+
+def one_by_one(backend, messages):
+    for message in messages:
+        backend.send_messages([message])
+
+
+def reconnecting(backend, messages):
+    for message in messages:
+        backend.send_messages([message])
+        backend.close()
+
+
+def main(count):
+    messages = [
+        Message("sms", f"+9198765{i:05d}", "", f"Your verification code is {i:06d}")
+        for i in range(count)
+    ]
+
+    backend = locmem.DeliveryBackend()
+    run("locmem, one per call", count, lambda: one_by_one(backend, messages))
+    run("locmem, batched", count, lambda: backend.send_messages(messages))
+    locmem.outbox.clear()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = filebased.DeliveryBackend(os.path.join(tmp, "messages.jsonl"))
+        run("file, one per call", count, lambda: one_by_one(backend, messages))
+        run("file, batched", count, lambda: backend.send_messages(messages))
+        backend.close()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/send"
+    try:
+        backend = SmsBackend(url, batch_size=1)
+        run(
+            "http, new connection per message",
+            count,
+            lambda: reconnecting(backend, messages),
+        )
+        run("http, kept-alive connection", count, lambda: one_by_one(backend, messages))
+        backend.close()
+        backend = SmsBackend(url, batch_size=100)
+        run(
+            "http, kept-alive, 100 per request",
+            count,
+            lambda: backend.send_messages(messages),
+        )
+        backend.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
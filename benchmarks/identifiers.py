@@ -0,0 +1,71 @@
+"""Micro-benchmark for login identifier classification.
+
+Compares ``phone_auth.identifiers.classify`` with the form-based path
+(``PhoneValidationForm`` / ``EmailValidationForm`` / ``UsernameValidationForm``)
+that ``CustomAuthBackend`` used previously. No database is touched.
+
+``classify`` memoizes parsed phone numbers, so it is timed twice: warm, the
+same login repeated, and cold, with the parse cache cleared before each call
+like a login that hasn't been seen before.
+
+Usage::
+
+    python benchmarks/identifiers.py [iterations]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_phone_auth_project.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from phone_auth.forms import (  # noqa: E402
+    EmailValidationForm,
+    PhoneValidationForm,
+    UsernameValidationForm,
+)
+from phone_auth.identifiers import _parse_phone, classify  # noqa: E402
+
+LOGINS = [
+    "+919876543210",
+    "someone@example.com",
+    "some.user_name",
+    "not a valid login!",
+]
+
+
+def form_classify(login):
+    if PhoneValidationForm({"phone": login}).is_valid():
+        return "phone"
+    if EmailValidationForm({"email": login}).is_valid():
+        return "email"
+    if UsernameValidationForm({"username": login}).is_valid():
+        return "username"
+    return None
+
+
+def cold_classify(login):
+    _parse_phone.cache_clear()
+    return classify(login)
+
+
+def main(iterations):
+    for login in LOGINS:
+        forms_time = timeit.timeit(lambda: form_classify(login), number=iterations)
+        warm_time = timeit.timeit(lambda: classify(login), number=iterations)
+        cold_time = timeit.timeit(lambda: cold_classify(login), number=iterations)
+        print(
+            f"{login!r:24} forms: {forms_time / iterations * 1e6:8.2f}us"
+            f"  classify warm: {warm_time / iterations * 1e6:8.2f}us"
+            f" ({forms_time / warm_time:5.1f}x)"
+            f"  cold: {cold_time / iterations * 1e6:8.2f}us"
+            f" ({forms_time / cold_time:5.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
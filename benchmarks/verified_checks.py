@@ -0,0 +1,141 @@
+"""Benchmark for the verified phone/email checks of the decorators and mixins.
+
+Fills an in-memory SQLite database with users having several phone numbers
+and email addresses, then times the checks with and without the
+(user, is_verified) and partial "verified only" indexes; other indexes are
+kept:
+
+- the previous checks, one ``EXISTS`` query per decorator/mixin;
+- ``phone_auth.status.verified_flags_queryset``, both flags in one query.
+
+Only the database work is timed; the query plans are printed too. On a
+networked database, the flags query also saves a round trip per check.
+
+Usage::
+
+    python benchmarks/verified_checks.py [users] [contacts_per_user]
+"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_phone_auth_project.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from phone_auth.models import EmailAddress, PhoneNumber  # noqa: E402
+from phone_auth.status import verified_flags_queryset  # noqa: E402
+
+SAMPLE = 5000
+# The indexes serving the verified checks; the other indexes stay in place.
+VERIFIED_INDEXES = {
+    "phone_auth_phone_user_ver_idx",
+    "phone_auth_phone_verified_idx",
+    "phone_auth_email_user_ver_idx",
+    "phone_auth_email_verified_idx",
+}
+
+
+def populate(users, contacts_per_user):
+    User.objects.bulk_create(
+        [User(username=f"user{i}") for i in range(users)], batch_size=5000
+    )
+    user_ids = list(User.objects.values_list("pk", flat=True))
+    PhoneNumber.objects.bulk_create(
+        [
+            PhoneNumber(
+                user_id=user_id,
+                phone=f"+9190{user_id:06d}{j:02d}",
+                is_verified=j == 0 and user_id % 2 == 0,
+            )
+            for user_id in user_ids
+            for j in range(contacts_per_user)
+        ],
+        batch_size=5000,
+    )
+    EmailAddress.objects.bulk_create(
+        [
+            EmailAddress(
+                user_id=user_id,
+                email=f"user{user_id}.{j}@example.com",
+                is_verified=j == 0 and user_id % 3 == 0,
+            )
+            for user_id in user_ids
+            for j in range(contacts_per_user)
+        ],
+        batch_size=5000,
+    )
+    return user_ids
+
+
+def exists_queries(user_id):
+    return [
+        model.objects.filter(user_id=user_id, is_verified=True).query.exists()
+        for model in (PhoneNumber, EmailAddress)
+    ]
+
+
+def flags_queries(user_id):
+    return [verified_flags_queryset(user_id).query]
+
+
+def run(label, user_ids):
+    """Time the SQL of each check, compiled beforehand so that only the
+    database work is measured."""
+
+    print(label)
+    for name, queries in (
+        ("2 x EXISTS", exists_queries),
+        ("flags query", flags_queries),
+    ):
+        statements = [
+            query.sql_with_params() for pk in user_ids for query in queries(pk)
+        ]
+        with connection.cursor() as cursor:
+
+            def execute():
+                for sql, params in statements:
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+
+            elapsed = min(timeit.repeat(execute, number=1, repeat=3))
+        print(
+            f"  {name:12} {elapsed / len(user_ids) * 1e6:8.1f}us/check"
+            f"  {len(statements) // len(user_ids)} queries/check"
+        )
+    print(verified_flags_queryset(user_ids[0]).explain())
+
+
+def main(users, contacts_per_user):
+    connection.creation.create_test_db(verbosity=0)
+    user_ids = populate(users, contacts_per_user)
+    sample = random.Random(0).sample(user_ids, min(SAMPLE, len(user_ids)))
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    run("with indexes", sample)
+
+    with connection.schema_editor() as schema_editor:
+        for model in (PhoneNumber, EmailAddress):
+            for index in model._meta.indexes:
+                if index.name in VERIFIED_INDEXES:
+                    schema_editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    run("without the verified indexes", sample)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    )
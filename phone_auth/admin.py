@@ -1,13 +1,249 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import StartsWith
+from django.utils.functional import cached_property
+from phonenumbers import COUNTRY_CODE_TO_REGION_CODE
 
-from .models import EmailAddress, PhoneNumber
+from . import app_settings
+from .forms import PhoneEmailVerificationForm
+from .models import EmailAddress, OutboxMessage, PhoneNumber
+from .status import invalidate_contact_statuses
 
+# Query string parameter holding the primary key the page starts after.
+AFTER_VAR = "after"
 
-@admin.register(PhoneNumber)
-class PhoneNumberAdmin(admin.ModelAdmin):
+
+def estimated_count(queryset):
+    """Return the number of rows of ``queryset``'s table estimated by the
+    database statistics, or None when the backend has no estimate."""
+
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(table)],
+            )
+        elif connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 for tables that were never analyzed.
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids ``COUNT(*)`` over large tables: unfiltered
+    querysets use the database statistics and filtered ones count at most
+    ``count_cap`` rows."""
+
+    estimate_threshold = 100000
+    count_cap = 10000
+
+    @cached_property
+    def count(self):
+        if self.object_list.query.is_empty():
+            return 0
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < self.estimate_threshold:
+            return super().count
+        if not self.object_list.query.where:
+            return estimate
+        return self.object_list[: self.count_cap].count()
+
+
+class KeysetChangeList(ChangeList):
+    """Change list paginated with a primary key cursor (``?after=<pk>``)
+    when sorted by the default ``-pk`` ordering, so deep pages cost the same
+    as the first one. Lists sorted by a column use page numbers."""
+
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.after = int(request.GET[AFTER_VAR])
+        except (KeyError, ValueError):
+            self.after = None
+        self.keyset = ORDER_VAR not in request.GET
+        self.next_after = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(AFTER_VAR, None)
+        return params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter, search and sort links start from the first page.
+        remove = [*(remove or []), AFTER_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        if not self.keyset:
+            return super().get_results(request)
+
+        self.paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        queryset = self.queryset
+        if self.after is not None:
+            queryset = queryset.filter(pk__lt=self.after)
+        results = list(queryset[: self.list_per_page + 1])
+        if len(results) > self.list_per_page:
+            results = results[: self.list_per_page]
+            self.next_after = results[-1].pk
+
+        self.result_count = self.paginator.count
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.full_result_count = (
+            self.root_queryset.count() if self.show_full_result_count else None
+        )
+        self.show_admin_actions = not self.show_full_result_count or bool(
+            self.full_result_count
+        )
+        self.result_list = results
+        self.can_show_all = False
+        self.multi_page = self.after is not None or self.next_after is not None
+
+    def first_page_url(self):
+        return self.get_query_string()
+
+    def next_page_url(self):
+        return self.get_query_string({AFTER_VAR: self.next_after})
+
+
+class CountryCodeFilter(admin.SimpleListFilter):
+    title = "country code"
+    parameter_name = "country_code"
+
+    def lookups(self, request, model_admin):
+        return [
+            (str(code), f"+{code} ({', '.join(regions[:3])})")
+            for code, regions in sorted(COUNTRY_CODE_TO_REGION_CODE.items())
+        ]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        # A prefix of the E.164 value, served by the phone prefix index.
+        lookup = Q(phone__startswith=f"+{self.value()}")
+        if app_settings.INTEGER_PHONE_LOOKUPS and self.value().isdigit():
+            # Served by the (country_code, national_number) index; numbers
+            # that aren't split into it have no country_code.
+            lookup = Q(country_code=int(self.value())) | (Q(country_code=None) & lookup)
+        return queryset.filter(lookup)
+
+
+class ContactAdmin(admin.ModelAdmin):
+    """Admin of PhoneNumber/EmailAddress rows, usable on very large tables.
+
+    Counts are estimated or capped, users are joined instead of fetched per
+    row, pages use a primary key cursor and searches only match prefixes of
+    the indexed value.
+    """
+
+    list_select_related = ("user",)
+    list_filter = ("is_verified",)
     raw_id_fields = ("user",)
+    ordering = ("-pk",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ("mark_verified", "mark_unverified", "resend_verification")
+    resend_batch_size = 100
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if search_term:
+            lookup = self.get_search_lookup(search_term)
+            queryset = queryset.none() if lookup is None else queryset.filter(lookup)
+        return queryset, False
+
+    def get_search_lookup(self, search_term):
+        """Return the lookup matching ``search_term``, or None if no row can
+        match it."""
+
+        raise NotImplementedError
+
+    def _set_verified(self, queryset, is_verified):
+        queryset = queryset.filter(is_verified=not is_verified)
+        user_ids = None
+        if app_settings.CONTACT_STATUS_CACHE_TIMEOUT:
+            user_ids = set(queryset.values_list("user_id", flat=True))
+        count = queryset.update(is_verified=is_verified)
+        if user_ids:
+            invalidate_contact_statuses(user_ids)
+        return count
+
+    @admin.action(description="Mark selected as verified")
+    def mark_verified(self, request, queryset):
+        count = self._set_verified(queryset, True)
+        self.message_user(request, f"{count} marked as verified.", messages.SUCCESS)
+
+    @admin.action(description="Mark selected as unverified")
+    def mark_unverified(self, request, queryset):
+        count = self._set_verified(queryset, False)
+        self.message_user(request, f"{count} marked as unverified.", messages.SUCCESS)
+
+    @admin.action(description="Resend verification to selected")
+    def resend_verification(self, request, queryset):
+        queryset = (
+            queryset.filter(is_verified=False).select_related("user").order_by("pk")
+        )
+        form = PhoneEmailVerificationForm()
+        sent = last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[: self.resend_batch_size])
+            if not batch:
+                break
+            form.send_verifications(batch, sender=self.__class__)
+            sent += len(batch)
+            last_pk = batch[-1].pk
+        self.message_user(request, f"{sent} verifications sent.", messages.SUCCESS)
+
+
+@admin.register(PhoneNumber)
+class PhoneNumberAdmin(ContactAdmin):
+    list_display = ("phone", "user", "is_verified")
+    list_filter = ("is_verified", CountryCodeFilter)
+    search_fields = ("phone",)
+    search_help_text = "Start of the phone number, with its country code."
+
+    def get_search_lookup(self, search_term):
+        prefix = "".join(char for char in search_term if char.isdigit())
+        if not prefix:
+            # "+" alone would match every row.
+            return None
+        return Q(phone__startswith=f"+{prefix}")
 
 
 @admin.register(EmailAddress)
-class EmailAddressAdmin(admin.ModelAdmin):
+class EmailAddressAdmin(ContactAdmin):
+    list_display = ("email", "user", "is_verified")
+    search_fields = ("email",)
+    search_help_text = "Start of the email address."
+
+    def get_search_lookup(self, search_term):
+        # Matches the expression of the case-insensitive prefix index.
+        return StartsWith(Lower("email"), search_term.lower())
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("signal", "user", "attempts", "available_at", "created_at")
+    list_filter = ("signal",)
     raw_id_fields = ("user",)
+    # Payloads hold password reset links and verification codes.
+    exclude = ("payload",)
@@ -0,0 +1,292 @@
+"""JSON endpoints for SPA and mobile clients, backed by the same forms as
+the HTML views but rendering no template.
+
+Requests may be form-encoded or JSON. Responses are compact JSON; failures
+carry a stable ``error`` code and, for invalid forms, the error codes of
+each field. Users are authenticated by their session or by a bearer token
+(see ``phone_auth.bearer``). These views are sync, under both values of
+ASYNC_VIEWS.
+"""
+
+import json
+
+from django.contrib.auth import authenticate, login, logout
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.debug import sensitive_post_parameters
+
+from .bearer import TokenUser, issue_tokens, refresh_tokens, revoke_refresh_token
+from .forms import (
+    AddEmailForm,
+    AddPhoneForm,
+    PhoneEmailVerificationForm,
+    PhoneLoginForm,
+    PhoneRegisterForm,
+    PhoneVerificationCodeForm,
+)
+from .models import EmailAddress, PhoneNumber
+from .throttling import login_throttle
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={"separators": (",", ":")}
+    )
+
+
+def error_response(code, status=400, **extra):
+    return json_response({"error": code, **extra}, status=status)
+
+
+def form_error_response(form, status=400):
+    """Return the error codes of ``form``'s fields, e.g.
+    ``{"error":"invalid","fields":{"phone":["unique"]}}``. Errors raised
+    without a code are reported as ``"invalid"``."""
+
+    fields = {
+        field: [error["code"] or "invalid" for error in errors]
+        for field, errors in form.errors.get_json_data().items()
+    }
+    return error_response("invalid", status=status, fields=fields)
+
+
+def request_data(request):
+    """Return the fields of a JSON or form-encoded request body, or None if
+    the JSON is malformed."""
+
+    if request.content_type != "application/json":
+        return request.POST
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def request_user(request):
+    """Return the user instance of the request, fetching it for requests
+    authenticated by an access token."""
+
+    if isinstance(request.user, TokenUser):
+        return request.user.get_user()
+    return request.user
+
+
+@method_decorator(never_cache, name="dispatch")
+class JSONView(View):
+    """Base of the JSON views: parses the body of POST requests and passes
+    it to ``handle()``."""
+
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs):
+        data = request_data(request)
+        if data is None:
+            return error_response("invalid_json")
+        return self.handle(data)
+
+    def handle(self, data):
+        raise NotImplementedError
+
+    def check_credentials(self, data):
+        """Return the user authenticated by the ``login`` and ``password``
+        of ``data``, or an error response."""
+
+        form = PhoneLoginForm(self.request, data=data)
+        if not form.is_valid():
+            return None, form_error_response(form)
+
+        throttle = login_throttle(self.request, form.cleaned_data["login"])
+        retry_after = throttle.acquire()
+        if retry_after:
+            response = error_response("throttled", status=429)
+            response["Retry-After"] = str(retry_after)
+            return None, response
+
+        user = authenticate(self.request, **form.cleaned_data)
+        if user is None:
+            return None, error_response("invalid_credentials")
+        # Only failed logins are counted.
+        throttle.release()
+        return user, None
+
+
+@method_decorator(csrf_protect, name="dispatch")
+class APIView(JSONView):
+    """JSON view for browsers and token clients. Session requests need a
+    CSRF token like the HTML views; ``BearerTokenMiddleware`` lifts the
+    check for token requests and sets ``request.user`` to a ``TokenUser``.
+
+    ``login_required`` views answer 401 to anonymous users.
+    """
+
+    accepts_token_user = True
+    login_required = False
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.login_required and not request.user.is_authenticated:
+            return error_response("not_authenticated", status=401)
+        return super().dispatch(request, *args, **kwargs)
+
+
+@method_decorator(sensitive_post_parameters(), name="dispatch")
+class SignupAPIView(APIView):
+    """Register a user, like ``PhoneSignupView``"""
+
+    def handle(self, data):
+        if self.request.user.is_authenticated:
+            return error_response("already_authenticated", status=403)
+        form = PhoneRegisterForm(data)
+        if not form.is_valid():
+            return form_error_response(form)
+        form.save()
+        if form.errors:
+            return form_error_response(form)
+        return json_response({}, status=201)
+
+
+@method_decorator(sensitive_post_parameters(), name="dispatch")
+class LoginAPIView(APIView):
+    """Log in with a session, like ``PhoneLoginView``"""
+
+    def handle(self, data):
+        user, response = self.check_credentials(data)
+        if user is None:
+            return response
+        login(self.request, user)
+        return json_response({"user_id": user.pk})
+
+
+class LogoutAPIView(APIView):
+    """End the session"""
+
+    def handle(self, data):
+        logout(self.request)
+        return json_response({})
+
+
+class ContactsAPIView(APIView):
+    """List the user's phone numbers and email addresses"""
+
+    http_method_names = ["get"]
+    login_required = True
+
+    def get(self, request, *args, **kwargs):
+        user_id = request.user.pk
+        phones = PhoneNumber.objects.filter(user_id=user_id).order_by("pk")
+        emails = EmailAddress.objects.filter(user_id=user_id).order_by("pk")
+        return json_response(
+            {
+                "phones": [
+                    {"id": pk, "phone": str(phone), "verified": is_verified}
+                    for pk, phone, is_verified in phones.values_list(
+                        "pk", "phone", "is_verified"
+                    )
+                ],
+                "emails": [
+                    {"id": pk, "email": email, "verified": is_verified}
+                    for pk, email, is_verified in emails.values_list(
+                        "pk", "email", "is_verified"
+                    )
+                ],
+            }
+        )
+
+
+class AddContactAPIView(APIView):
+    login_required = True
+    form_class = None
+
+    def handle(self, data):
+        form = self.form_class(data)
+        if not form.is_valid():
+            return form_error_response(form)
+        form.save(request_user(self.request))
+        if form.errors:
+            return form_error_response(form)
+        return json_response({}, status=201)
+
+
+class AddPhoneAPIView(AddContactAPIView):
+    form_class = AddPhoneForm
+
+
+class AddEmailAPIView(AddContactAPIView):
+    form_class = AddEmailForm
+
+
+class VerificationAPIView(APIView):
+    """Send the verification of one of the user's contacts, given its
+    ``method`` (``"phone"`` or ``"email"``) and ``pk``"""
+
+    login_required = True
+
+    def handle(self, data):
+        form = PhoneEmailVerificationForm(data)
+        if not form.is_valid():
+            return form_error_response(form)
+        form.save(request_user(self.request))
+        if form.result == form.NOT_FOUND:
+            return error_response(form.NOT_FOUND, status=404)
+        if form.result == form.ALREADY_VERIFIED:
+            return error_response(form.ALREADY_VERIFIED, status=409)
+        return json_response({})
+
+
+class VerificationCodeAPIView(APIView):
+    """Verify a phone number with the code it was sent"""
+
+    login_required = True
+
+    def handle(self, data):
+        form = PhoneVerificationCodeForm(request_user(self.request), data)
+        if not form.is_valid():
+            return form_error_response(form)
+        phone_obj = form.save()
+        if phone_obj is None:
+            if form.has_error("code", "throttled"):
+                return error_response("throttled", status=429)
+            return form_error_response(form)
+        return json_response({"id": phone_obj.pk, "phone": str(phone_obj.phone)})
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+@method_decorator(sensitive_post_parameters(), name="dispatch")
+class TokenObtainView(JSONView):
+    """Exchange a login (phone, email or username) and password for an
+    access token and a refresh token."""
+
+    def handle(self, data):
+        user, response = self.check_credentials(data)
+        if user is None:
+            return response
+        return json_response(issue_tokens(user))
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class TokenRefreshView(JSONView):
+    """Exchange a refresh token for a new access token and refresh token"""
+
+    def handle(self, data):
+        refresh_token = data.get("refresh_token")
+        if not isinstance(refresh_token, str) or not refresh_token:
+            return error_response("invalid_request")
+        tokens = refresh_tokens(refresh_token)
+        if tokens is None:
+            return error_response("invalid_grant")
+        return json_response(tokens)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class TokenRevokeView(JSONView):
+    """Revoke a refresh token and the ones it was rotated from"""
+
+    def handle(self, data):
+        refresh_token = data.get("refresh_token")
+        if not isinstance(refresh_token, str) or not refresh_token:
+            return error_response("invalid_request")
+        revoke_refresh_token(refresh_token)
+        return json_response({})
@@ -1,11 +1,16 @@
+import os
 import sys
+from types import MappingProxyType
 
 from django.conf import settings
-
-from .exceptions import AuthenticationMethodEmpty
+from django.core.signals import setting_changed
 
 
 class AppSettings:
+    """Reads phone_auth's settings, with their defaults, from Django's
+    settings. Every property access reads the setting again; the module is
+    replaced by a ``SettingsSnapshot`` of these properties."""
+
     class AuthenticationMethod:
         USERNAME = "username"
         EMAIL = "email"
@@ -18,10 +23,8 @@ class AppSettings:
             self.AuthenticationMethod.EMAIL,
             self.AuthenticationMethod.PHONE,
         }
-        auth_methods = self._setting("AUTHENTICATION_METHODS", default)
-        if not auth_methods:
-            raise AuthenticationMethodEmpty
-        return auth_methods
+        # Validated by the phone_auth.E001 system check.
+        return self._setting("AUTHENTICATION_METHODS", default)
 
     @property
     def REGISTER_USERNAME_REQUIRED(self):
@@ -58,13 +61,198 @@ class AppSettings:
         default = "/"
         return self._setting("LOGOUT_REDIRECT_URL", default)
 
+    @property
+    def PASSWORD_HASHER_MAX_WORKERS(self):
+        default = min(4, os.cpu_count() or 1)
+        return self._setting("PASSWORD_HASHER_MAX_WORKERS", default)
+
+    @property
+    def LOGIN_IDENTIFIER_LOOKUPS(self):
+        default = False
+        return self._setting("LOGIN_IDENTIFIER_LOOKUPS", default)
+
+    @property
+    def INTEGER_PHONE_LOOKUPS(self):
+        default = False
+        return self._setting("INTEGER_PHONE_LOOKUPS", default)
+
+    @property
+    def CACHE_ALIAS(self):
+        default = "default"
+        return self._setting("CACHE_ALIAS", default)
+
+    @property
+    def IDENTIFIER_CACHE_TIMEOUT(self):
+        default = 0
+        return self._setting("IDENTIFIER_CACHE_TIMEOUT", default)
+
+    @property
+    def IDENTIFIER_CACHE_NEGATIVE_TIMEOUT(self):
+        default = 60
+        return self._setting("IDENTIFIER_CACHE_NEGATIVE_TIMEOUT", default)
+
+    @property
+    def USER_CACHE_TIMEOUT(self):
+        default = 0
+        return self._setting("USER_CACHE_TIMEOUT", default)
+
+    @property
+    def CONTACT_STATUS_CACHE_TIMEOUT(self):
+        default = 0
+        return self._setting("CONTACT_STATUS_CACHE_TIMEOUT", default)
+
+    @property
+    def LOGIN_THROTTLE_RATES(self):
+        default = {}
+        return self._setting("LOGIN_THROTTLE_RATES", default)
+
+    @property
+    def PASSWORD_RESET_THROTTLE_RATES(self):
+        default = {}
+        return self._setting("PASSWORD_RESET_THROTTLE_RATES", default)
+
+    @property
+    def SEND_COALESCE_WINDOW(self):
+        default = 0
+        return self._setting("SEND_COALESCE_WINDOW", default)
+
+    @property
+    def BLOOM_FILTER_PATH(self):
+        default = None
+        return self._setting("BLOOM_FILTER_PATH", default)
+
+    @property
+    def ASYNC_VIEWS(self):
+        default = False
+        return self._setting("ASYNC_VIEWS", default)
+
+    @property
+    def PHONE_VERIFICATION_METHOD(self):
+        default = "link"
+        return self._setting("PHONE_VERIFICATION_METHOD", default)
+
+    @property
+    def VERIFICATION_CODE_DIGITS(self):
+        default = 6
+        return self._setting("VERIFICATION_CODE_DIGITS", default)
+
+    @property
+    def VERIFICATION_CODE_TIMEOUT(self):
+        default = 600
+        return self._setting("VERIFICATION_CODE_TIMEOUT", default)
+
+    @property
+    def VERIFICATION_CODE_MAX_ATTEMPTS(self):
+        default = 5
+        return self._setting("VERIFICATION_CODE_MAX_ATTEMPTS", default)
+
+    @property
+    def SIGNAL_DISPATCH(self):
+        default = "sync"
+        return self._setting("SIGNAL_DISPATCH", default)
+
+    @property
+    def OUTBOX_LEASE(self):
+        default = 60
+        return self._setting("OUTBOX_LEASE", default)
+
+    @property
+    def OUTBOX_RETRY_DELAY(self):
+        default = 30
+        return self._setting("OUTBOX_RETRY_DELAY", default)
+
+    @property
+    def OUTBOX_MAX_ATTEMPTS(self):
+        default = 5
+        return self._setting("OUTBOX_MAX_ATTEMPTS", default)
+
+    @property
+    def DELIVERY_BACKENDS(self):
+        default = {}
+        return self._setting("DELIVERY_BACKENDS", default)
+
+    @property
+    def DELIVERY_BASE_URL(self):
+        default = ""
+        return self._setting("DELIVERY_BASE_URL", default)
+
+    @property
+    def ACCESS_TOKEN_LIFETIME(self):
+        default = 300
+        return self._setting("ACCESS_TOKEN_LIFETIME", default)
+
+    @property
+    def REFRESH_TOKEN_LIFETIME(self):
+        default = 30 * 24 * 60 * 60
+        return self._setting("REFRESH_TOKEN_LIFETIME", default)
+
+    @property
+    def REPLICA_DATABASES(self):
+        default = []
+        return self._setting("REPLICA_DATABASES", default)
+
+    @property
+    def REPLICA_PIN_TIMEOUT(self):
+        default = 10
+        return self._setting("REPLICA_PIN_TIMEOUT", default)
+
     @staticmethod
     def _setting(name, default):
         ret = getattr(settings, name, default)
         return ret if ret is not None else default
 
 
-app_settings = AppSettings()
-app_settings.__name__ = __name__
+SETTING_NAMES = frozenset(
+    name for name, value in vars(AppSettings).items() if isinstance(value, property)
+)
+
+
+def _freeze(value):
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    if isinstance(value, dict):
+        return MappingProxyType(value)
+    return value
+
+
+class SettingsSnapshot:
+    """Immutable values of the ``AppSettings`` properties, read as plain
+    attributes.
+
+    The snapshot is taken on first access and retaken whenever one of the
+    settings changes (``setting_changed``, sent by ``override_settings``).
+    """
+
+    AuthenticationMethod = AppSettings.AuthenticationMethod
+
+    def __getattr__(self, name):
+        # Only called until the first snapshot is taken.
+        if name in SETTING_NAMES:
+            self.reload()
+            return self.__dict__[name]
+        raise AttributeError(f"{__name__!r} has no attribute {name!r}")
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            "phone_auth settings are read-only, change Django's settings instead"
+        )
+
+    def reload(self):
+        source = AppSettings()
+        self.__dict__.update(
+            {name: _freeze(getattr(source, name)) for name in SETTING_NAMES}
+        )
+
+
+def reload_settings(setting, **kwargs):
+    if setting in SETTING_NAMES:
+        app_settings.reload()
+
+
+app_settings = SettingsSnapshot()
+app_settings.__dict__["__name__"] = __name__
+setting_changed.connect(reload_settings)
 # noinspection PyTypeChecker
 sys.modules[__name__] = app_settings
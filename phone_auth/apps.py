@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class PhoneAuthConfig(AppConfig):
     name = "phone_auth"
+
+    def ready(self):
+        from . import app_settings, checks, receivers  # noqa: F401
+
+        app_settings.reload()
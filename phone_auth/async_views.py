@@ -0,0 +1,378 @@
+"""Async versions of the views in ``phone_auth.views``, for ASGI deployments.
+
+Views keep the names of their sync counterparts, so ``phone_auth.urls`` can
+use either module. Database access goes through the async ORM, signals are
+sent with ``Signal.asend()`` and password hashing runs in the hasher
+executor. The password reset confirm and change password views are Django's
+form views and are re-exported unchanged, like the JSON views of
+``phone_auth.api_views``.
+"""
+
+from django.contrib.auth import REDIRECT_FIELD_NAME, aauthenticate, alogin, alogout
+from django.contrib.auth.views import RedirectURLMixin
+from django.core.exceptions import ValidationError
+from django.http import HttpResponseRedirect
+from django.shortcuts import render, resolve_url
+from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.utils.http import urlsafe_base64_decode
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.debug import sensitive_post_parameters
+from django.views.generic.base import ContextMixin, TemplateResponseMixin, View
+from django.views.generic.edit import FormMixin
+
+from phone_auth.mixins import AsyncAnonymousRequiredMixin, AsyncLoginRequiredMixin
+
+from . import app_settings
+from .api_views import (  # noqa: F401
+    AddEmailAPIView,
+    AddPhoneAPIView,
+    ContactsAPIView,
+    LoginAPIView,
+    LogoutAPIView,
+    SignupAPIView,
+    TokenObtainView,
+    TokenRefreshView,
+    TokenRevokeView,
+    VerificationAPIView,
+    VerificationCodeAPIView,
+)
+from .forms import (
+    AddEmailForm,
+    AddPhoneForm,
+    PhoneEmailVerificationForm,
+    PhoneLoginForm,
+    PhoneLogoutForm,
+    PhonePasswordResetForm,
+    PhoneRegisterForm,
+    PhoneVerificationCodeForm,
+)
+from .models import EmailAddress, PhoneNumber
+from .throttling import login_throttle, password_reset_throttle
+from .tokens import phone_token_generator
+from .views import (  # noqa: F401
+    PhoneChangePasswordDoneView,
+    PhoneChangePasswordView,
+    PhonePasswordConfirmView,
+    throttled_response,
+)
+
+
+class AsyncTemplateView(TemplateResponseMixin, ContextMixin, View):
+    """Render a template on GET, without a thread-pool hop."""
+
+    async def get(self, request, *args, **kwargs):
+        return self.render(await self.aget_context_data(**kwargs))
+
+    async def aget_context_data(self, **kwargs):
+        return self.get_context_data(**kwargs)
+
+    def render(self, context, status=200):
+        # Render eagerly: the templates don't touch the database, while a
+        # lazy TemplateResponse would be rendered in a thread.
+        return render(self.request, self.get_template_names(), context, status=status)
+
+
+class AsyncFormView(FormMixin, AsyncTemplateView):
+    """FormView with async handlers.
+
+    Forms with an ``ais_valid()`` coroutine are validated with it.
+    ``form_valid()`` and ``form_invalid()`` are coroutines.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        form = self.get_form()
+        if hasattr(form, "ais_valid"):
+            is_valid = await form.ais_valid()
+        else:
+            is_valid = form.is_valid()
+        if is_valid:
+            return await self.form_valid(form)
+        return await self.form_invalid(form)
+
+    async def form_valid(self, form):
+        return HttpResponseRedirect(self.get_success_url())
+
+    async def form_invalid(self, form):
+        return self.render(await self.aget_context_data(form=form))
+
+
+class PhoneSignupView(AsyncAnonymousRequiredMixin, AsyncFormView):
+    """Display the register form and handle user registration."""
+
+    form_class = PhoneRegisterForm
+    template_name = "phone_auth/signup.html"
+    success_url = reverse_lazy("phone_auth:phone_login")
+
+    @method_decorator(sensitive_post_parameters())
+    @method_decorator(csrf_protect)
+    @method_decorator(never_cache)
+    async def dispatch(self, *args, **kwargs):
+        return await super().dispatch(*args, **kwargs)
+
+    async def form_valid(self, form):
+        await form.asave()
+        if form.errors:
+            return self.render({"form": form})
+        return await super().form_valid(form)
+
+
+class PhoneLoginView(RedirectURLMixin, AsyncAnonymousRequiredMixin, AsyncFormView):
+    """Display the login form and handle the login action."""
+
+    form_class = PhoneLoginForm
+    template_name = "phone_auth/login.html"
+    redirect_field_name = REDIRECT_FIELD_NAME
+
+    @method_decorator(sensitive_post_parameters())
+    @method_decorator(csrf_protect)
+    @method_decorator(never_cache)
+    async def dispatch(self, *args, **kwargs):
+        return await super().dispatch(*args, **kwargs)
+
+    def get_default_redirect_url(self):
+        return resolve_url(app_settings.LOGIN_REDIRECT_URL)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["request"] = self.request
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context[self.redirect_field_name] = self.get_redirect_url()
+        return context
+
+    async def form_valid(self, form):
+        """Security check complete. Log the user in."""
+
+        throttle = login_throttle(self.request, form.cleaned_data["login"])
+        retry_after = await throttle.aacquire()
+        if retry_after:
+            return throttled_response(
+                self.request, self.template_name, form, retry_after
+            )
+
+        user = await aauthenticate(self.request, **form.cleaned_data)
+        if user is None:
+            form.add_error("login", "Invalid Credentials")
+            return self.render({"form": form}, status=400)
+
+        # Only failed logins are counted.
+        await throttle.arelease()
+        await alogin(self.request, user)
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class PhoneLogoutView(AsyncFormView):
+    """Handle logout"""
+
+    template_name = "phone_auth/logout.html"
+    form_class = PhoneLogoutForm
+
+    @method_decorator(csrf_protect)
+    @method_decorator(never_cache)
+    async def dispatch(self, *args, **kwargs):
+        return await super().dispatch(*args, **kwargs)
+
+    def get_success_url(self):
+        return app_settings.LOGOUT_REDIRECT_URL
+
+    async def form_valid(self, form):
+        await alogout(self.request)
+        return await super().form_valid(form)
+
+
+class PhonePasswordResetView(AsyncFormView):
+    """Display the password reset form and handle password reset using phone/email."""
+
+    form_class = PhonePasswordResetForm
+    template_name = "phone_auth/password_reset.html"
+    success_url = reverse_lazy("phone_auth:phone_password_reset_done")
+
+    @method_decorator(csrf_protect)
+    async def dispatch(self, *args, **kwargs):
+        return await super().dispatch(*args, **kwargs)
+
+    async def form_valid(self, form):
+        throttle = password_reset_throttle(self.request, form.cleaned_data["login"])
+        retry_after = await throttle.aacquire()
+        if retry_after:
+            return throttled_response(
+                self.request, self.template_name, form, retry_after
+            )
+
+        await form.asave()
+        return await super().form_valid(form)
+
+
+class PhonePasswordResetDoneView(AsyncTemplateView):
+    """Renders a template."""
+
+    template_name = "phone_auth/password_reset_done.html"
+
+
+class PhonePasswordResetCompleteView(AsyncTemplateView):
+    """Renders a template"""
+
+    template_name = "phone_auth/password_reset_complete.html"
+
+
+class PhoneEmailVerificationView(AsyncLoginRequiredMixin, AsyncFormView):
+    """
+    Display all email-addresses and phone-numbers associated with user
+    account with verification status on GET request.
+    """
+
+    template_name = "phone_auth/phone_and_email_verification.html"
+    form_class = PhoneEmailVerificationForm
+    title = None
+
+    @method_decorator(csrf_protect)
+    async def dispatch(self, *args, **kwargs):
+        return await super().dispatch(*args, **kwargs)
+
+    async def aget_context_data(self, **kwargs):
+        context = self.get_context_data(**kwargs)
+        user = self.request.user
+        context.update(
+            {
+                "email_addresses": [
+                    email async for email in user.emailaddress_set.all()
+                ],
+                "phone_numbers": [phone async for phone in user.phonenumber_set.all()],
+            }
+        )
+        if self.title is not None:
+            context["title"] = self.title
+        return context
+
+    async def form_valid(self, form):
+        self.title = await form.asave(self.request.user)
+        return self.render(await self.aget_context_data())
+
+
+class PhoneEmailVerificationConfirmView(AsyncTemplateView):
+    """Accepts `idb64` and `token` kwargs and validates them.
+
+    If valid, it set is_verified to True of PhoneNumber/EmailAdress
+    instance.
+    """
+
+    template_name = "phone_auth/phone_email_verification_confirm.html"
+
+    @method_decorator(sensitive_post_parameters())
+    @method_decorator(never_cache)
+    async def dispatch(self, *args, **kwargs):
+        return await super().dispatch(*args, **kwargs)
+
+    async def get(self, request, idb64, token):
+        validlink = False
+        email_obj, phone_obj = await self.aget_email_or_phone_obj(idb64)
+        obj = email_obj or phone_obj
+
+        if obj is not None and phone_token_generator(
+            email_address_obj=email_obj, phone_number_obj=phone_obj
+        ).check_token(obj.user, token):
+            obj.is_verified = True
+            await obj.asave(update_fields=["is_verified"])
+            validlink = True
+
+        # Display the "Verification Failed/Passed" page.
+        if validlink:
+            title = _("Verification successful")
+        else:
+            title = _("Verification failed")
+        return self.render({"title": title})
+
+    post = get
+
+    @staticmethod
+    async def aget_email_or_phone_obj(idb64):
+        email_obj = phone_obj = None
+        try:
+            # urlsafe_base64_decode() decodes to bytestring
+            uid = urlsafe_base64_decode(idb64).decode()
+            method = uid[:5]
+            pk = int(uid[5:])
+            if method == "email":
+                email_obj = await EmailAddress.objects.select_related("user").aget(
+                    pk=pk
+                )
+            elif method == "phone":
+                phone_obj = await PhoneNumber.objects.select_related("user").aget(pk=pk)
+
+        except (
+            TypeError,
+            ValueError,
+            OverflowError,
+            EmailAddress.DoesNotExist,
+            PhoneNumber.DoesNotExist,
+            ValidationError,
+        ):
+            pass
+        return email_obj, phone_obj
+
+
+class PhoneVerificationCodeView(AsyncLoginRequiredMixin, AsyncFormView):
+    """Verify a phone number with the code sent by the verify_phone_code
+    signal."""
+
+    template_name = "phone_auth/phone_verification_code.html"
+    form_class = PhoneVerificationCodeForm
+    success_url = reverse_lazy("phone_auth:phone_email_verification")
+
+    @method_decorator(csrf_protect)
+    @method_decorator(never_cache)
+    async def dispatch(self, *args, **kwargs):
+        return await super().dispatch(*args, **kwargs)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["user"] = self.request.user
+        return kwargs
+
+    async def form_valid(self, form):
+        await form.asave()
+        if form.errors:
+            status = 429 if form.has_error("code", "throttled") else 400
+            return self.render({"form": form}, status=status)
+        return await super().form_valid(form)
+
+
+class AddPhoneView(AsyncLoginRequiredMixin, AsyncFormView):
+    """Add new phone"""
+
+    template_name = "phone_auth/add_new_phone.html"
+    form_class = AddPhoneForm
+    success_url = reverse_lazy("phone_auth:phone_email_verification")
+
+    @method_decorator(csrf_protect)
+    async def dispatch(self, *args, **kwargs):
+        return await super().dispatch(*args, **kwargs)
+
+    async def form_valid(self, form):
+        await form.asave(self.request.user)
+        if form.errors:
+            return self.render({"form": form})
+        return await super().form_valid(form)
+
+
+class AddEmailView(AsyncLoginRequiredMixin, AsyncFormView):
+    """Add new email"""
+
+    template_name = "phone_auth/add_new_email.html"
+    form_class = AddEmailForm
+    success_url = reverse_lazy("phone_auth:phone_email_verification")
+
+    @method_decorator(csrf_protect)
+    async def dispatch(self, *args, **kwargs):
+        return await super().dispatch(*args, **kwargs)
+
+    async def form_valid(self, form):
+        await form.asave(self.request.user)
+        if form.errors:
+            return self.render({"form": form})
+        return await super().form_valid(form)
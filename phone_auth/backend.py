@@ -1,12 +1,9 @@
-from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
 
 from . import app_settings
-from .app_settings import AuthenticationMethod
-from .forms import EmailValidationForm, PhoneValidationForm, UsernameValidationForm
-
-User = get_user_model()
+from .hashing import acheck_user_password
+from .identifiers import classify
+from .resolvers import aresolve_user, get_cached_user, resolve_user
 
 
 class CustomAuthBackend(ModelBackend):
@@ -17,36 +14,49 @@ class CustomAuthBackend(ModelBackend):
         password = kwargs.get("password", None)
 
         if login and password:
+            identifier = classify(login, app_settings.AUTHENTICATION_METHODS)
+            if identifier is None:
+                return None
 
-            lookup_obj = Q()
-
-            authentication_methods = app_settings.AUTHENTICATION_METHODS
+            user = resolve_user(identifier)
             if (
-                AuthenticationMethod.PHONE in authentication_methods
-                and PhoneValidationForm({"phone": login}).is_valid()
-            ):
-                lookup_obj |= Q(phonenumber__phone=login)
-            elif (
-                AuthenticationMethod.EMAIL in authentication_methods
-                and EmailValidationForm({"email": login}).is_valid()
-            ):
-                lookup_obj |= Q(emailaddress__email__iexact=login)
-            elif (
-                AuthenticationMethod.USERNAME in authentication_methods
-                and UsernameValidationForm({"username": login}).is_valid()
+                user is not None
+                and user.check_password(password)
+                and self.user_can_authenticate(user)
             ):
-                lookup_obj |= Q(username__exact=login)
-            else:
+                return user
+
+        return None
+
+    def get_user(self, user_id):
+        """Return the user of an authenticated session, from the cache when
+        ``USER_CACHE_TIMEOUT`` is set."""
+
+        if not app_settings.USER_CACHE_TIMEOUT:
+            return super().get_user(user_id)
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aauthenticate(self, request, **kwargs):
+        """Async version of authenticate().
+
+        The lookup uses the async ORM and the password hash is checked in the
+        hasher executor, so the event loop never blocks.
+        """
+
+        login = kwargs.get("login", kwargs.get("username", None))
+        password = kwargs.get("password", None)
+
+        if login and password:
+            identifier = classify(login, app_settings.AUTHENTICATION_METHODS)
+            if identifier is None:
                 return None
 
-            if lookup_obj:
-                try:
-                    user = User.objects.get(lookup_obj)
-                    if user.check_password(password) and self.user_can_authenticate(
-                        user
-                    ):
-                        return user
-                except User.DoesNotExist:
-                    return None
+            user = await aresolve_user(identifier)
+            if user is None:
+                return None
+            is_correct = await acheck_user_password(user, password)
+            if is_correct and self.user_can_authenticate(user):
+                return user
 
         return None
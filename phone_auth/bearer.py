@@ -0,0 +1,169 @@
+"""Signed bearer tokens for API clients such as mobile apps.
+
+Access tokens are the user's pk and verified phone/email flags, signed with
+``SECRET_KEY``. They are checked without any query, expire after
+ACCESS_TOKEN_LIFETIME seconds and can't be revoked, so keep it short.
+
+Refresh tokens are random strings, stored hashed in ``RefreshToken``. Each
+one is used once, to get a new access token and the next refresh token.
+Using a refresh token twice means it leaked: every token of its family is
+revoked, so the thief and the client both have to log in again.
+"""
+
+import hashlib
+import secrets
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from . import app_settings
+from .models import RefreshToken
+from .status import verified_flags_queryset
+
+User = get_user_model()
+
+ACCESS_TOKEN_SALT = "phone_auth.bearer.access"
+
+
+class TokenUser(AnonymousUser):
+    """User authenticated by an access token.
+
+    Only the pk and the verified phone/email flags are known, no other
+    field of the user is loaded; ``get_user()`` fetches the user.
+    Permission checks fail, like for anonymous users.
+    """
+
+    # Tokens are only issued to and refreshed for active users; a
+    # deactivated user keeps access until the access token expires.
+    is_active = True
+
+    def __init__(self, user_id, has_verified_phone, has_verified_email):
+        self.id = self.pk = user_id
+        # Read by ContactStatus instead of querying.
+        self.verified_flags = (has_verified_phone, has_verified_email)
+
+    def __str__(self):
+        return f"TokenUser {self.pk}"
+
+    def __eq__(self, other):
+        return isinstance(other, self.__class__) and self.pk == other.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    def get_user(self):
+        return User._default_manager.get(pk=self.pk)
+
+
+def make_access_token(user_id, has_verified_phone, has_verified_email):
+    return signing.dumps(
+        {"uid": user_id, "vp": has_verified_phone, "ve": has_verified_email},
+        salt=ACCESS_TOKEN_SALT,
+    )
+
+
+def read_access_token(token):
+    """Return the ``TokenUser`` of a valid access token, or None"""
+
+    try:
+        claims = signing.loads(
+            token, salt=ACCESS_TOKEN_SALT, max_age=app_settings.ACCESS_TOKEN_LIFETIME
+        )
+    except signing.BadSignature:
+        return None
+    return TokenUser(claims["uid"], claims["vp"], claims["ve"])
+
+
+def _hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_tokens(user, family=None):
+    """Return an access token and a new refresh token for ``user``, as the
+    ``dict`` returned to the client.
+
+    ``family`` is the family of the refresh token being rotated; a new
+    family is started when it is None.
+    """
+
+    flags = verified_flags_queryset(user.pk).first() or (False, False)
+    refresh_token = secrets.token_urlsafe(32)
+    RefreshToken.objects.create(
+        user=user,
+        token_hash=_hash_token(refresh_token),
+        family=family or uuid.uuid4(),
+        session_hash=user.get_session_auth_hash(),
+        expires_at=timezone.now()
+        + timedelta(seconds=app_settings.REFRESH_TOKEN_LIFETIME),
+    )
+    return {
+        "access_token": make_access_token(user.pk, *flags),
+        "token_type": "Bearer",
+        "expires_in": app_settings.ACCESS_TOKEN_LIFETIME,
+        "refresh_token": refresh_token,
+    }
+
+
+def refresh_tokens(refresh_token):
+    """Rotate ``refresh_token``: return new tokens like ``issue_tokens()``,
+    or None if it is unknown, expired, already used or revoked."""
+
+    now = timezone.now()
+    with transaction.atomic():
+        token = (
+            RefreshToken.objects.select_for_update()
+            .select_related("user")
+            .filter(token_hash=_hash_token(refresh_token))
+            .first()
+        )
+        if token is None:
+            return None
+        user = token.user
+        if (
+            token.used_at is not None
+            or token.expires_at <= now
+            or not user.is_active
+            or not constant_time_compare(
+                token.session_hash, user.get_session_auth_hash()
+            )
+        ):
+            if token.used_at is not None:
+                # Reused: revoke the tokens issued after it too.
+                RefreshToken.objects.filter(family=token.family).delete()
+            return None
+        token.used_at = now
+        token.save(update_fields=["used_at"])
+        return issue_tokens(user, family=token.family)
+
+
+def revoke_refresh_token(refresh_token):
+    """Revoke the family of ``refresh_token``, e.g. on logout. Access tokens
+    already issued stay valid until they expire."""
+
+    family = (
+        RefreshToken.objects.filter(token_hash=_hash_token(refresh_token))
+        .values_list("family", flat=True)
+        .first()
+    )
+    if family is not None:
+        RefreshToken.objects.filter(family=family).delete()
+
+
+def delete_expired_refresh_tokens():
+    """Delete expired refresh tokens; run it periodically"""
+
+    return RefreshToken.objects.filter(expires_at__lte=timezone.now()).delete()[0]
@@ -0,0 +1,141 @@
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+from mmap import ACCESS_WRITE, mmap
+
+from . import app_settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+MAGIC = b"PABLOOM1"
+# magic, number of bits, number of hash functions
+HEADER = struct.Struct("<8sQI")
+# How often, in seconds, to check whether the file was replaced by a rebuild.
+RELOAD_INTERVAL = 5
+
+
+def bloom_key(kind, value):
+    return f"{kind}:{value}"
+
+
+class BloomFilter:
+    """Bloom filter stored in a memory-mapped file.
+
+    All processes that open the same file share its pages, and bits added
+    by one process are immediately visible to the others. Membership tests
+    can return false positives but never false negatives, so every process
+    must be able to write the file: opening it read-only raises
+    ``PermissionError`` rather than dropping the identifiers it adds.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        file = open(self.path, "r+b")
+        mm = mmap(file.fileno(), 0, access=ACCESS_WRITE)
+        magic, num_bits, num_hashes = HEADER.unpack_from(mm)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a phone_auth bloom filter")
+        # Swapped in as a whole, so readers never see a mix of two files.
+        self._state = (file, mm, num_bits, num_hashes)
+        self.num_bits = num_bits
+        self._inode = os.fstat(file.fileno()).st_ino
+        self._checked_at = time.monotonic()
+
+    def reload_if_replaced(self):
+        """Reopen the file if it was replaced, e.g. by a rebuild"""
+
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return
+        if inode != self._inode:
+            with self._lock:
+                # The previous mapping is closed once no reader uses it.
+                self._open()
+
+    @classmethod
+    def create(cls, path, capacity, error_rate=0.01):
+        """Create an empty filter sized for ``capacity`` items"""
+
+        capacity = max(capacity, 1)
+        num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, num_bits, num_hashes))
+            f.truncate(HEADER.size + math.ceil(num_bits / 8))
+        return cls(path)
+
+    @staticmethod
+    def _positions(item, num_bits, num_hashes):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        for i in range(num_hashes):
+            yield (h1 + i * h2) % num_bits
+
+    def __contains__(self, item):
+        _, mm, num_bits, num_hashes = self._state
+        for position in self._positions(item, num_bits, num_hashes):
+            if not mm[HEADER.size + position // 8] & (1 << (position % 8)):
+                return False
+        return True
+
+    def add(self, item):
+        with self._lock:
+            file, mm, num_bits, num_hashes = self._state
+            # Setting a bit is a read-modify-write of its byte, so writers in
+            # other processes are excluded with a file lock.
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                for position in self._positions(item, num_bits, num_hashes):
+                    mm[HEADER.size + position // 8] |= 1 << (position % 8)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+_bloom_filter = None
+
+
+def get_bloom_filter():
+    """Return the filter at ``BLOOM_FILTER_PATH``, or ``None`` if it isn't
+    configured or hasn't been built yet."""
+
+    global _bloom_filter
+    path = app_settings.BLOOM_FILTER_PATH
+    if not path:
+        return None
+    if _bloom_filter is None or _bloom_filter.path != path:
+        try:
+            _bloom_filter = BloomFilter(path)
+        except FileNotFoundError:
+            return None
+    _bloom_filter.reload_if_replaced()
+    return _bloom_filter
+
+
+def might_exist(kind, value):
+    """Return ``False`` only if the identifier definitely isn't registered"""
+
+    bloom_filter = get_bloom_filter()
+    return bloom_filter is None or bloom_key(kind, value) in bloom_filter
+
+
+def add_identifier(kind, value):
+    bloom_filter = get_bloom_filter()
+    if bloom_filter is not None and value:
+        bloom_filter.add(bloom_key(kind, value))
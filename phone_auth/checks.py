@@ -0,0 +1,42 @@
+from django.core.checks import Error, register
+
+from . import app_settings
+from .app_settings import AuthenticationMethod
+
+AUTHENTICATION_METHODS = {
+    AuthenticationMethod.USERNAME,
+    AuthenticationMethod.EMAIL,
+    AuthenticationMethod.PHONE,
+}
+CHOICES = {
+    "PHONE_VERIFICATION_METHOD": ("link", "code"),
+    "SIGNAL_DISPATCH": ("sync", "outbox"),
+}
+
+
+@register()
+def check_settings(app_configs, **kwargs):
+    errors = []
+    if not app_settings.AUTHENTICATION_METHODS:
+        errors.append(
+            Error("AUTHENTICATION_METHODS can't be empty.", id="phone_auth.E001")
+        )
+    unknown = set(app_settings.AUTHENTICATION_METHODS) - AUTHENTICATION_METHODS
+    if unknown:
+        errors.append(
+            Error(
+                f"AUTHENTICATION_METHODS has unknown methods: {sorted(unknown)}.",
+                hint=f"Use any of {sorted(AUTHENTICATION_METHODS)}.",
+                id="phone_auth.E002",
+            )
+        )
+    for name, choices in CHOICES.items():
+        value = getattr(app_settings, name)
+        if value not in choices:
+            errors.append(
+                Error(
+                    f"{name} must be one of {choices}, not {value!r}.",
+                    id="phone_auth.E003",
+                )
+            )
+    return errors
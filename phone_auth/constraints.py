@@ -0,0 +1,33 @@
+from django.db import models
+
+
+class ExpressionFallbackUniqueConstraint(models.UniqueConstraint):
+    """Unique constraint created only on databases without expression
+    indexes, where Django skips expression constraints such as
+    ``UniqueConstraint(Lower("email"))`` (MariaDB, MySQL < 8.0.13).
+
+    It keeps the column unique there; with the default case-insensitive
+    collations of MySQL/MariaDB, that is case-insensitive too. Validation
+    is left to the expression constraint, which it implies.
+    """
+
+    def _fallback_supported(self, schema_editor):
+        return not schema_editor.connection.features.supports_expression_indexes
+
+    def constraint_sql(self, model, schema_editor):
+        if not self._fallback_supported(schema_editor):
+            return None
+        return super().constraint_sql(model, schema_editor)
+
+    def create_sql(self, model, schema_editor):
+        if not self._fallback_supported(schema_editor):
+            return None
+        return super().create_sql(model, schema_editor)
+
+    def remove_sql(self, model, schema_editor):
+        if not self._fallback_supported(schema_editor):
+            return None
+        return super().remove_sql(model, schema_editor)
+
+    def validate(self, model, instance, exclude=None, using="default"):
+        pass
@@ -1,15 +1,25 @@
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import redirect
+from django.utils.functional import lazy
 
 from . import app_settings
+from .status import get_contact_status
 
 
-def anonymous_required(function=None, redirect_url=app_settings.LOGIN_REDIRECT_URL):
-    """Decorator to check if a user is anonymous"""
+def _login_redirect_url():
+    return app_settings.LOGIN_REDIRECT_URL or "/"
+
+
+def anonymous_required(function=None, redirect_url=None):
+    """Decorator to check if a user is anonymous
+
+    Authenticated users are redirected to ``redirect_url``, by default
+    LOGIN_REDIRECT_URL as set when the view is called.
+    """
 
     if not redirect_url:
-        redirect_url = "/"
+        redirect_url = lazy(_login_redirect_url, str)()
 
     actual_decorator = user_passes_test(
         lambda u: u.is_anonymous, login_url=redirect_url
@@ -28,10 +38,7 @@ def verified_email_required(
     def decorator(view_func):
         @login_required(redirect_field_name=redirect_field_name, login_url=login_url)
         def _wrapped_view(request, *args, **kwargs):
-            if (
-                request.user.is_authenticated
-                and request.user.emailaddress_set.filter(is_verified=True).exists()
-            ):
+            if get_contact_status(request).has_verified_email:
                 return view_func(request, *args, **kwargs)
             else:
                 return redirect("phone_auth:phone_email_verification")
@@ -51,10 +58,7 @@ def verified_phone_required(
     def decorator(view_func):
         @login_required(redirect_field_name=redirect_field_name, login_url=login_url)
         def _wrapped_view(request, *args, **kwargs):
-            if (
-                request.user.is_authenticated
-                and request.user.phonenumber_set.filter(is_verified=True).exists()
-            ):
+            if get_contact_status(request).has_verified_phone:
                 return view_func(request, *args, **kwargs)
             else:
                 return redirect("phone_auth:phone_email_verification")
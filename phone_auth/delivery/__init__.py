@@ -0,0 +1,158 @@
+"""Delivery backends sending phone_auth's messages by SMS and email.
+
+Backends are configured per channel with the DELIVERY_BACKENDS setting.
+When a channel has a backend, the password reset and verification signals
+are delivered through it; receivers connected by the project keep working
+alongside.
+
+Backend instances are kept per thread, so a backend's connection to its
+gateway is reused across messages and requests.
+"""
+
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.loader import render_to_string
+from django.utils.module_loading import import_string
+
+from .. import app_settings
+from ..identifiers import parse_phone
+
+SMS = "sms"
+EMAIL = "email"
+
+Message = namedtuple("Message", ["channel", "to", "subject", "body"])
+Message.__doc__ = """A message to deliver.
+
+channel -- ``SMS`` or ``EMAIL``
+to -- phone number in E.164 format, or email address
+subject -- subject of emails, empty for SMS
+body -- text of the message
+"""
+
+_local = threading.local()
+_batch = ContextVar("phone_auth_delivery_batch", default=None)
+
+
+def get_backend_config(channel, to=None):
+    """Return ``(key, config)`` of the backend for messages on ``channel``
+    to ``to``, or ``(None, None)`` if the channel has no backend.
+
+    SMS are routed by the calling code of ``to`` when the channel config
+    has a matching ``COUNTRIES`` entry.
+    """
+
+    config = app_settings.DELIVERY_BACKENDS.get(channel)
+    if config is None:
+        return None, None
+    if channel == SMS and to and config.get("COUNTRIES"):
+        phone = parse_phone(to)
+        if phone is not None:
+            country_code = str(phone.country_code)
+            if country_code in config["COUNTRIES"]:
+                return f"{SMS}:{country_code}", config["COUNTRIES"][country_code]
+    return channel, config
+
+
+def get_backend(channel, to=None):
+    """Return the backend delivering messages on ``channel`` to ``to``, or
+    None if the channel has no backend.
+
+    Instances are created once per thread and configuration, and aren't
+    closed between calls.
+    """
+
+    key, config = get_backend_config(channel, to)
+    if config is None:
+        return None
+    backends = getattr(_local, "backends", None)
+    if backends is None:
+        backends = _local.backends = {}
+    cached = backends.get(key)
+    # Settings can be changed at runtime, e.g. in tests.
+    if cached is None or cached[0] is not config:
+        if cached is not None:
+            cached[1].close()
+        backend_class = import_string(config["BACKEND"])
+        cached = backends[key] = (config, backend_class(**config.get("OPTIONS", {})))
+    return cached[1]
+
+
+def close_backends():
+    """Close the connections of the current thread's backends"""
+
+    for _, backend in getattr(_local, "backends", {}).values():
+        backend.close()
+    _local.backends = {}
+
+
+def send_messages(messages):
+    """Deliver ``messages``, grouped into one ``send_messages()`` call per
+    backend. Return the number of messages sent.
+
+    Messages on channels without a backend are dropped.
+    """
+
+    batches = {}
+    for message in messages:
+        backend = get_backend(message.channel, message.to)
+        if backend is not None:
+            batches.setdefault(id(backend), (backend, []))[1].append(message)
+    return sum(backend.send_messages(batch) for backend, batch in batches.values())
+
+
+@contextmanager
+def batched():
+    """Buffer the messages delivered in the block, and send them when it
+    exits with one ``send_messages()`` call per backend."""
+
+    messages = []
+    token = _batch.set(messages)
+    try:
+        yield messages
+    finally:
+        _batch.reset(token)
+    send_messages(messages)
+
+
+def render_message(purpose, channel, to, context):
+    """Render the message sent for ``purpose`` (the name of a phone_auth
+    signal) from the ``phone_auth/messages/<purpose>.txt`` template, and
+    ``<purpose>_subject.txt`` for emails."""
+
+    template_name = f"phone_auth/messages/{purpose}"
+    subject = ""
+    if channel == EMAIL:
+        subject = render_to_string(f"{template_name}_subject.txt", context)
+        # Email subject *must not* contain newlines
+        subject = "".join(subject.splitlines())
+    body = render_to_string(f"{template_name}.txt", context).strip()
+    return Message(channel, to, subject, body)
+
+
+def deliver(purpose, user, phone=None, email=None, **kwargs):
+    """Deliver the message for the phone_auth signal named ``purpose``,
+    sent with ``user``, ``phone``/``email`` and ``kwargs``.
+
+    Return the number of messages sent: 0 when the channel has no backend.
+    Inside ``batched()`` the message is buffered instead.
+    """
+
+    if phone:
+        parsed = parse_phone(phone.strip())
+        channel, to = SMS, parsed.as_e164 if parsed is not None else phone
+    else:
+        channel, to = EMAIL, email
+    if get_backend(channel, to) is None:
+        return 0
+    context = dict(kwargs, user=user, phone=phone, email=email)
+    if "url" in context:
+        context["url"] = app_settings.DELIVERY_BASE_URL + context["url"]
+    message = render_message(purpose, channel, to, context)
+    batch = _batch.get()
+    if batch is not None:
+        batch.append(message)
+        return 1
+    return send_messages([message])
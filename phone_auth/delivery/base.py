@@ -0,0 +1,30 @@
+class BaseDeliveryBackend:
+    """Base class for delivery backends.
+
+    Subclasses must implement ``send_messages()``, and ``open()`` and
+    ``close()`` if they hold a connection. Options of the backend's
+    DELIVERY_BACKENDS entry are passed as keyword arguments.
+    """
+
+    def __init__(self, fail_silently=False, **kwargs):
+        self.fail_silently = fail_silently
+
+    def open(self):
+        """Open a connection to the gateway, if not open already"""
+
+    def close(self):
+        """Close the connection to the gateway"""
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def send_messages(self, messages):
+        """Send a list of ``Message`` and return the number sent"""
+
+        raise NotImplementedError(
+            "subclasses of BaseDeliveryBackend must override send_messages() method"
+        )
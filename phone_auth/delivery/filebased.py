@@ -0,0 +1,37 @@
+import json
+import threading
+
+from .base import BaseDeliveryBackend
+
+
+class DeliveryBackend(BaseDeliveryBackend):
+    """Append messages to a file as JSON Lines.
+
+    The file is opened once and kept open; each batch is written with a
+    single call.
+    """
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.stream = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        if self.stream is None:
+            self.stream = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def send_messages(self, messages):
+        if not messages:
+            return 0
+        lines = "".join(json.dumps(message._asdict()) + "\n" for message in messages)
+        with self._lock:
+            self.open()
+            self.stream.write(lines)
+            self.stream.flush()
+        return len(messages)
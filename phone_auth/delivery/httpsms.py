@@ -0,0 +1,82 @@
+import http.client
+import json
+from urllib.parse import urlsplit
+
+from ..exceptions import DeliveryError
+from .base import BaseDeliveryBackend
+
+
+class SmsBackend(BaseDeliveryBackend):
+    """POST SMS messages as JSON to an HTTP gateway.
+
+    Up to ``batch_size`` messages are sent per request, as
+    ``{"messages": [{"to": ..., "body": ...}, ...]}``, over a kept-alive
+    connection that is reopened when the gateway closes it. Any response
+    status other than 2xx raises ``DeliveryError``, unless
+    ``fail_silently`` is set.
+    """
+
+    def __init__(self, url, headers=None, batch_size=100, timeout=10, **kwargs):
+        super().__init__(**kwargs)
+        parts = urlsplit(url)
+        self.connection_class = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.path = parts.path or "/"
+        if parts.query:
+            self.path += "?" + parts.query
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.connection = None
+
+    def open(self):
+        if self.connection is None:
+            self.connection = self.connection_class(self.netloc, timeout=self.timeout)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def send_messages(self, messages):
+        sent = 0
+        for start in range(0, len(messages), self.batch_size):
+            end = start + self.batch_size
+            batch = messages[start:end]
+            body = json.dumps(
+                {
+                    "messages": [
+                        {"to": message.to, "body": message.body} for message in batch
+                    ]
+                }
+            )
+            try:
+                self._post(body)
+            except (OSError, http.client.HTTPException, DeliveryError):
+                if not self.fail_silently:
+                    raise
+            else:
+                sent += len(batch)
+        return sent
+
+    def _post(self, body):
+        for retry in (False, True):
+            self.open()
+            try:
+                self.connection.request("POST", self.path, body, self.headers)
+                response = self.connection.getresponse()
+                content = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError):
+                # The gateway closed the kept-alive connection.
+                self.close()
+                if retry:
+                    raise
+        if not 200 <= response.status < 300:
+            raise DeliveryError(
+                f"SMS gateway responded {response.status}: {content[:200]!r}"
+            )
@@ -0,0 +1,13 @@
+from .base import BaseDeliveryBackend
+
+# Messages sent with the locmem backend, in order.
+outbox = []
+
+
+class DeliveryBackend(BaseDeliveryBackend):
+    """Store messages in ``phone_auth.delivery.locmem.outbox``, for tests and
+    benchmarks."""
+
+    def send_messages(self, messages):
+        outbox.extend(messages)
+        return len(messages)
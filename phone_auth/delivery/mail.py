@@ -0,0 +1,47 @@
+import smtplib
+
+from django.core.mail import EmailMessage, get_connection
+
+from .base import BaseDeliveryBackend
+
+
+class EmailBackend(BaseDeliveryBackend):
+    """Send emails through a Django email backend (``EMAIL_BACKEND`` by
+    default), keeping its connection open between batches instead of
+    connecting for every message.
+
+    ``backend`` is the dotted path of the Django email backend; other
+    options, like ``host`` or ``port``, are passed to it.
+    """
+
+    def __init__(self, backend=None, from_email=None, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.from_email = from_email
+        self.connection = get_connection(backend, fail_silently=fail_silently, **kwargs)
+
+    def open(self):
+        self.connection.open()
+
+    def close(self):
+        self.connection.close()
+
+    def send_messages(self, messages):
+        emails = [
+            EmailMessage(
+                message.subject,
+                message.body,
+                self.from_email,
+                [message.to],
+                connection=self.connection,
+            )
+            for message in messages
+        ]
+        # Opened here, the connection isn't closed by send_messages().
+        self.open()
+        try:
+            return self.connection.send_messages(emails) or 0
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped the idle connection; reconnect once.
+            self.close()
+            self.open()
+            return self.connection.send_messages(emails) or 0
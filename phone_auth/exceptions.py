@@ -9,3 +9,8 @@ class AuthenticationMethodEmpty(Exception):
     def __init__(self, message="AUTHENTICATION_METHODS can't be empty"):
         self.message = message
         super().__init__(self.message)
+
+
+class DeliveryError(Exception):
+    """Exception raised by delivery backends when a gateway rejects or fails
+    to accept messages."""
@@ -1,12 +1,13 @@
 import uuid
 
+from asgiref.sync import sync_to_async
 from django import forms
 from django.contrib.auth import get_user_model, password_validation
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.tokens import default_token_generator
 from django.core.exceptions import ValidationError
-from django.db import DatabaseError, IntegrityError, transaction
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Value
 from django.urls import reverse
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
@@ -17,33 +18,87 @@ from phonenumber_field.formfields import PhoneNumberField
 from phone_auth.validators import validate_username
 
 from . import app_settings
-from .models import EmailAddress, PhoneNumber
+from .app_settings import AuthenticationMethod
+from .bloom import might_exist
+from .delivery import batched
+from .hashing import amake_password
+from .identifiers import classify
+from .integrity import unique_violation_field
+from .models import EmailAddress, LoginIdentifier, PhoneNumber
+from .outbox import asend_signal, send_signal, send_signals
+from .resolvers import aresolve_user, get_cache, resolve_user
 from .signals import (
     reset_password_email,
     reset_password_phone,
     verify_email,
     verify_phone,
+    verify_phone_code,
 )
-from .tokens import phone_token_generator
+from .throttling import aclaim_send, claim_send
+from .tokens import phone_code_generator, phone_token_generator
 
 User = get_user_model()
 
+# Form fields backed by a unique constraint, as (model, model field).
+UNIQUE_FIELDS = {
+    "phone": (PhoneNumber, "phone"),
+    "email": (EmailAddress, "email"),
+    "username": (User, "username"),
+}
+FIELD_BY_MODEL = {model: field for field, (model, _) in UNIQUE_FIELDS.items()}
+ALREADY_EXISTS_ERRORS = {
+    "phone": "Phone already exists",
+    "email": "Email already exists",
+    "username": "Username already exists",
+}
+
+
+def already_exists_error(field):
+    return ValidationError(ALREADY_EXISTS_ERRORS[field], code="unique")
+
+
+def add_unique_violation_error(form, exc):
+    """Add an "already exists" error to the field of ``form`` whose unique
+    constraint ``exc`` violated. Re-raise ``exc`` if it can't be attributed
+    to any of the form's fields."""
+
+    fields = {
+        name: UNIQUE_FIELDS[name] for name in form.fields if name in UNIQUE_FIELDS
+    }
+    field = unique_violation_field(exc, fields)
+    if field is None:
+        raise exc
+    form.add_error(field, already_exists_error(field))
+
 
 class PhoneRegisterForm(forms.Form):
     """Form for user registration"""
 
     phone = PhoneNumberField()
-    username = forms.CharField(
-        required=app_settings.REGISTER_USERNAME_REQUIRED, validators=[validate_username]
-    )
-    email = forms.EmailField(required=app_settings.REGISTER_EMAIL_REQUIRED)
-    first_name = forms.CharField(required=app_settings.REGISTER_FNAME_REQUIRED)
-    last_name = forms.CharField(required=app_settings.REGISTER_LNAME_REQUIRED)
+    username = forms.CharField(validators=[validate_username])
+    email = forms.EmailField()
+    first_name = forms.CharField()
+    last_name = forms.CharField()
     password = forms.CharField(widget=forms.PasswordInput())
-    confirm_password = forms.CharField(
-        widget=forms.PasswordInput(),
-        required=app_settings.REGISTER_CONFIRM_PASSWORD_REQUIRED,
-    )
+    confirm_password = forms.CharField(widget=forms.PasswordInput())
+
+    # Fields whose required flag comes from a setting, read per form so
+    # that changing the setting takes effect without a restart.
+    required_settings = {
+        "username": "REGISTER_USERNAME_REQUIRED",
+        "email": "REGISTER_EMAIL_REQUIRED",
+        "first_name": "REGISTER_FNAME_REQUIRED",
+        "last_name": "REGISTER_LNAME_REQUIRED",
+        "confirm_password": "REGISTER_CONFIRM_PASSWORD_REQUIRED",
+    }
+
+    # Set by ais_valid(), which checks uniqueness itself with the async ORM.
+    _skip_taken_check = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field, setting in self.required_settings.items():
+            self.fields[field].required = getattr(app_settings, setting)
 
     def clean(self):
         errors = {}
@@ -51,26 +106,77 @@ class PhoneRegisterForm(forms.Form):
             if self.cleaned_data.get("password") != self.cleaned_data.get(
                 "confirm_password"
             ):
-                errors["confirm_password"] = "Password didn't match"
-        if self.cleaned_data.get("email", None) is not None:
-            if EmailAddress.objects.filter(
-                email__iexact=self.cleaned_data.get("email")
-            ).exists():
-                errors["email"] = "Email already exists"
-        if self.cleaned_data.get("phone", None) is not None:
-            if PhoneNumber.objects.filter(
-                phone=self.cleaned_data.get("phone")
-            ).exists():
-                errors["phone"] = "Phone already exists"
-        if self.cleaned_data.get("username", None) is not None:
-            if User.objects.filter(
-                username__exact=self.cleaned_data.get("username")
-            ).exists():
-                errors["username"] = "Username already exists"
+                errors["confirm_password"] = ValidationError(
+                    "Password didn't match", code="password_mismatch"
+                )
+        if not self._skip_taken_check:
+            for field in self._taken_fields():
+                errors[field] = already_exists_error(field)
 
         if errors:
             raise ValidationError(errors)
 
+    async def ais_valid(self):
+        """Async version of is_valid()"""
+
+        if not self.is_bound:
+            return False
+        self._skip_taken_check = True
+        try:
+            self.full_clean()
+        finally:
+            self._skip_taken_check = False
+
+        queryset = self._taken_fields_queryset()
+        if queryset is not None:
+            async for field in queryset:
+                self.add_error(field, already_exists_error(field))
+        return not self.errors
+
+    def _taken_fields(self):
+        """Return the names of the unique fields whose value is already in
+        use, with a single query."""
+
+        queryset = self._taken_fields_queryset()
+        if queryset is None:
+            return set()
+        return set(queryset)
+
+    def _taken_fields_queryset(self):
+        """Return a query listing the names of the unique fields whose value
+        is already in use, or None if there is nothing to check.
+
+        The bloom filter, when configured, rules out most new values without
+        querying at all.
+        """
+
+        queries = []
+        email = self.cleaned_data.get("email")
+        if email and might_exist(
+            AuthenticationMethod.EMAIL, LoginIdentifier.normalize_email(email)
+        ):
+            queries.append(EmailAddress.objects.filter(email__lower=email.lower()))
+        phone = self.cleaned_data.get("phone")
+        if phone and might_exist(
+            AuthenticationMethod.PHONE, LoginIdentifier.normalize_phone(phone)
+        ):
+            queries.append(
+                PhoneNumber.objects.filter(**PhoneNumber.phone_lookup(phone))
+            )
+        username = self.cleaned_data.get("username")
+        if username and might_exist(AuthenticationMethod.USERNAME, username):
+            queries.append(User.objects.filter(username__exact=username))
+
+        queries = [
+            queryset.annotate(
+                field=Value(FIELD_BY_MODEL[queryset.model], output_field=CharField())
+            ).values_list("field", flat=True)
+            for queryset in queries
+        ]
+        if not queries:
+            return None
+        return queries[0].union(*queries[1:])
+
     def _post_clean(self):
         super()._post_clean()
         # Validate the password after self.instance is updated with form data
@@ -89,36 +195,42 @@ class PhoneRegisterForm(forms.Form):
             self.add_error("password", error)
 
     def save(self):
-        try:
-            phone = self.cleaned_data.get("phone", None)
-            if phone is not None:
-                self.cleaned_data.pop("phone")
+        phone, email = self._pop_contacts()
+        self.cleaned_data["password"] = make_password(self.cleaned_data["password"])
+        self._create_user(phone, email)
+
+    async def asave(self):
+        phone, email = self._pop_contacts()
+        self.cleaned_data["password"] = await amake_password(
+            self.cleaned_data["password"]
+        )
+        # There is no async transaction API, run the inserts in one thread.
+        await sync_to_async(self._create_user)(phone, email)
 
-            if "confirm_password" in self.cleaned_data:
-                self.cleaned_data.pop("confirm_password")
+    def _pop_contacts(self):
+        phone = self.cleaned_data.get("phone", None)
+        if phone is not None:
+            self.cleaned_data.pop("phone")
 
-            username = self.cleaned_data.get("username")
-            if not username:
-                self.cleaned_data["username"] = uuid.uuid4().hex
+        if "confirm_password" in self.cleaned_data:
+            self.cleaned_data.pop("confirm_password")
 
-            email = self.cleaned_data.get("email", None)
+        username = self.cleaned_data.get("username")
+        if not username:
+            self.cleaned_data["username"] = uuid.uuid4().hex
 
-            self.cleaned_data["password"] = make_password(self.cleaned_data["password"])
+        return phone, self.cleaned_data.get("email", None)
 
+    def _create_user(self, phone, email):
+        try:
             with transaction.atomic():
                 user = User.objects.create(**self.cleaned_data)
                 if phone is not None:
                     PhoneNumber.objects.create(user=user, phone=phone)
-                if email is not None:
+                if email:
                     EmailAddress.objects.create(user=user, email=email)
-        except DatabaseError as e:
-            if "UNIQUE constraint" in e.args[0]:
-                if "phone" in e.args[0]:
-                    self.add_error("phone", "Phone already exists")
-                if "username" in e.args[0]:
-                    self.add_error("username", "Username already exists")
-                if "email" in e.args[0]:
-                    self.add_error("email", "Email already exists")
+        except IntegrityError as e:
+            add_unique_violation_error(self, e)
 
 
 class PhoneLoginForm(forms.Form):
@@ -162,46 +274,67 @@ class PhonePasswordResetForm(forms.Form):
 
     @staticmethod
     def get_users_and_method(login):
-        lookup_obj = Q()
-
-        is_phone = False
-        if PhoneValidationForm({"phone": login}).is_valid():
-            lookup_obj |= Q(phonenumber__phone=login)
-            is_phone = True
+        identifier = classify(
+            login, (AuthenticationMethod.PHONE, AuthenticationMethod.EMAIL)
+        )
+        if identifier is None:
+            return None, False
 
-        elif EmailValidationForm({"email": login}).is_valid():
-            lookup_obj |= Q(emailaddress__email__iexact=login)
+        user = resolve_user(identifier)
+        if user is None:
+            return None, False
+        return user, identifier.kind == AuthenticationMethod.PHONE
 
-        else:
+    @staticmethod
+    async def aget_users_and_method(login):
+        identifier = classify(
+            login, (AuthenticationMethod.PHONE, AuthenticationMethod.EMAIL)
+        )
+        if identifier is None:
             return None, False
 
-        try:
-            user = User.objects.get(lookup_obj)
-            return user, is_phone
-        except User.DoesNotExist:
+        user = await aresolve_user(identifier)
+        if user is None:
             return None, False
+        return user, identifier.kind == AuthenticationMethod.PHONE
 
     def save(self):
         login = self.cleaned_data.get("login", None)
         if login is not None:
             user, is_phone = self.get_users_and_method(login)
+            if user and claim_send("password_reset", self._get_contact(login)):
+                signal, kwargs = self._get_signal(user, is_phone, login)
+                send_signal(signal, self.__class__, **kwargs)
 
-            if user:
-                url = reverse(
-                    "phone_auth:phone_password_reset_confirm",
-                    kwargs={
-                        "uidb64": urlsafe_base64_encode(force_bytes(user.pk)),
-                        "token": default_token_generator.make_token(user),
-                    },
-                )
-                if is_phone:
-                    reset_password_phone.send(
-                        sender=self.__class__, user=user, url=url, phone=login
-                    )
-                else:
-                    reset_password_email.send(
-                        sender=self.__class__, user=user, url=url, email=login
-                    )
+    async def asave(self):
+        login = self.cleaned_data.get("login", None)
+        if login is not None:
+            user, is_phone = await self.aget_users_and_method(login)
+            if user and await aclaim_send("password_reset", self._get_contact(login)):
+                signal, kwargs = self._get_signal(user, is_phone, login)
+                await asend_signal(signal, self.__class__, **kwargs)
+
+    @staticmethod
+    def _get_contact(login):
+        # Only called for logins that resolved to a user.
+        return classify(
+            login, (AuthenticationMethod.PHONE, AuthenticationMethod.EMAIL)
+        ).value
+
+    @staticmethod
+    def _get_signal(user, is_phone, login):
+        """Return the signal to send for ``user`` and its arguments"""
+
+        url = reverse(
+            "phone_auth:phone_password_reset_confirm",
+            kwargs={
+                "uidb64": urlsafe_base64_encode(force_bytes(user.pk)),
+                "token": default_token_generator.make_token(user),
+            },
+        )
+        if is_phone:
+            return reset_password_phone, {"user": user, "url": url, "phone": login}
+        return reset_password_email, {"user": user, "url": url, "email": login}
 
 
 class PhoneEmailVerificationForm(forms.Form):
@@ -214,49 +347,96 @@ class PhoneEmailVerificationForm(forms.Form):
     method = forms.CharField(max_length=5)
     pk = forms.IntegerField()
 
+    # Outcomes of save(), stored in ``result``.
+    NOT_FOUND = "not_found"
+    ALREADY_VERIFIED = "already_verified"
+    SENT = "sent"
+
+    result = None
+
     def save(self, user):
+        """Send the verification and return the message shown to the user;
+        ``result`` tells the outcome."""
+
+        queryset = self._get_queryset(user)
+        obj = queryset.first() if queryset is not None else None
+        if obj is None:
+            return self._set_result(self.NOT_FOUND, obj)
+        if obj.is_verified:
+            return self._set_result(self.ALREADY_VERIFIED, obj)
+
+        # Repeated requests get the same answer without a new send.
+        if claim_send("verification", self._get_contact(obj)):
+            signal, kwargs = self.get_verification_signal(obj, user)
+            send_signal(signal, self.__class__, **kwargs)
+        return self._set_result(self.SENT, obj)
+
+    async def asave(self, user):
+        queryset = self._get_queryset(user)
+        obj = await queryset.afirst() if queryset is not None else None
+        if obj is None:
+            return self._set_result(self.NOT_FOUND, obj)
+        if obj.is_verified:
+            return self._set_result(self.ALREADY_VERIFIED, obj)
+
+        # Repeated requests get the same answer without a new send.
+        if await aclaim_send("verification", self._get_contact(obj)):
+            signal, kwargs = self.get_verification_signal(obj, user)
+            await asend_signal(signal, self.__class__, **kwargs)
+        return self._set_result(self.SENT, obj)
+
+    def _set_result(self, result, obj):
+        self.result = result
+        if result == self.NOT_FOUND:
+            return "Something Went Wrong"
+        if result == self.ALREADY_VERIFIED:
+            return f"{self._get_label(obj)} already Verified"
+        return f"{self._get_label(obj)} Verification Sent"
+
+    def _get_queryset(self, user):
         method = self.cleaned_data.get("method")
         pk = self.cleaned_data.get("pk")
         if method == "email":
-            try:
-                email_obj = EmailAddress.objects.get(user=user, pk=pk)
-                if email_obj.is_verified:
-                    return "Email already Verified"
+            return EmailAddress.objects.filter(user=user, pk=pk)
+        if method == "phone":
+            return PhoneNumber.objects.filter(user=user, pk=pk)
+        return None
 
-                url = self._get_token_url(
-                    email_obj=email_obj, phone_obj=None, user=user
-                )
-                verify_email.send(
-                    sender=self.__class__,
-                    user=user,
-                    url=url,
-                    email=email_obj.email,
-                )
-                return "Email Verification Sent"
-            except EmailAddress.DoesNotExist:
-                # In this case say email sent successfully
-                # to avoid user enumeration attack
-                pass
-        elif method == "phone":
-            try:
-                phone_obj = PhoneNumber.objects.get(user=user, pk=pk)
-                if phone_obj.is_verified:
-                    return "Phone already Verified"
-
-                url = self._get_token_url(
-                    email_obj=None, phone_obj=phone_obj, user=user
-                )
-                verify_phone.send(
-                    sender=self.__class__,
-                    user=user,
-                    url=url,
-                    phone=phone_obj.phone.__str__(),
-                )
-                return "Phone Verification Sent"
-            except PhoneNumber.DoesNotExist:
-                pass
+    @staticmethod
+    def _get_label(obj):
+        return "Email" if isinstance(obj, EmailAddress) else "Phone"
 
-        return "Something Went Wrong"
+    @staticmethod
+    def _get_contact(obj):
+        if isinstance(obj, EmailAddress):
+            return f"email:{obj.pk}"
+        return f"phone:{obj.pk}"
+
+    def send_verifications(self, objs, sender=None):
+        """Send the verification of many contacts (with their ``user``
+        loaded), queued with a single insert or delivered with one call per
+        backend."""
+
+        signals = [self.get_verification_signal(obj, obj.user) for obj in objs]
+        with batched():
+            send_signals(sender or self.__class__, signals)
+
+    def get_verification_signal(self, obj, user):
+        """Return the verification signal to send for ``obj`` (an
+        EmailAddress or PhoneNumber of ``user``) and its arguments"""
+
+        if isinstance(obj, EmailAddress):
+            url = self._get_token_url(email_obj=obj, phone_obj=None, user=user)
+            return verify_email, {"user": user, "url": url, "email": obj.email}
+        if app_settings.PHONE_VERIFICATION_METHOD == "code":
+            code = phone_code_generator.make_code(obj)
+            return verify_phone_code, {
+                "user": user,
+                "code": code,
+                "phone": str(obj.phone),
+            }
+        url = self._get_token_url(email_obj=None, phone_obj=obj, user=user)
+        return verify_phone, {"user": user, "url": url, "phone": str(obj.phone)}
 
     def _get_token_url(self, email_obj, phone_obj, user):
         token = phone_token_generator(
@@ -279,6 +459,107 @@ class PhoneEmailVerificationForm(forms.Form):
             return urlsafe_base64_encode(force_bytes(f"phone{phone_obj.pk}"))
 
 
+class PhoneVerificationCodeForm(forms.Form):
+    """Verify one of the user's pending phone numbers with the numeric code
+    sent in the verify_phone_code signal.
+
+    Attempts are counted per user until one succeeds; once
+    VERIFICATION_CODE_MAX_ATTEMPTS have failed, codes are rejected until the
+    counter expires.
+    """
+
+    code = forms.CharField(max_length=10)
+
+    def __init__(self, user, *args, **kwargs):
+        self.user = user
+        super().__init__(*args, **kwargs)
+
+    def save(self):
+        """Mark the phone number the code was made for as verified and
+        return it. Return None and add an error to the form otherwise."""
+
+        # Counted before the code is checked, so concurrent guesses can't
+        # all pass the check before any of them is counted.
+        if self._attempts_exceeded(self._count_attempt(get_cache())):
+            return None
+        phone_obj = self._match(
+            PhoneNumber.objects.filter(user=self.user, is_verified=False)
+        )
+        if phone_obj is None:
+            return None
+
+        phone_obj.is_verified = True
+        phone_obj.save(update_fields=["is_verified"])
+        get_cache().delete(self._attempts_key())
+        return phone_obj
+
+    async def asave(self):
+        cache = get_cache()
+        if self._attempts_exceeded(await self._acount_attempt(cache)):
+            return None
+        phone_obj = self._match(
+            [
+                phone_obj
+                async for phone_obj in PhoneNumber.objects.filter(
+                    user=self.user, is_verified=False
+                )
+            ]
+        )
+        if phone_obj is None:
+            return None
+
+        phone_obj.is_verified = True
+        await phone_obj.asave(update_fields=["is_verified"])
+        await cache.adelete(self._attempts_key())
+        return phone_obj
+
+    def _attempts_key(self):
+        return f"phone_auth:verification_code_attempts:{self.user.pk}"
+
+    def _attempts_exceeded(self, attempts):
+        if attempts <= app_settings.VERIFICATION_CODE_MAX_ATTEMPTS:
+            return False
+        self.add_error(
+            "code",
+            ValidationError(
+                "Too many attempts. Please request a new code later.",
+                code="throttled",
+            ),
+        )
+        return True
+
+    def _match(self, phone_objs):
+        code = self.cleaned_data.get("code", "").strip()
+        for phone_obj in phone_objs:
+            if phone_code_generator.check_code(phone_obj, code):
+                return phone_obj
+        self.add_error("code", ValidationError("Invalid code", code="invalid"))
+        return None
+
+    def _count_attempt(self, cache):
+        """Count an attempt and return the number of attempts so far"""
+
+        key = self._attempts_key()
+        timeout = app_settings.VERIFICATION_CODE_TIMEOUT
+        cache.add(key, 0, timeout=timeout)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # The key expired between add() and incr().
+            cache.set(key, 1, timeout=timeout)
+            return 1
+
+    async def _acount_attempt(self, cache):
+        key = self._attempts_key()
+        timeout = app_settings.VERIFICATION_CODE_TIMEOUT
+        await cache.aadd(key, 0, timeout=timeout)
+        try:
+            return await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, timeout=timeout)
+            return 1
+
+
 class PhoneLogoutForm(forms.Form):
     pass
 
@@ -291,11 +572,18 @@ class AddPhoneForm(forms.Form):
     def save(self, user):
         try:
             phone = self.cleaned_data.get("phone")
-            PhoneNumber.objects.create(user=user, phone=phone)
+            with transaction.atomic():
+                PhoneNumber.objects.create(user=user, phone=phone)
+        except IntegrityError as e:
+            add_unique_violation_error(self, e)
 
+    async def asave(self, user):
+        try:
+            await PhoneNumber.objects.acreate(
+                user=user, phone=self.cleaned_data.get("phone")
+            )
         except IntegrityError as e:
-            if "UNIQUE constraint" in e.args[0]:
-                self.add_error("phone", "Phone already exists")
+            add_unique_violation_error(self, e)
 
 
 class AddEmailForm(forms.Form):
@@ -306,8 +594,15 @@ class AddEmailForm(forms.Form):
     def save(self, user):
         try:
             email = self.cleaned_data.get("email")
-            EmailAddress.objects.create(user=user, email=email)
+            with transaction.atomic():
+                EmailAddress.objects.create(user=user, email=email)
+        except IntegrityError as e:
+            add_unique_violation_error(self, e)
 
+    async def asave(self, user):
+        try:
+            await EmailAddress.objects.acreate(
+                user=user, email=self.cleaned_data.get("email")
+            )
         except IntegrityError as e:
-            if "UNIQUE constraint" in e.args[0]:
-                self.add_error("email", "Email already exists")
+            add_unique_violation_error(self, e)
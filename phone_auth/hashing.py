@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import check_password, make_password
+
+from . import app_settings
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_hasher_executor():
+    """Return the executor that runs password hashing off the event loop.
+
+    The pool is created lazily and bounded by ``PASSWORD_HASHER_MAX_WORKERS``.
+    Hashers such as PBKDF2 release the GIL, so the workers hash in parallel.
+    """
+
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=app_settings.PASSWORD_HASHER_MAX_WORKERS,
+                    thread_name_prefix="phone_auth_hasher",
+                )
+    return _executor
+
+
+async def _run_in_executor(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hasher_executor(), func, *args)
+
+
+async def acheck_user_password(user, raw_password):
+    """Async counterpart of ``user.check_password()``.
+
+    Verification runs in the hasher executor; a required hash upgrade is
+    saved with the async ORM.
+    """
+
+    # check_password() calls the setter when the hash must be upgraded.
+    must_update = []
+    is_correct = await _run_in_executor(
+        check_password, raw_password, user.password, must_update.append
+    )
+    if is_correct and must_update:
+        # Same as user.set_password(), minus the password change bookkeeping:
+        # hash upgrades shouldn't be considered password changes.
+        user.password = await amake_password(raw_password)
+        await user.asave(update_fields=["password"])
+    return is_correct
+
+
+async def amake_password(raw_password):
+    """Async counterpart of ``make_password()``"""
+
+    return await _run_in_executor(make_password, raw_password)
+
+
+def init_hasher_process():
+    """Initializer for process pools that hash passwords.
+
+    Processes started with the ``spawn`` method don't inherit the configured
+    Django from their parent.
+    """
+
+    import django
+
+    django.setup()
+
+
+def make_passwords(raw_passwords):
+    """Hash a batch of passwords; submitted to process pools in one call to
+    keep inter-process overhead low."""
+
+    return [make_password(raw_password) for raw_password in raw_passwords]
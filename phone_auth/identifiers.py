@@ -0,0 +1,160 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+# noinspection PyUnresolvedReferences
+from phonenumber_field.phonenumber import to_python
+
+from .app_settings import AuthenticationMethod
+from .validators import get_username_regex
+
+PHONE_PARSE_CACHE_SIZE = 4096
+
+Identifier = namedtuple("Identifier", ["kind", "value", "raw"])
+Identifier.__doc__ = """A classified login identifier.
+
+kind -- name of the identifier kind (one of ``AuthenticationMethod``)
+value -- normalized value, suitable for lookups
+raw -- the stripped string as supplied by the user
+"""
+
+# User model lookups for each identifier kind's normalized value. Email
+# values are lowercased, matching the ``lower`` transform on the email field.
+USER_LOOKUPS = {
+    AuthenticationMethod.PHONE: "phonenumber__phone",
+    AuthenticationMethod.EMAIL: "emailaddress__email__lower",
+    AuthenticationMethod.USERNAME: "username__exact",
+}
+
+
+@lru_cache(maxsize=PHONE_PARSE_CACHE_SIZE)
+def _parse_phone(value, region):
+    phone = to_python(value, region=region)
+    if phone.is_valid():
+        return phone
+    return None
+
+
+def parse_phone(value):
+    """Parse ``value`` into a valid ``PhoneNumber`` or return ``None``.
+
+    Results are memoized in a bounded LRU keyed on the raw string, so the
+    returned instance is shared and must not be mutated.
+    """
+
+    if not value:
+        return None
+    region = getattr(settings, "PHONENUMBER_DEFAULT_REGION", None)
+    return _parse_phone(value, region)
+
+
+class IdentifierKind:
+    """A kind of login identifier.
+
+    ``candidate_regex`` is a cheap, precompiled pre-filter; strings that
+    don't match it are rejected without running ``normalize``.
+    """
+
+    name = None
+    candidate_regex = None
+
+    def match(self, value):
+        """Return the normalized form of ``value``, or ``None`` if it is not
+        an identifier of this kind."""
+
+        if self.candidate_regex is not None and not self.candidate_regex.match(value):
+            return None
+        return self.normalize(value)
+
+    def normalize(self, value):
+        raise NotImplementedError
+
+
+class PhoneIdentifier(IdentifierKind):
+    name = AuthenticationMethod.PHONE
+    # At least three digits and no "@": phonenumbers also parses tel: URIs,
+    # vanity letters (+1-800-FLOWERS) and extensions, so anything else is
+    # left to parse_phone().
+    candidate_regex = re.compile(r"^(?:[^@\d]*\d){3}[^@]*$")
+
+    def normalize(self, value):
+        phone = parse_phone(value)
+        if phone is None:
+            return None
+        return phone.as_e164
+
+
+class EmailIdentifier(IdentifierKind):
+    name = AuthenticationMethod.EMAIL
+    candidate_regex = re.compile(r"^[^@\s]+@[^@\s]+$")
+
+    def normalize(self, value):
+        try:
+            validate_email(value)
+        except ValidationError:
+            return None
+        return value.lower()
+
+
+class UsernameIdentifier(IdentifierKind):
+    name = AuthenticationMethod.USERNAME
+    candidate_regex = re.compile(get_username_regex())
+
+    def normalize(self, value):
+        return value
+
+
+class IdentifierRegistry:
+    """Ordered collection of identifier kinds.
+
+    Kinds are tried in registration order and the first match wins, so a
+    string that is both a valid phone number and a valid username is
+    classified as a phone number.
+    """
+
+    def __init__(self):
+        self._kinds = {}
+
+    def register(self, kind):
+        self._kinds[kind.name] = kind
+        return kind
+
+    def unregister(self, name):
+        self._kinds.pop(name, None)
+
+    def get(self, name):
+        return self._kinds[name]
+
+    def __iter__(self):
+        return iter(self._kinds.values())
+
+    def classify(self, value, methods=None):
+        """Classify ``value``, considering only the kinds named in
+        ``methods`` (all registered kinds if ``None``)."""
+
+        if not value:
+            return None
+        value = value.strip()
+        for kind in self._kinds.values():
+            if methods is not None and kind.name not in methods:
+                continue
+            normalized = kind.match(value)
+            if normalized is not None:
+                return Identifier(kind.name, normalized, value)
+        return None
+
+
+registry = IdentifierRegistry()
+registry.register(PhoneIdentifier())
+registry.register(EmailIdentifier())
+registry.register(UsernameIdentifier())
+
+
+def classify(value, methods=None):
+    """Classify ``value`` using the default registry"""
+
+    return registry.classify(value, methods)
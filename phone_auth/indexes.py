@@ -0,0 +1,29 @@
+from django.contrib.postgres.indexes import OpClass
+from django.db import models
+
+
+class PrefixIndex(models.Index):
+    """Index serving ``startswith`` lookups (``LIKE 'prefix%'``).
+
+    Unless the database uses the C collation, PostgreSQL only uses a B-tree
+    index for ``LIKE`` if it has a ``*_pattern_ops`` operator class, so the
+    index gets ``varchar_pattern_ops`` there, like the ``_like`` index
+    Django adds to ``unique`` text fields. It is a plain index elsewhere.
+    """
+
+    opclass = "varchar_pattern_ops"
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        index = self
+        if schema_editor.connection.vendor == "postgresql":
+            index = self.clone()
+            if index.expressions:
+                index.expressions = tuple(
+                    OpClass(expression, name=self.opclass)
+                    for expression in index.expressions
+                )
+            else:
+                index.opclasses = [self.opclass] * len(index.fields)
+        return super(PrefixIndex, index).create_sql(
+            model, schema_editor, using=using, **kwargs
+        )
@@ -0,0 +1,101 @@
+"""Map unique constraint violations to the fields that caused them.
+
+Each database reports a violation differently:
+
+- PostgreSQL: the constraint name and ``Key (column)=(value)`` detail are
+  available on the driver error's ``diag``.
+- MySQL/MariaDB: ``Duplicate entry '...' for key '[table.]key_name'``.
+- SQLite: ``UNIQUE constraint failed: table.column[, ...]`` or, for
+  expression constraints, ``UNIQUE constraint failed: index 'name'``.
+"""
+
+import re
+
+from django.db.models import F, UniqueConstraint
+
+_POSTGRES_KEY_RE = re.compile(r"Key \((?P<columns>.+?)\)=")
+_MYSQL_KEY_RE = re.compile(r"Duplicate entry '.*' for key '(?P<key>[^']+)'")
+_SQLITE_RE = re.compile(r"UNIQUE constraint failed: (?P<target>.+)$")
+_SQLITE_INDEX_RE = re.compile(r"index '(?P<name>[^']+)'")
+
+
+def violated_constraint_names(exc):
+    """Return the names an ``IntegrityError`` reports for the violated unique
+    constraint: constraint/index names and ``table.column`` pairs."""
+
+    names = set()
+    diag = getattr(exc.__cause__, "diag", None)
+    if diag is not None:
+        if diag.constraint_name:
+            names.add(diag.constraint_name)
+        match = _POSTGRES_KEY_RE.match(diag.message_detail or "")
+        if match and diag.table_name:
+            names.update(
+                f"{diag.table_name}.{column.strip()}"
+                for column in match.group("columns").split(",")
+            )
+
+    message = str(exc)
+    match = _MYSQL_KEY_RE.search(message)
+    if match:
+        key = match.group("key")
+        names.update({key, key.rsplit(".", 1)[-1]})
+
+    match = _SQLITE_RE.search(message)
+    if match:
+        target = match.group("target")
+        index = _SQLITE_INDEX_RE.match(target)
+        if index:
+            names.add(index.group("name"))
+        else:
+            names.update(column.strip() for column in target.split(","))
+
+    return names
+
+
+def _referenced_fields(expression):
+    if isinstance(expression, F):
+        yield expression.name
+    for source in getattr(expression, "get_source_expressions", lambda: [])():
+        yield from _referenced_fields(source)
+
+
+def unique_constraint_names(model, field_name):
+    """Return the names under which a violation of the unique constraint on
+    ``model.field_name`` can be reported."""
+
+    opts = model._meta
+    # Columns copied from the field, e.g. PhoneNumber's integer columns.
+    field_names = {field_name} | {
+        name
+        for name, source in getattr(model, "derived_fields", {}).items()
+        if source == field_name
+    }
+    names = set()
+    for name in field_names:
+        column = opts.get_field(name).column
+        # table.column as reported by SQLite, PostgreSQL and MySQL 8; the bare
+        # column is the key name of ``unique=True`` fields on older MySQL.
+        names.update({f"{opts.db_table}.{column}", column})
+    for constraint in opts.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            fields = set(constraint.fields)
+            for expression in constraint.expressions:
+                fields.update(_referenced_fields(expression))
+            if field_names & fields:
+                names.add(constraint.name)
+    return names
+
+
+def unique_violation_field(exc, fields):
+    """Return the form field whose unique constraint ``exc`` violated.
+
+    ``fields`` maps form field names to ``(model, model_field_name)``.
+    Returns ``None`` if the violation can't be attributed to any of them.
+    """
+
+    names = violated_constraint_names(exc)
+    for form_field, (model, field_name) in fields.items():
+        if names & unique_constraint_names(model, field_name):
+            return form_field
+    return None
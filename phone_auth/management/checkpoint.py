@@ -0,0 +1,27 @@
+import json
+import os
+
+
+class Checkpoint:
+    """Progress of a resumable management command, stored as a JSON file.
+
+    Without a path the checkpoint lives in memory only.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def set(self, key, value):
+        self.state[key] = value
+        if self.path:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from phone_auth.app_settings import AuthenticationMethod
+from phone_auth.management.checkpoint import Checkpoint
+from phone_auth.models import EmailAddress, LoginIdentifier, PhoneNumber
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Populate the LoginIdentifier table from existing users, phone numbers "
+        "and email addresses. Safe to interrupt and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            help="JSON file recording progress, so an interrupted run resumes "
+            "where it stopped.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete the existing identifiers first, e.g. ones left stale "
+            "while LOGIN_IDENTIFIER_LOOKUPS was disabled.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checkpoint = Checkpoint(options["checkpoint"])
+        # Not when resuming: the rows were inserted by the interrupted run.
+        if options["clear"] and not checkpoint.state:
+            LoginIdentifier.objects.all().delete()
+
+        sources = (
+            (
+                AuthenticationMethod.PHONE,
+                PhoneNumber.objects.all(),
+                lambda obj: (obj.user_id, LoginIdentifier.normalize_phone(obj.phone)),
+            ),
+            (
+                AuthenticationMethod.EMAIL,
+                EmailAddress.objects.all(),
+                lambda obj: (obj.user_id, LoginIdentifier.normalize_email(obj.email)),
+            ),
+            (
+                AuthenticationMethod.USERNAME,
+                User.objects.only("pk", User.USERNAME_FIELD),
+                lambda obj: (obj.pk, obj.get_username()),
+            ),
+        )
+
+        for kind, queryset, get_row in sources:
+            last_pk = checkpoint.get(kind, 0)
+            processed = 0
+            while True:
+                batch = list(
+                    queryset.filter(pk__gt=last_pk).order_by("pk")[:batch_size]
+                )
+                if not batch:
+                    break
+                identifiers = []
+                for obj in batch:
+                    user_id, value = get_row(obj)
+                    identifiers.append(
+                        LoginIdentifier(
+                            kind=kind, object_id=obj.pk, user_id=user_id, value=value
+                        )
+                    )
+                LoginIdentifier.objects.bulk_create(identifiers, ignore_conflicts=True)
+                processed += len(identifiers)
+                last_pk = batch[-1].pk
+                checkpoint.set(kind, last_pk)
+
+            self.stdout.write(f"{kind}: processed {processed} rows")
+
+        self.stdout.write(self.style.SUCCESS("Login identifiers backfilled"))
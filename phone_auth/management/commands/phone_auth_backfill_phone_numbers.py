@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from phone_auth.management.checkpoint import Checkpoint
+from phone_auth.models import PhoneNumber
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the country_code and national_number columns of existing phone "
+        "numbers. Safe to interrupt and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            help="JSON file recording progress, so an interrupted run resumes "
+            "where it stopped.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checkpoint = Checkpoint(options["checkpoint"])
+        queryset = PhoneNumber.objects.only(
+            "pk", "phone", "country_code", "national_number"
+        ).order_by("pk")
+
+        last_pk = checkpoint.get("phone_number", 0)
+        processed = updated = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            changed = []
+            for obj in batch:
+                parts = (obj.country_code, obj.national_number)
+                obj.sync_number()
+                if (obj.country_code, obj.national_number) != parts:
+                    changed.append(obj)
+            PhoneNumber.objects.bulk_update(
+                changed, ["country_code", "national_number"]
+            )
+            processed += len(batch)
+            updated += len(changed)
+            last_pk = batch[-1].pk
+            checkpoint.set("phone_number", last_pk)
+
+        self.stdout.write(f"phone: processed {processed} rows, updated {updated}")
+        self.stdout.write(self.style.SUCCESS("Phone number columns backfilled"))
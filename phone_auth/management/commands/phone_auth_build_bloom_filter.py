@@ -0,0 +1,96 @@
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from phone_auth import app_settings
+from phone_auth.app_settings import AuthenticationMethod
+from phone_auth.bloom import RELOAD_INTERVAL, BloomFilter, bloom_key
+from phone_auth.models import EmailAddress, LoginIdentifier, PhoneNumber
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the bloom filter of registered phone numbers, email addresses "
+        "and usernames used to reject unknown logins without a query."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path", help="Output file. Defaults to the BLOOM_FILTER_PATH setting."
+        )
+        parser.add_argument(
+            "--capacity",
+            type=int,
+            help="Number of identifiers to size the filter for. Defaults to "
+            "twice the current number, leaving room for growth.",
+        )
+        parser.add_argument("--error-rate", type=float, default=0.01)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument(
+            "--reload-wait",
+            type=float,
+            default=RELOAD_INTERVAL + 1,
+            help="Seconds to wait after replacing the file, for running "
+            "processes to reopen it, before adding the rows changed meanwhile.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"] or app_settings.BLOOM_FILTER_PATH
+        if not path:
+            raise CommandError("Set BLOOM_FILTER_PATH or pass --path.")
+
+        sources = (
+            (
+                AuthenticationMethod.PHONE,
+                PhoneNumber.objects.all(),
+                "phone",
+                LoginIdentifier.normalize_phone,
+            ),
+            (
+                AuthenticationMethod.EMAIL,
+                EmailAddress.objects.all(),
+                "email",
+                LoginIdentifier.normalize_email,
+            ),
+            (
+                AuthenticationMethod.USERNAME,
+                User.objects.all(),
+                User.USERNAME_FIELD,
+                str,
+            ),
+        )
+        capacity = options["capacity"]
+        if not capacity:
+            capacity = 2 * sum(queryset.count() for _, queryset, _, _ in sources)
+
+        def add_all(bloom_filter):
+            count = 0
+            for kind, queryset, field, normalize in sources:
+                values = queryset.values_list(field, flat=True)
+                for value in values.iterator(chunk_size=options["chunk_size"]):
+                    bloom_filter.add(bloom_key(kind, normalize(value)))
+                    count += 1
+            return count
+
+        tmp_path = f"{path}.tmp"
+        bloom_filter = BloomFilter.create(tmp_path, capacity, options["error_rate"])
+        add_all(bloom_filter)
+        os.replace(tmp_path, path)
+
+        # Until running processes reopen the file, the model signals add new
+        # and edited identifiers to the previous one. Once they all use the
+        # new file, a second pass adds the rows created or edited meanwhile;
+        # rows saved after that are added by the signals.
+        time.sleep(options["reload_wait"])
+        count = add_all(bloom_filter)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Bloom filter with {count} identifiers written to {path} "
+                f"({bloom_filter.num_bits // 8} bytes)"
+            )
+        )
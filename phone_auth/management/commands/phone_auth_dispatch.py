@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from phone_auth.delivery import close_backends
+from phone_auth.outbox import claim_messages, deliver
+
+
+class Command(BaseCommand):
+    help = (
+        "Send the phone_auth signals queued in the outbox when SIGNAL_DISPATCH "
+        "is 'outbox'. Run as many workers as needed; they don't claim the same "
+        "messages."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling again when the outbox is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no message is due instead of polling.",
+        )
+
+    def handle(self, *args, **options):
+        sent = failed = 0
+        try:
+            while True:
+                messages = claim_messages(options["batch_size"])
+                if not messages:
+                    if options["once"]:
+                        break
+                    time.sleep(options["sleep"])
+                    continue
+                for message in messages:
+                    if deliver(message):
+                        sent += 1
+                    else:
+                        failed += 1
+        except KeyboardInterrupt:
+            # Claimed messages that weren't delivered are retried once their
+            # lease expires.
+            pass
+        finally:
+            close_backends()
+
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} messages, {failed} failed"))
@@ -0,0 +1,136 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from phone_auth.models import EmailAddress, LoginIdentifier, PhoneNumber
+
+User = get_user_model()
+
+USER_FIELDS = (
+    "id",
+    "username",
+    "first_name",
+    "last_name",
+    "email",
+    "is_active",
+    "date_joined",
+    "last_login",
+)
+CSV_FIELDS = USER_FIELDS + ("phones", "emails")
+
+
+class Command(BaseCommand):
+    help = (
+        "Export users with their phone numbers, email addresses and "
+        "verification flags as JSON Lines or CSV, in constant memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=("jsonl", "csv"), default="jsonl", help="Output format."
+        )
+        parser.add_argument("--output", help="Output file. Defaults to stdout.")
+        parser.add_argument(
+            "--since-id",
+            type=int,
+            default=0,
+            help="Only export users with a greater id, for incremental exports.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        outfile = (
+            open(options["output"], "w", newline="") if options["output"] else None
+        )
+        try:
+            out = outfile or self.stdout
+            write = self.get_writer(out, options["format"])
+            last_id = options["since_id"]
+            count = 0
+            for user in self.iter_users(last_id, options["chunk_size"]):
+                write(user)
+                last_id = user["id"]
+                count += 1
+        finally:
+            if outfile is not None:
+                outfile.close()
+
+        # Report on stderr, stdout may be the export itself.
+        self.stderr.write(
+            self.style.SUCCESS(f"Exported {count} users, last id {last_id}")
+        )
+
+    @staticmethod
+    def get_writer(out, output_format):
+        if output_format == "jsonl":
+
+            def write(user):
+                out.write(json.dumps(user, default=str) + "\n")
+
+        else:
+            writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+
+            def write(user):
+                row = dict(user)
+                row["phones"] = " ".join(
+                    f"{phone['phone']}:{int(phone['is_verified'])}"
+                    for phone in user["phones"]
+                )
+                row["emails"] = " ".join(
+                    f"{email['email']}:{int(email['is_verified'])}"
+                    for email in user["emails"]
+                )
+                writer.writerow(row)
+
+        return write
+
+    @staticmethod
+    def iter_users(since_id, chunk_size):
+        """Yield users as dicts, with a constant number of queries per chunk.
+
+        Users are read with a server-side cursor where the database supports
+        it, and the phones and emails of each chunk are fetched with one
+        query per table.
+        """
+
+        users = (
+            User.objects.filter(pk__gt=since_id)
+            .order_by("pk")
+            .values(*USER_FIELDS)
+            .iterator(chunk_size=chunk_size)
+        )
+        while True:
+            chunk = list(islice(users, chunk_size))
+            if not chunk:
+                return
+            user_ids = [user["id"] for user in chunk]
+
+            phones = defaultdict(list)
+            for user_id, phone, is_verified in (
+                PhoneNumber.objects.filter(user_id__in=user_ids)
+                .order_by("pk")
+                .values_list("user_id", "phone", "is_verified")
+            ):
+                phones[user_id].append(
+                    {
+                        "phone": LoginIdentifier.normalize_phone(phone),
+                        "is_verified": is_verified,
+                    }
+                )
+            emails = defaultdict(list)
+            for user_id, email, is_verified in (
+                EmailAddress.objects.filter(user_id__in=user_ids)
+                .order_by("pk")
+                .values_list("user_id", "email", "is_verified")
+            ):
+                emails[user_id].append({"email": email, "is_verified": is_verified})
+
+            for user in chunk:
+                user["phones"] = phones[user["id"]]
+                user["emails"] = emails[user["id"]]
+                yield user
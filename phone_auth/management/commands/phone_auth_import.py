@@ -0,0 +1,382 @@
+import csv
+import json
+import os
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from phone_auth.app_settings import AuthenticationMethod
+from phone_auth.bloom import add_identifier
+from phone_auth.hashing import init_hasher_process, make_passwords
+from phone_auth.identifiers import parse_phone
+from phone_auth.management.checkpoint import Checkpoint
+from phone_auth.models import EmailAddress, LoginIdentifier, PhoneNumber
+from phone_auth.resolvers import invalidate_identifiers
+from phone_auth.validators import validate_username
+
+User = get_user_model()
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+USER_FIELDS = ("username", "first_name", "last_name")
+
+
+class RowError(Exception):
+    pass
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users with their phone numbers and email addresses from a CSV "
+        "or JSON Lines file. Columns/keys: phone, email, username, first_name, "
+        "last_name, password, phone_verified, email_verified."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "jsonl"),
+            help="Input format. Guessed from the file extension by default.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Processes hashing plaintext passwords.",
+        )
+        parser.add_argument(
+            "--hashed",
+            action="store_true",
+            help="Passwords are already hashed in a format Django understands.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="JSON file recording progress, so an interrupted import resumes "
+            "where it stopped.",
+        )
+        parser.add_argument(
+            "--errors",
+            help="CSV file listing rows that couldn't be imported. Defaults to "
+            "stderr.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        input_format = options["format"]
+        if input_format is None:
+            if path.endswith(".csv"):
+                input_format = "csv"
+            elif path.endswith((".jsonl", ".ndjson")):
+                input_format = "jsonl"
+            else:
+                raise CommandError("Can't guess the input format, pass --format.")
+
+        self.batch_size = options["batch_size"]
+        self.hashed = options["hashed"]
+        self.workers = options["workers"]
+        checkpoint = Checkpoint(options["checkpoint"])
+        done = checkpoint.get("rows", 0)
+        imported = failed = 0
+
+        if self.hashed:
+            executor = nullcontext()
+        else:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=init_hasher_process
+            )
+        infile = sys.stdin if path == "-" else open(path, newline="")
+        errors_path = options["errors"]
+        # Resumed runs add to the errors reported for the earlier rows.
+        append_errors = bool(done and errors_path and os.path.exists(errors_path))
+        errors_file = (
+            open(errors_path, "a" if append_errors else "w", newline="")
+            if errors_path
+            else None
+        )
+
+        try:
+            with executor:
+                self.executor = executor
+                self.errors = csv.writer(errors_file or self.stderr)
+                if not append_errors:
+                    self.errors.writerow(["row", "error"])
+
+                rows = enumerate(self.read_rows(infile, input_format), start=1)
+                rows = islice(rows, done, None)
+                while True:
+                    batch = list(islice(rows, self.batch_size))
+                    if not batch:
+                        break
+                    batch_imported = self.import_batch(batch)
+                    imported += batch_imported
+                    failed += len(batch) - batch_imported
+                    done = batch[-1][0]
+                    checkpoint.set("rows", done)
+                    self.stdout.write(f"{done} rows processed")
+        finally:
+            if infile is not sys.stdin:
+                infile.close()
+            if errors_file is not None:
+                errors_file.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {imported} users, {failed} rows failed")
+        )
+
+    @staticmethod
+    def read_rows(infile, input_format):
+        if input_format == "csv":
+            yield from csv.DictReader(infile)
+        else:
+            for line in infile:
+                if line.strip():
+                    yield json.loads(line)
+
+    def report(self, number, error):
+        self.errors.writerow([number, error])
+
+    def validate(self, row):
+        phone = parse_phone(str(row.get("phone") or "").strip())
+        if phone is None:
+            raise RowError("Invalid phone")
+
+        email = (row.get("email") or "").strip()
+        if email:
+            try:
+                validate_email(email)
+            except ValidationError:
+                raise RowError("Invalid email")
+
+        username = (row.get("username") or "").strip() or uuid.uuid4().hex
+        try:
+            validate_username(username)
+        except ValidationError:
+            raise RowError("Invalid username")
+
+        password = row.get("password") or ""
+        if not password:
+            raise RowError("Missing password")
+        if self.hashed:
+            try:
+                identify_hasher(password)
+            except ValueError:
+                raise RowError("Unknown password hash format")
+
+        return {
+            "phone": phone.as_e164,
+            "email": email,
+            "username": username,
+            "first_name": (row.get("first_name") or "").strip(),
+            "last_name": (row.get("last_name") or "").strip(),
+            "password": password,
+            "phone_verified": parse_bool(row.get("phone_verified")),
+            "email_verified": parse_bool(row.get("email_verified")),
+        }
+
+    def import_batch(self, batch):
+        records = []
+        seen = {"phone": set(), "email": set(), "username": set()}
+        for number, row in batch:
+            try:
+                record = self.validate(row)
+                keys = {
+                    "phone": record["phone"],
+                    "email": record["email"].lower(),
+                    "username": record["username"],
+                }
+                for field, key in keys.items():
+                    if key and key in seen[field]:
+                        raise RowError(f"Duplicate {field} in input")
+                for field, key in keys.items():
+                    seen[field].add(key)
+            except RowError as e:
+                self.report(number, e)
+                continue
+            record["number"] = number
+            records.append(record)
+
+        records = self.exclude_existing(records)
+        if not records:
+            return 0
+
+        if not self.hashed:
+            passwords = [record["password"] for record in records]
+            chunk_size = max(1, len(passwords) // (self.workers * 4))
+            passwords = iter(passwords)
+            chunks = iter(lambda: list(islice(passwords, chunk_size)), [])
+            hashed = [
+                encoded
+                for chunk in self.executor.map(make_passwords, chunks)
+                for encoded in chunk
+            ]
+            for record, encoded in zip(records, hashed):
+                record["password"] = encoded
+
+        try:
+            with transaction.atomic():
+                self.insert(records)
+        except IntegrityError:
+            # A concurrent write claimed one of the values after the checks;
+            # find the offending rows one by one.
+            inserted = []
+            for record in records:
+                try:
+                    with transaction.atomic():
+                        self.insert([record])
+                    inserted.append(record)
+                except IntegrityError as e:
+                    self.report(record["number"], e)
+            records = inserted
+
+        identifiers = []
+        for record in records:
+            identifiers.append((AuthenticationMethod.PHONE, record["phone"]))
+            identifiers.append((AuthenticationMethod.USERNAME, record["username"]))
+            if record["email"]:
+                identifiers.append(
+                    (AuthenticationMethod.EMAIL, record["email"].lower())
+                )
+        for kind, value in identifiers:
+            add_identifier(kind, value)
+        invalidate_identifiers(identifiers)
+        return len(records)
+
+    def exclude_existing(self, records):
+        """Report and drop records whose phone, email or username is taken"""
+
+        phones = set(
+            LoginIdentifier.normalize_phone(phone)
+            for phone in PhoneNumber.objects.filter(
+                phone__in=[record["phone"] for record in records]
+            ).values_list("phone", flat=True)
+        )
+        emails = set(
+            EmailAddress.objects.annotate(email_lower=Lower("email"))
+            .filter(
+                email_lower__in=[
+                    record["email"].lower() for record in records if record["email"]
+                ]
+            )
+            .values_list("email_lower", flat=True)
+        )
+        usernames = set(
+            User.objects.filter(
+                username__in=[record["username"] for record in records]
+            ).values_list("username", flat=True)
+        )
+
+        remaining = []
+        for record in records:
+            if record["phone"] in phones:
+                self.report(record["number"], "Phone already exists")
+            elif record["email"] and record["email"].lower() in emails:
+                self.report(record["number"], "Email already exists")
+            elif record["username"] in usernames:
+                self.report(record["number"], "Username already exists")
+            else:
+                remaining.append(record)
+        return remaining
+
+    @staticmethod
+    def insert(records):
+        users = User.objects.bulk_create(
+            [
+                User(
+                    email=record["email"],
+                    password=record["password"],
+                    **{field: record[field] for field in USER_FIELDS},
+                )
+                for record in records
+            ]
+        )
+        if users[0].pk is None:
+            # The backend can't return primary keys from bulk inserts.
+            pks = dict(
+                User.objects.filter(
+                    username__in=[user.username for user in users]
+                ).values_list("username", "pk")
+            )
+            for user in users:
+                user.pk = pks[user.username]
+
+        phones = [
+            PhoneNumber(
+                user=user,
+                phone=record["phone"],
+                is_verified=record["phone_verified"],
+            )
+            for user, record in zip(users, records)
+        ]
+        for phone in phones:
+            # bulk_create() doesn't call save().
+            phone.sync_number()
+        phones = PhoneNumber.objects.bulk_create(phones)
+        emails = EmailAddress.objects.bulk_create(
+            [
+                EmailAddress(
+                    user=user,
+                    email=record["email"],
+                    is_verified=record["email_verified"],
+                )
+                for user, record in zip(users, records)
+                if record["email"]
+            ]
+        )
+        if phones[0].pk is None:
+            pks = dict(
+                PhoneNumber.objects.filter(user__in=users).values_list("user_id", "pk")
+            )
+            for phone in phones:
+                phone.pk = pks[phone.user_id]
+            pks = dict(
+                EmailAddress.objects.filter(user__in=users).values_list("user_id", "pk")
+            )
+            for email in emails:
+                email.pk = pks[email.user_id]
+
+        # Bulk inserts don't send the signals that keep LoginIdentifier in sync.
+        identifiers = [
+            LoginIdentifier(
+                kind=AuthenticationMethod.USERNAME,
+                object_id=user.pk,
+                user_id=user.pk,
+                value=user.username,
+            )
+            for user in users
+        ]
+        identifiers += [
+            LoginIdentifier(
+                kind=AuthenticationMethod.PHONE,
+                object_id=phone.pk,
+                user_id=phone.user_id,
+                value=LoginIdentifier.normalize_phone(phone.phone),
+            )
+            for phone in phones
+        ]
+        identifiers += [
+            LoginIdentifier(
+                kind=AuthenticationMethod.EMAIL,
+                object_id=email.pk,
+                user_id=email.user_id,
+                value=LoginIdentifier.normalize_email(email.email),
+            )
+            for email in emails
+        ]
+        LoginIdentifier.objects.bulk_create(identifiers)
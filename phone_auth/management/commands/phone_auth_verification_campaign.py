@@ -0,0 +1,99 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from phone_auth.forms import PhoneEmailVerificationForm
+from phone_auth.management.checkpoint import Checkpoint
+from phone_auth.models import EmailAddress, PhoneNumber
+
+
+class Command(BaseCommand):
+    help = (
+        "Send a verification to every unverified phone number and/or email "
+        "address of active users, like PhoneEmailVerificationForm does for one "
+        "contact. Safe to interrupt and run again with the same checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--contacts",
+            choices=("phone", "email", "all"),
+            default="all",
+            help="Contacts to verify.",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Maximum verifications sent per second. Unlimited by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Verifications sent, or queued in the outbox, together.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument(
+            "--checkpoint",
+            help="JSON file recording progress, so an interrupted campaign "
+            "resumes where it stopped.",
+        )
+
+    def handle(self, *args, **options):
+        self.rate = options["rate"]
+        self.batch_size = options["batch_size"]
+        if self.rate:
+            # A batch must not exceed one second's worth of messages.
+            self.batch_size = max(1, min(self.batch_size, int(self.rate)))
+        checkpoint = Checkpoint(options["checkpoint"])
+        form = PhoneEmailVerificationForm()
+
+        sources = []
+        if options["contacts"] in ("phone", "all"):
+            sources.append(("phone", PhoneNumber))
+        if options["contacts"] in ("email", "all"):
+            sources.append(("email", EmailAddress))
+
+        self.started = time.monotonic()
+        self.sent = 0
+        for name, model in sources:
+            last_pk = checkpoint.get(name, 0)
+            sent = 0
+            for batch in self.iter_batches(model, last_pk, options["chunk_size"]):
+                self.throttle()
+                form.send_verifications(batch, sender=self.__class__)
+                sent += len(batch)
+                self.sent += len(batch)
+                checkpoint.set(name, batch[-1].pk)
+            self.stdout.write(f"{name}: sent {sent} verifications")
+
+        self.stdout.write(self.style.SUCCESS(f"Sent {self.sent} verifications"))
+
+    def iter_batches(self, model, last_pk, chunk_size):
+        """Yield unverified contacts in batches, in primary key order"""
+
+        queryset = (
+            model.objects.filter(is_verified=False, user__is_active=True)
+            .select_related("user")
+            .order_by("pk")
+        )
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                return
+            for start in range(0, len(chunk), self.batch_size):
+                end = start + self.batch_size
+                yield chunk[start:end]
+            if len(chunk) < chunk_size:
+                return
+            last_pk = chunk[-1].pk
+
+    def throttle(self):
+        """Sleep until sending the next batch keeps under the rate ceiling"""
+
+        if not self.rate:
+            return
+        delay = self.started + self.sent / self.rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,73 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from .backend import CustomAuthBackend
+from .bearer import read_access_token
+from .status import ContactStatus
+
+
+class ContactStatusMiddleware(MiddlewareMixin):
+    """Set ``request.phone_auth`` to the user's ``ContactStatus``, loaded
+    lazily. Must come after ``AuthenticationMiddleware``."""
+
+    def process_request(self, request):
+        request.phone_auth = ContactStatus(request)
+
+
+def get_token_request_user(request):
+    """Return the user instance of a request authenticated by an access
+    token, or an ``AnonymousUser`` if it was deleted or deactivated."""
+
+    if not hasattr(request, "_cached_token_user"):
+        user = CustomAuthBackend().get_user(request.token_user.pk)
+        request._cached_token_user = user or AnonymousUser()
+    return request._cached_token_user
+
+
+class BearerTokenMiddleware(MiddlewareMixin):
+    """Authenticate requests carrying an ``Authorization: Bearer <access
+    token>`` header, without loading the session. Must come after
+    ``AuthenticationMiddleware``.
+
+    Views of the JSON API (``accepts_token_user`` set) get the
+    ``phone_auth.bearer.TokenUser`` of the token, which needs no query.
+    Other views get the user instance, loaded on first access.
+
+    Invalid and expired tokens get a 401 response. CSRF checks are skipped
+    for token requests: browsers don't add the header on their own.
+    """
+
+    def process_request(self, request):
+        scheme, _, token = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+        if scheme.lower() != "bearer":
+            return None
+        token_user = read_access_token(token.strip())
+        if token_user is None:
+            response = JsonResponse({"error": "invalid_token"}, status=401)
+            response["WWW-Authenticate"] = 'Bearer error="invalid_token"'
+            return response
+
+        async def auser():
+            return await sync_to_async(get_token_request_user)(request)
+
+        request.token_user = token_user
+        request.user = SimpleLazyObject(lambda: get_token_request_user(request))
+        request.auser = auser
+        request._dont_enforce_csrf_checks = True
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        token_user = getattr(request, "token_user", None)
+        view_class = getattr(view_func, "view_class", None)
+        if token_user is None or not getattr(view_class, "accepts_token_user", False):
+            return None
+
+        async def auser():
+            return token_user
+
+        request.user = token_user
+        request.auser = auser
+        return None
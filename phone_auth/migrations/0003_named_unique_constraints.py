@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-17 23:43
+
+import django.db.models.functions.text
+import phonenumber_field.modelfields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("phone_auth", "0002_loginidentifier"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="emailaddress",
+            name="email",
+            field=models.EmailField(max_length=254),
+        ),
+        migrations.AlterField(
+            model_name="phonenumber",
+            name="phone",
+            field=phonenumber_field.modelfields.PhoneNumberField(
+                max_length=128, region=None
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="emailaddress",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Lower("email"),
+                name="phone_auth_emailaddress_email_uniq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="phonenumber",
+            constraint=models.UniqueConstraint(
+                fields=("phone",), name="phone_auth_phonenumber_phone_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-18 00:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+import phone_auth.operations
+
+
+class Migration(migrations.Migration):
+    # Indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL, which
+    # can't run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("phone_auth", "0004_outboxmessage"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        phone_auth.operations.AddIndexConcurrently(
+            model_name="emailaddress",
+            index=models.Index(
+                fields=["user", "is_verified"], name="phone_auth_email_user_ver_idx"
+            ),
+        ),
+        phone_auth.operations.AddIndexConcurrently(
+            model_name="emailaddress",
+            index=models.Index(
+                condition=models.Q(("is_verified", True)),
+                fields=["user"],
+                name="phone_auth_email_verified_idx",
+            ),
+        ),
+        phone_auth.operations.AddIndexConcurrently(
+            model_name="phonenumber",
+            index=models.Index(
+                fields=["user", "is_verified"], name="phone_auth_phone_user_ver_idx"
+            ),
+        ),
+        phone_auth.operations.AddIndexConcurrently(
+            model_name="phonenumber",
+            index=models.Index(
+                condition=models.Q(("is_verified", True)),
+                fields=["user"],
+                name="phone_auth_phone_verified_idx",
+            ),
+        ),
+    ]
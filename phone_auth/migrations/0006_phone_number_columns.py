@@ -0,0 +1,32 @@
+# Generated by Django 5.1.15 on 2026-10-18 00:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("phone_auth", "0005_verified_contact_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="phonenumber",
+            name="country_code",
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="phonenumber",
+            name="national_number",
+            field=models.PositiveBigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="phonenumber",
+            constraint=models.UniqueConstraint(
+                fields=("country_code", "national_number"),
+                name="phone_auth_phonenumber_number_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-18 00:53
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations
+
+import phone_auth.indexes
+import phone_auth.operations
+
+
+class Migration(migrations.Migration):
+    # Indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL, which
+    # can't run in a transaction.
+    atomic = False
+
+    dependencies = [
+        ("phone_auth", "0007_refreshtoken"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        phone_auth.operations.AddIndexConcurrently(
+            model_name="emailaddress",
+            index=phone_auth.indexes.PrefixIndex(
+                django.db.models.functions.text.Lower("email"),
+                name="phone_auth_email_prefix_idx",
+            ),
+        ),
+        phone_auth.operations.AddIndexConcurrently(
+            model_name="phonenumber",
+            index=phone_auth.indexes.PrefixIndex(
+                fields=["phone"], name="phone_auth_phone_prefix_idx"
+            ),
+        ),
+    ]
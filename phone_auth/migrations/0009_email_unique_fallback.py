@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 01:27
+
+from django.conf import settings
+from django.db import migrations
+
+import phone_auth.constraints
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("phone_auth", "0008_prefix_search_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="emailaddress",
+            constraint=phone_auth.constraints.ExpressionFallbackUniqueConstraint(
+                fields=("email",), name="phone_auth_emailaddress_email_exact_uniq"
+            ),
+        ),
+    ]
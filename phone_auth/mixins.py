@@ -2,6 +2,7 @@ from django.contrib.auth.mixins import AccessMixin
 from django.shortcuts import redirect
 
 from . import app_settings
+from .status import get_contact_status
 
 
 class AnonymousRequiredMixin(AccessMixin):
@@ -17,10 +18,7 @@ class VerifiedPhoneRequiredMixin(AccessMixin):
     """Verify that the user has verified phone."""
 
     def dispatch(self, request, *args, **kwargs):
-        if (
-            request.user.is_authenticated
-            and request.user.phonenumber_set.filter(is_verified=True).exists()
-        ):
+        if get_contact_status(request).has_verified_phone:
             return super().dispatch(request, *args, **kwargs)
         return redirect("phone_auth:phone_email_verification")
 
@@ -29,9 +27,28 @@ class VerifiedEmailRequiredMixin(AccessMixin):
     """Verify that the user has verified email."""
 
     def dispatch(self, request, *args, **kwargs):
-        if (
-            request.user.is_authenticated
-            and request.user.emailaddress_set.filter(is_verified=True).exists()
-        ):
+        if get_contact_status(request).has_verified_email:
             return super().dispatch(request, *args, **kwargs)
         return redirect("phone_auth:phone_email_verification")
+
+
+class AsyncAnonymousRequiredMixin(AccessMixin):
+    """Verify that the current user is anonymous, for async views."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Resolve the user once with the async ORM; request.user would
+        # query synchronously on first access.
+        request.user = await request.auser()
+        if request.user.is_anonymous:
+            return await super().dispatch(request, *args, **kwargs)
+        return redirect(app_settings.LOGIN_REDIRECT_URL)
+
+
+class AsyncLoginRequiredMixin(AccessMixin):
+    """Verify that the current user is authenticated, for async views."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
@@ -1,25 +1,276 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 
 # noinspection PyUnresolvedReferences
 from phonenumber_field.modelfields import PhoneNumberField
 
+from . import app_settings
+from .app_settings import AuthenticationMethod
+from .constraints import ExpressionFallbackUniqueConstraint
+from .identifiers import parse_phone
+from .indexes import PrefixIndex
+
 User = get_user_model()
 
 
 class PhoneNumber(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    phone = PhoneNumberField(unique=True, blank=False)
+    phone = PhoneNumberField(blank=False)
     is_verified = models.BooleanField(default=False)
+    # Integer copy of ``phone``, kept in sync on save. NULL for numbers that
+    # can't be stored as integers, see split_phone().
+    country_code = models.PositiveSmallIntegerField(null=True, editable=False)
+    national_number = models.PositiveBigIntegerField(null=True, editable=False)
+
+    # Columns derived from another field, for mapping unique violations.
+    derived_fields = {"country_code": "phone", "national_number": "phone"}
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["phone"], name="phone_auth_phonenumber_phone_uniq"
+            ),
+            models.UniqueConstraint(
+                fields=["country_code", "national_number"],
+                name="phone_auth_phonenumber_number_uniq",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "is_verified"], name="phone_auth_phone_user_ver_idx"
+            ),
+            # Only verified rows: small, and what the verified checks probe.
+            models.Index(
+                fields=["user"],
+                condition=models.Q(is_verified=True),
+                name="phone_auth_phone_verified_idx",
+            ),
+            # Prefix searches of the admin.
+            PrefixIndex(fields=["phone"], name="phone_auth_phone_prefix_idx"),
+        ]
 
     def __str__(self):
         return str(self.phone)
 
+    def save(self, *args, **kwargs):
+        self.sync_number()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {
+                *update_fields,
+                "country_code",
+                "national_number",
+            }
+        super().save(*args, **kwargs)
+
+    def sync_number(self):
+        """Copy ``phone`` into the integer columns; called by ``save()``,
+        but not by ``bulk_create()`` or ``QuerySet.update()``."""
+
+        self.country_code, self.national_number = self.split_phone(self.phone)
+
+    @staticmethod
+    def split_phone(phone):
+        """Return ``(country_code, national_number)`` of a valid phone number
+        (a ``PhoneNumber`` or string), or ``(None, None)``.
+
+        Numbers with significant leading zeros (e.g. Italian landlines) lose
+        them as integers and could collide with another number, so they
+        aren't split.
+        """
+
+        if isinstance(phone, str):
+            phone = parse_phone(phone)
+        if not phone or not phone.is_valid() or phone.italian_leading_zero:
+            return None, None
+        return phone.country_code, phone.national_number
+
+    @classmethod
+    def phone_lookup(cls, phone, prefix=""):
+        """Return the filter keyword arguments matching ``phone``, on the
+        integer columns with ``INTEGER_PHONE_LOOKUPS``.
+
+        ``prefix`` is the path to the PhoneNumber model, e.g.
+        ``"phonenumber__"`` from the user model.
+        """
+
+        if app_settings.INTEGER_PHONE_LOOKUPS:
+            country_code, national_number = cls.split_phone(phone)
+            if country_code is not None:
+                return {
+                    f"{prefix}country_code": country_code,
+                    f"{prefix}national_number": national_number,
+                }
+        return {f"{prefix}phone": phone}
+
 
 class EmailAddress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    email = models.EmailField(unique=True, blank=False)
+    email = models.EmailField(blank=False)
     is_verified = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            # Case-insensitive, like the lookups done at login and signup.
+            models.UniqueConstraint(
+                Lower("email"), name="phone_auth_emailaddress_email_uniq"
+            ),
+            # Databases that skip the one above get a unique column instead.
+            ExpressionFallbackUniqueConstraint(
+                fields=["email"], name="phone_auth_emailaddress_email_exact_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "is_verified"], name="phone_auth_email_user_ver_idx"
+            ),
+            models.Index(
+                fields=["user"],
+                condition=models.Q(is_verified=True),
+                name="phone_auth_email_verified_idx",
+            ),
+            # Case-insensitive prefix searches of the admin.
+            PrefixIndex(Lower("email"), name="phone_auth_email_prefix_idx"),
+        ]
+
     def __str__(self):
         return self.email
+
+
+# ``email__lower=value.lower()`` compiles to the same LOWER("email") expression
+# as the unique constraint and prefix index, so lookups can use them; iexact
+# compiles to UPPER() on some backends.
+EmailAddress._meta.get_field("email").register_lookup(Lower)
+
+
+class LoginIdentifierManager(models.Manager):
+    def sync(self, kind, object_id, user_id, value, created=False):
+        """Create or update the identifier for the given source row, in a
+        single query.
+
+        ``object_id`` is the pk of the PhoneNumber/EmailAddress row, or of
+        the user for usernames. A value already claimed by another row
+        (e.g. an email that only differs in case) keeps its identifier.
+        """
+
+        if created:
+            self.bulk_create(
+                [
+                    self.model(
+                        kind=kind, object_id=object_id, user_id=user_id, value=value
+                    )
+                ],
+                ignore_conflicts=True,
+            )
+            return
+        # Matches no row when the value didn't change, e.g. a full user save
+        # on login or password change, so nothing is written.
+        self.filter(kind=kind, object_id=object_id).exclude(value=value).exclude(
+            models.Exists(self.filter(kind=kind, value=value))
+        ).update(user_id=user_id, value=value)
+
+    def remove(self, kind, object_id):
+        self.filter(kind=kind, object_id=object_id).delete()
+
+
+class LoginIdentifier(models.Model):
+    """Denormalized phone/email/username of a user.
+
+    Lets any identifier be resolved to its user with a single lookup on
+    the (kind, value) unique index.
+    """
+
+    KIND_CHOICES = (
+        (AuthenticationMethod.PHONE, "Phone"),
+        (AuthenticationMethod.EMAIL, "Email"),
+        (AuthenticationMethod.USERNAME, "Username"),
+    )
+
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    value = models.CharField(max_length=254)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+
+    objects = LoginIdentifierManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "value"], name="phone_auth_identifier_value_uniq"
+            ),
+            models.UniqueConstraint(
+                fields=["kind", "object_id"], name="phone_auth_identifier_object_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.value}"
+
+    @staticmethod
+    def normalize_phone(phone):
+        return phone.as_e164 if phone.is_valid() else str(phone)
+
+    @staticmethod
+    def normalize_email(email):
+        return email.lower()
+
+
+class OutboxMessage(models.Model):
+    """A phone_auth signal waiting to be sent by the phone_auth_dispatch
+    command, when SIGNAL_DISPATCH is ``"outbox"``.
+
+    ``available_at`` is when the message may next be claimed; it is cleared,
+    along with the payload, once the message has failed OUTBOX_MAX_ATTEMPTS
+    times.
+    """
+
+    signal = models.CharField(max_length=32)
+    sender = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    payload = models.JSONField(default=dict)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(null=True, default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["available_at"], name="phone_auth_outbox_avail_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.signal} to user {self.user_id}"
+
+
+class RefreshToken(models.Model):
+    """A refresh token issued to an API client, see ``phone_auth.bearer``.
+
+    Only the SHA-256 hash of the token is stored. Each token is used once:
+    refreshing marks it used and issues the next token of its ``family``.
+    ``session_hash`` is the user's session auth hash when the family was
+    started, so changing the password revokes it.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    token_hash = models.CharField(max_length=64)
+    family = models.UUIDField()
+    session_hash = models.CharField(max_length=128)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    used_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["token_hash"], name="phone_auth_refreshtoken_hash_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["family"], name="phone_auth_refresh_family_idx"),
+            models.Index(fields=["expires_at"], name="phone_auth_refresh_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"refresh token {self.pk} of user {self.user_id}"
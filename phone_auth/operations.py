@@ -0,0 +1,46 @@
+from django.db import NotSupportedError
+from django.db.migrations.operations import AddIndex
+
+
+class AddIndexConcurrently(AddIndex):
+    """Create an index without blocking writes where the database can.
+
+    On PostgreSQL the index is built with ``CREATE INDEX CONCURRENTLY``, like
+    ``django.contrib.postgres.operations.AddIndexConcurrently``, which can't
+    be imported without a PostgreSQL driver. Other databases run a plain
+    ``AddIndex``; MySQL's InnoDB builds indexes online by default. The
+    migration must set ``atomic = False``.
+    """
+
+    atomic = False
+
+    def describe(self):
+        return f"Create index {self.index.name} on {self.model_name}, concurrently"
+
+    def _concurrently(self, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return False
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                f"The {self.__class__.__name__} operation cannot be executed "
+                "inside a transaction (set atomic = False on the migration)."
+            )
+        return True
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not self._concurrently(schema_editor):
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not self._concurrently(schema_editor):
+            return super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
@@ -0,0 +1,139 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import app_settings
+from .models import OutboxMessage
+from .signals import SIGNAL_NAMES, SIGNALS
+
+logger = logging.getLogger(__name__)
+
+
+def _outbox_message(signal, sender, user, kwargs):
+    return OutboxMessage(
+        signal=SIGNAL_NAMES[signal],
+        sender=f"{sender.__module__}.{sender.__qualname__}",
+        user=user,
+        payload=kwargs,
+    )
+
+
+def send_signal(signal, sender, user, **kwargs):
+    """Send ``signal`` now, or queue it in the outbox when SIGNAL_DISPATCH is
+    ``"outbox"``.
+
+    Queued messages are written in the current transaction, so they are
+    only sent if it commits. Arguments other than ``user`` must be JSON
+    serializable.
+    """
+
+    if app_settings.SIGNAL_DISPATCH == "outbox":
+        _outbox_message(signal, sender, user, kwargs).save()
+    else:
+        signal.send(sender=sender, user=user, **kwargs)
+
+
+async def asend_signal(signal, sender, user, **kwargs):
+    if app_settings.SIGNAL_DISPATCH == "outbox":
+        await _outbox_message(signal, sender, user, kwargs).asave()
+    else:
+        await signal.asend(sender=sender, user=user, **kwargs)
+
+
+def send_signals(sender, signals):
+    """Send, or queue with a single insert, many signals at once.
+
+    ``signals`` is a list of ``(signal, kwargs)``, where ``kwargs`` include
+    ``user``.
+    """
+
+    if app_settings.SIGNAL_DISPATCH == "outbox":
+        OutboxMessage.objects.bulk_create(
+            [
+                _outbox_message(
+                    signal,
+                    sender,
+                    kwargs["user"],
+                    {key: value for key, value in kwargs.items() if key != "user"},
+                )
+                for signal, kwargs in signals
+            ]
+        )
+    else:
+        for signal, kwargs in signals:
+            signal.send(sender=sender, **kwargs)
+
+
+def claim_messages(batch_size):
+    """Lease up to ``batch_size`` due messages to the caller.
+
+    Rows locked by other workers are skipped. A claimed message isn't due
+    again until OUTBOX_LEASE seconds have passed, so messages of a worker
+    that dies are picked up by another one.
+    """
+
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            # Only the outbox rows: the users joined below stay unlocked.
+            OutboxMessage.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(available_at__lte=now)
+            .select_related("user")
+            .order_by("available_at")[:batch_size]
+        )
+        if messages:
+            OutboxMessage.objects.filter(pk__in=[m.pk for m in messages]).update(
+                available_at=now + timedelta(seconds=app_settings.OUTBOX_LEASE)
+            )
+    return messages
+
+
+def deliver(message):
+    """Send ``message``'s signal to its receivers and return True if none
+    of them raised.
+
+    Delivered messages are deleted. Failed ones are retried with
+    exponential backoff, up to OUTBOX_MAX_ATTEMPTS times, then kept with
+    their payload cleared: it may hold password reset links and codes.
+    Receivers that succeeded are called again on retry, so they should
+    tolerate duplicates.
+    """
+
+    try:
+        signal = SIGNALS[message.signal]
+        sender = import_string(message.sender)
+    except (KeyError, ImportError) as e:
+        # E.g. a sender class renamed since the message was queued.
+        errors = [f"{message.signal} from {message.sender}: {e!r}"]
+    else:
+        responses = signal.send_robust(
+            sender=sender, user=message.user, **message.payload
+        )
+        errors = [
+            f"{receiver.__module__}.{receiver.__qualname__}: {response!r}"
+            for receiver, response in responses
+            if isinstance(response, Exception)
+        ]
+    if not errors:
+        message.delete()
+        return True
+
+    message.attempts += 1
+    message.last_error = "\n".join(errors)
+    if message.attempts >= app_settings.OUTBOX_MAX_ATTEMPTS:
+        logger.error(
+            "Giving up on outbox message %s after %s attempts:\n%s",
+            message.pk,
+            message.attempts,
+            message.last_error,
+        )
+        message.available_at = None
+        message.payload = {}
+    else:
+        delay = app_settings.OUTBOX_RETRY_DELAY * 2 ** (message.attempts - 1)
+        message.available_at = timezone.now() + timedelta(seconds=delay)
+    message.save(update_fields=["attempts", "last_error", "available_at", "payload"])
+    return False
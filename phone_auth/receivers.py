@@ -0,0 +1,161 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import app_settings
+from .app_settings import AuthenticationMethod
+from .bloom import add_identifier
+from .delivery import deliver
+from .models import EmailAddress, LoginIdentifier, PhoneNumber
+from .resolvers import invalidate_identifier, invalidate_user
+from .signals import SIGNAL_NAMES, SIGNALS
+from .status import invalidate_contact_status
+
+User = get_user_model()
+
+
+# LoginIdentifier rows are only maintained while LOGIN_IDENTIFIER_LOOKUPS is
+# enabled; phone_auth_backfill_identifiers --clear rebuilds them.
+
+
+def _field_saved(field, update_fields):
+    return update_fields is None or field in update_fields
+
+
+def _remember_previous_value(sender, instance, field, update_fields):
+    """Store the value ``field`` has in the database before it gets updated,
+    so that the cache entry of the old identifier can be invalidated too."""
+
+    instance._phone_auth_previous_value = None
+    if (
+        app_settings.IDENTIFIER_CACHE_TIMEOUT
+        and not instance._state.adding
+        and _field_saved(field, update_fields)
+    ):
+        instance._phone_auth_previous_value = (
+            sender._default_manager.filter(pk=instance.pk)
+            .values_list(field, flat=True)
+            .first()
+        )
+
+
+def _identifier_saved(kind, instance, value, normalize=str):
+    add_identifier(kind, normalize(value))
+    invalidate_identifier(kind, normalize(value))
+    previous_value = getattr(instance, "_phone_auth_previous_value", None)
+    if previous_value:
+        invalidate_identifier(kind, normalize(previous_value))
+
+
+@receiver(pre_save, sender=PhoneNumber)
+def remember_previous_phone(sender, instance, update_fields=None, **kwargs):
+    _remember_previous_value(sender, instance, "phone", update_fields)
+
+
+@receiver(post_save, sender=PhoneNumber)
+def sync_phone_identifier(sender, instance, created, update_fields=None, **kwargs):
+    if _field_saved("phone", update_fields):
+        if app_settings.LOGIN_IDENTIFIER_LOOKUPS:
+            LoginIdentifier.objects.sync(
+                AuthenticationMethod.PHONE,
+                instance.pk,
+                instance.user_id,
+                LoginIdentifier.normalize_phone(instance.phone),
+                created=created,
+            )
+        _identifier_saved(
+            AuthenticationMethod.PHONE,
+            instance,
+            instance.phone,
+            LoginIdentifier.normalize_phone,
+        )
+
+
+@receiver(post_delete, sender=PhoneNumber)
+def remove_phone_identifier(sender, instance, **kwargs):
+    if app_settings.LOGIN_IDENTIFIER_LOOKUPS:
+        LoginIdentifier.objects.remove(AuthenticationMethod.PHONE, instance.pk)
+    invalidate_identifier(
+        AuthenticationMethod.PHONE, LoginIdentifier.normalize_phone(instance.phone)
+    )
+
+
+@receiver(pre_save, sender=EmailAddress)
+def remember_previous_email(sender, instance, update_fields=None, **kwargs):
+    _remember_previous_value(sender, instance, "email", update_fields)
+
+
+@receiver(post_save, sender=EmailAddress)
+def sync_email_identifier(sender, instance, created, update_fields=None, **kwargs):
+    if _field_saved("email", update_fields):
+        if app_settings.LOGIN_IDENTIFIER_LOOKUPS:
+            LoginIdentifier.objects.sync(
+                AuthenticationMethod.EMAIL,
+                instance.pk,
+                instance.user_id,
+                LoginIdentifier.normalize_email(instance.email),
+                created=created,
+            )
+        _identifier_saved(
+            AuthenticationMethod.EMAIL,
+            instance,
+            instance.email,
+            LoginIdentifier.normalize_email,
+        )
+
+
+@receiver(post_delete, sender=EmailAddress)
+def remove_email_identifier(sender, instance, **kwargs):
+    if app_settings.LOGIN_IDENTIFIER_LOOKUPS:
+        LoginIdentifier.objects.remove(AuthenticationMethod.EMAIL, instance.pk)
+    invalidate_identifier(
+        AuthenticationMethod.EMAIL, LoginIdentifier.normalize_email(instance.email)
+    )
+
+
+@receiver(post_save, sender=PhoneNumber)
+@receiver(post_delete, sender=PhoneNumber)
+@receiver(post_save, sender=EmailAddress)
+@receiver(post_delete, sender=EmailAddress)
+def invalidate_user_contact_status(sender, instance, **kwargs):
+    invalidate_contact_status(instance.user_id)
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_username(sender, instance, update_fields=None, **kwargs):
+    _remember_previous_value(sender, instance, User.USERNAME_FIELD, update_fields)
+
+
+@receiver(post_save, sender=User)
+def sync_username_identifier(sender, instance, created, update_fields=None, **kwargs):
+    # Saves such as the last_login update on login don't touch the username.
+    if _field_saved(User.USERNAME_FIELD, update_fields):
+        if app_settings.LOGIN_IDENTIFIER_LOOKUPS:
+            LoginIdentifier.objects.sync(
+                AuthenticationMethod.USERNAME,
+                instance.pk,
+                instance.pk,
+                instance.get_username(),
+                created=created,
+            )
+        _identifier_saved(
+            AuthenticationMethod.USERNAME, instance, instance.get_username()
+        )
+
+
+@receiver(post_delete, sender=User)
+def invalidate_username(sender, instance, **kwargs):
+    invalidate_identifier(AuthenticationMethod.USERNAME, instance.get_username())
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Covers password changes and deactivation, which save the user.
+    invalidate_user(instance.pk)
+
+
+@receiver(list(SIGNALS.values()), dispatch_uid="phone_auth_deliver_message")
+def deliver_message(signal, sender, user, **kwargs):
+    # A no-op unless DELIVERY_BACKENDS has a backend for the channel.
+    deliver(SIGNAL_NAMES[signal], user, **kwargs)
@@ -0,0 +1,258 @@
+import hashlib
+import secrets
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router, transaction
+
+from . import app_settings
+from .app_settings import AuthenticationMethod
+from .bloom import might_exist
+from .identifiers import USER_LOOKUPS
+from .models import LoginIdentifier, PhoneNumber
+
+User = get_user_model()
+
+# Cached in place of a user id for identifiers that don't belong to anyone.
+NO_USER = 0
+
+
+def get_cache():
+    return caches[app_settings.CACHE_ALIAS]
+
+
+def now_and_on_commit(model, func, *args):
+    """Call ``func(*args)`` now and, inside a transaction, again once it
+    commits: until then other requests read the old rows of ``model``, and
+    may cache them."""
+
+    func(*args)
+    using = router.db_for_write(model)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(partial(func, *args), using=using)
+
+
+def identifier_cache_key(kind, value):
+    # Hash the value: phones and emails may contain characters that aren't
+    # valid in memcached keys.
+    digest = hashlib.sha256(value.encode()).hexdigest()
+    return f"phone_auth:identifier:{kind}:{digest}"
+
+
+def invalidate_identifier(kind, value):
+    if app_settings.IDENTIFIER_CACHE_TIMEOUT and value:
+        now_and_on_commit(
+            LoginIdentifier, get_cache().delete, identifier_cache_key(kind, value)
+        )
+
+
+def invalidate_identifiers(identifiers):
+    """Invalidate many ``(kind, value)`` pairs at once, e.g. after bulk
+    inserts that don't send signals."""
+
+    if app_settings.IDENTIFIER_CACHE_TIMEOUT:
+        now_and_on_commit(
+            LoginIdentifier,
+            get_cache().delete_many,
+            [identifier_cache_key(kind, value) for kind, value in identifiers],
+        )
+
+
+def user_lookup(identifier):
+    """Return the filter keyword arguments matching the user owning a
+    classified identifier, by joining the phone/email tables."""
+
+    if identifier.kind == AuthenticationMethod.PHONE:
+        return PhoneNumber.phone_lookup(identifier.value, prefix="phonenumber__")
+    return {USER_LOOKUPS[identifier.kind]: identifier.value}
+
+
+def user_cache_keys(user_id):
+    """Return the cache keys of the user's version and cached row"""
+
+    prefix = f"phone_auth:user:{user_id}"
+    return f"{prefix}:version", f"{prefix}:row"
+
+
+def _new_user_version(version_key):
+    get_cache().set(version_key, secrets.randbits(63), timeout=None)
+
+
+def invalidate_user(user_id):
+    # A new random version: rows cached by requests that read the user
+    # before the change committed no longer match.
+    if app_settings.USER_CACHE_TIMEOUT:
+        version_key, _ = user_cache_keys(user_id)
+        now_and_on_commit(User, _new_user_version, version_key)
+
+
+def _cached_user_attnames():
+    # The password hash is left out of the cache: the user is rebuilt with
+    # it deferred, and only loaded by code that needs it.
+    return [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname != "password"
+    ]
+
+
+def _session_auth_hash(user):
+    get_session_auth_hash = getattr(user, "get_session_auth_hash", None)
+    return get_session_auth_hash() if get_session_auth_hash else None
+
+
+def _cached_session_auth_hash(user, session_auth_hash):
+    # Computed again once the password is loaded or changed, e.g. by
+    # set_password() before update_session_auth_hash().
+    if "password" in user.get_deferred_fields():
+        return session_auth_hash
+    return type(user).get_session_auth_hash(user)
+
+
+def get_cached_user(user_id):
+    """Return the user with pk ``user_id``, or ``None``.
+
+    The user's row, without the password hash, is cached for
+    ``USER_CACHE_TIMEOUT`` under the user's current version, read with the
+    row in one cache round trip. Saving or deleting the user replaces the
+    version, see ``invalidate_user()``.
+
+    The session auth hash, an HMAC of the password hash that is also
+    stored in the user's sessions, is cached with the row so that session
+    authentication doesn't load the deferred password.
+    """
+
+    cache = get_cache()
+    version_key, row_key = user_cache_keys(user_id)
+    cached = cache.get_many([version_key, row_key])
+    version = cached.get(version_key)
+    attnames = _cached_user_attnames()
+    row = cached.get(row_key)
+    if version is not None and row is not None and row[:2] == (version, attnames):
+        user = User.from_db(router.db_for_read(User), attnames, row[2])
+        if row[3] is not None:
+            # partial() rather than a lambda keeps the user picklable.
+            user.get_session_auth_hash = partial(
+                _cached_session_auth_hash, user, row[3]
+            )
+        return user
+
+    try:
+        user = User._default_manager.get(pk=user_id)
+    except User.DoesNotExist:
+        return None
+    if version is None:
+        version = secrets.randbits(63)
+        if not cache.add(version_key, version, timeout=None):
+            # Invalidated meanwhile; the row read may be outdated.
+            return user
+    values = [getattr(user, attname) for attname in attnames]
+    cache.set(
+        row_key,
+        (version, attnames, values, _session_auth_hash(user)),
+        app_settings.USER_CACHE_TIMEOUT,
+    )
+    return user
+
+
+def _user_id_queryset(identifier):
+    if app_settings.LOGIN_IDENTIFIER_LOOKUPS:
+        return LoginIdentifier.objects.filter(
+            kind=identifier.kind, value=identifier.value
+        ).values_list("user_id", flat=True)
+    return User.objects.filter(**user_lookup(identifier)).values_list("pk", flat=True)
+
+
+def _cache_entry(key, user_id):
+    if user_id is None:
+        return key, NO_USER, app_settings.IDENTIFIER_CACHE_NEGATIVE_TIMEOUT
+    return key, user_id, app_settings.IDENTIFIER_CACHE_TIMEOUT
+
+
+def resolve_user_id(identifier):
+    """Return the pk of the user owning a classified identifier, or ``None``.
+
+    Results, including misses, are cached for ``IDENTIFIER_CACHE_TIMEOUT``
+    (``IDENTIFIER_CACHE_NEGATIVE_TIMEOUT`` for misses) when the former is set.
+    """
+
+    if not might_exist(identifier.kind, identifier.value):
+        return None
+
+    cache = get_cache() if app_settings.IDENTIFIER_CACHE_TIMEOUT else None
+    if cache is not None:
+        key = identifier_cache_key(identifier.kind, identifier.value)
+        user_id = cache.get(key)
+        if user_id is not None:
+            return user_id or None
+
+    user_id = _user_id_queryset(identifier).first()
+    if cache is not None:
+        cache.set(*_cache_entry(key, user_id))
+    return user_id
+
+
+async def aresolve_user_id(identifier):
+    """Async version of resolve_user_id()"""
+
+    if not might_exist(identifier.kind, identifier.value):
+        return None
+
+    cache = get_cache() if app_settings.IDENTIFIER_CACHE_TIMEOUT else None
+    if cache is not None:
+        key = identifier_cache_key(identifier.kind, identifier.value)
+        user_id = await cache.aget(key)
+        if user_id is not None:
+            return user_id or None
+
+    user_id = await _user_id_queryset(identifier).afirst()
+    if cache is not None:
+        await cache.aset(*_cache_entry(key, user_id))
+    return user_id
+
+
+def resolve_user(identifier):
+    """Return the user owning a classified identifier, or ``None``.
+
+    With ``LOGIN_IDENTIFIER_LOOKUPS`` enabled the identifier is resolved with
+    a single probe of the ``LoginIdentifier`` unique index; otherwise the user
+    table is joined to the phone/email tables. With the identifier cache
+    enabled, only the user row is fetched on a cache hit. Identifiers the
+    bloom filter rules out are rejected without any query.
+    """
+
+    if not might_exist(identifier.kind, identifier.value):
+        return None
+    try:
+        if app_settings.IDENTIFIER_CACHE_TIMEOUT:
+            user_id = resolve_user_id(identifier)
+            return None if user_id is None else User.objects.get(pk=user_id)
+        if app_settings.LOGIN_IDENTIFIER_LOOKUPS:
+            return (
+                LoginIdentifier.objects.select_related("user")
+                .get(kind=identifier.kind, value=identifier.value)
+                .user
+            )
+        return User.objects.get(**user_lookup(identifier))
+    except (User.DoesNotExist, LoginIdentifier.DoesNotExist):
+        return None
+
+
+async def aresolve_user(identifier):
+    """Async version of resolve_user()"""
+
+    if not might_exist(identifier.kind, identifier.value):
+        return None
+    try:
+        if app_settings.IDENTIFIER_CACHE_TIMEOUT:
+            user_id = await aresolve_user_id(identifier)
+            return None if user_id is None else await User.objects.aget(pk=user_id)
+        if app_settings.LOGIN_IDENTIFIER_LOOKUPS:
+            login_identifier = await LoginIdentifier.objects.select_related(
+                "user"
+            ).aget(kind=identifier.kind, value=identifier.value)
+            return login_identifier.user
+        return await User.objects.aget(**user_lookup(identifier))
+    except (User.DoesNotExist, LoginIdentifier.DoesNotExist):
+        return None
@@ -0,0 +1,112 @@
+"""Database router sending phone_auth's reads to replicas.
+
+Reads of phone_auth's models and of the user model go to one of the
+REPLICA_DATABASES, writes to the ``default`` database. After a write, the
+rest of the request reads from ``default`` too, and so do the client's
+requests for the next REPLICA_PIN_TIMEOUT seconds, so that it reads its own
+writes (e.g. logs in right after signing up) despite replication lag.
+
+Enable with::
+
+    DATABASE_ROUTERS = ["phone_auth.routers.ReplicaRouter"]
+    MIDDLEWARE = [..., "phone_auth.routers.PrimaryPinningMiddleware", ...]
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+from . import app_settings
+
+# Cookie marking clients whose reads are pinned to the primary.
+PIN_COOKIE = "phone_auth_primary"
+
+_pinned = ContextVar("phone_auth_pinned", default=False)
+_written = ContextVar("phone_auth_written", default=False)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def pin():
+    """Send the reads of the current context to the primary"""
+
+    _pinned.set(True)
+
+
+@contextmanager
+def pinned():
+    """Send the reads of the block to the primary"""
+
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def _is_routed(model):
+    return (
+        model._meta.app_label == "phone_auth"
+        or model._meta.label == settings.AUTH_USER_MODEL
+    )
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = app_settings.REPLICA_DATABASES
+        if not replicas or not _is_routed(model):
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            # Related objects come from the database of their instance.
+            return instance._state.db
+        if is_pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if not app_settings.REPLICA_DATABASES or not _is_routed(model):
+            return None
+        pin()
+        _written.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *app_settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in app_settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+class PrimaryPinningMiddleware(MiddlewareMixin):
+    """Scope the pinning of ``ReplicaRouter`` to the request, and pin the
+    client's next requests with a cookie after it writes."""
+
+    def process_request(self, request):
+        _pinned.set(PIN_COOKIE in request.COOKIES)
+        _written.set(False)
+
+    def process_response(self, request, response):
+        if _written.get():
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=app_settings.REPLICA_PIN_TIMEOUT,
+                httponly=True,
+                samesite="Lax",
+            )
+        # Don't leak the state to the next request handled by the thread.
+        _pinned.set(False)
+        _written.set(False)
+        return response
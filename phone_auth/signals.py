@@ -4,3 +4,15 @@ reset_password_email = Signal()
 reset_password_phone = Signal()
 verify_email = Signal()
 verify_phone = Signal()
+verify_phone_code = Signal()
+
+# Signals sent for a user by the password reset and verification flows, by
+# name.
+SIGNALS = {
+    "reset_password_email": reset_password_email,
+    "reset_password_phone": reset_password_phone,
+    "verify_email": verify_email,
+    "verify_phone": verify_phone,
+    "verify_phone_code": verify_phone_code,
+}
+SIGNAL_NAMES = {signal: name for name, signal in SIGNALS.items()}
@@ -0,0 +1,182 @@
+from django.contrib.auth import get_user_model
+from django.db.models import CharField, Exists, OuterRef, Value
+from django.db.models.functions import Cast
+
+from . import app_settings
+from .models import EmailAddress, PhoneNumber
+from .resolvers import get_cache, now_and_on_commit
+
+User = get_user_model()
+
+PHONE = "phone"
+EMAIL = "email"
+
+
+def contact_status_cache_key(user_id):
+    return f"phone_auth:contact_status:{user_id}"
+
+
+def invalidate_contact_status(user_id):
+    if app_settings.CONTACT_STATUS_CACHE_TIMEOUT:
+        now_and_on_commit(
+            PhoneNumber, get_cache().delete, contact_status_cache_key(user_id)
+        )
+
+
+def invalidate_contact_statuses(user_ids):
+    """Invalidate the status of many users at once, e.g. after updates that
+    don't send signals."""
+
+    if app_settings.CONTACT_STATUS_CACHE_TIMEOUT:
+        now_and_on_commit(
+            PhoneNumber,
+            get_cache().delete_many,
+            [contact_status_cache_key(user_id) for user_id in user_ids],
+        )
+
+
+def contacts_queryset(user_id):
+    """Return a query listing ``(kind, value, is_verified)`` for every phone
+    number and email address of the user, as a single UNION."""
+
+    phones = PhoneNumber.objects.filter(user_id=user_id).annotate(
+        kind=Value(PHONE, output_field=CharField()),
+        value=Cast("phone", output_field=CharField()),
+    )
+    emails = EmailAddress.objects.filter(user_id=user_id).annotate(
+        kind=Value(EMAIL, output_field=CharField()),
+        value=Cast("email", output_field=CharField()),
+    )
+    fields = ("kind", "value", "is_verified")
+    return phones.values_list(*fields).union(emails.values_list(*fields), all=True)
+
+
+def verified_flags_queryset(user_id):
+    """Return a query of ``(has_verified_phone, has_verified_email)`` for
+    the user. Each flag is an EXISTS probe of a partial index holding only
+    verified rows."""
+
+    return (
+        User.objects.filter(pk=user_id)
+        .annotate(
+            has_verified_phone=Exists(
+                PhoneNumber.objects.filter(user_id=OuterRef("pk"), is_verified=True)
+            ),
+            has_verified_email=Exists(
+                EmailAddress.objects.filter(user_id=OuterRef("pk"), is_verified=True)
+            ),
+        )
+        .values_list("has_verified_phone", "has_verified_email")
+    )
+
+
+class ContactStatus:
+    """Phone numbers and email addresses of the request's user, loaded on
+    first access.
+
+    ``has_verified_phone`` and ``has_verified_email`` are loaded together
+    with one query, and cached for ``CONTACT_STATUS_CACHE_TIMEOUT`` when it
+    is set. ``phones`` and ``emails`` list ``(value, is_verified)`` pairs,
+    loaded with one query from the database. Async code calls ``aload()``
+    before reading the attributes.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._flags = None
+        self._contacts = None
+
+    def _user_id(self, user):
+        return user.pk if user.is_authenticated else None
+
+    def _set_contacts(self, rows):
+        self._contacts = {PHONE: [], EMAIL: []}
+        for kind, value, is_verified in rows:
+            self._contacts[kind].append((value, is_verified))
+        self._flags = (
+            any(is_verified for _, is_verified in self._contacts[PHONE]),
+            any(is_verified for _, is_verified in self._contacts[EMAIL]),
+        )
+
+    def load(self, contacts=False):
+        """Load the verified flags, from the cache if possible, and the
+        contacts too when ``contacts`` is True."""
+
+        if self._contacts is not None or (self._flags is not None and not contacts):
+            return
+        user = self.request.user
+        if not contacts and getattr(user, "verified_flags", None) is not None:
+            # Carried by bearer tokens, see phone_auth.bearer.TokenUser.
+            self._flags = user.verified_flags
+            return
+        user_id = self._user_id(user)
+        if user_id is None:
+            self._set_contacts([])
+            return
+        timeout = app_settings.CONTACT_STATUS_CACHE_TIMEOUT
+        key = contact_status_cache_key(user_id)
+        if not contacts:
+            if timeout:
+                self._flags = get_cache().get(key)
+                if self._flags is not None:
+                    return
+            self._flags = verified_flags_queryset(user_id).first() or (False, False)
+        else:
+            self._set_contacts(contacts_queryset(user_id))
+        if timeout:
+            get_cache().set(key, self._flags, timeout)
+
+    async def aload(self, contacts=False):
+        if self._contacts is not None or (self._flags is not None and not contacts):
+            return
+        user = await self.request.auser()
+        if not contacts and getattr(user, "verified_flags", None) is not None:
+            self._flags = user.verified_flags
+            return
+        user_id = self._user_id(user)
+        if user_id is None:
+            self._set_contacts([])
+            return
+        timeout = app_settings.CONTACT_STATUS_CACHE_TIMEOUT
+        key = contact_status_cache_key(user_id)
+        if not contacts:
+            if timeout:
+                self._flags = await get_cache().aget(key)
+                if self._flags is not None:
+                    return
+            flags = await verified_flags_queryset(user_id).afirst()
+            self._flags = flags or (False, False)
+        else:
+            self._set_contacts([row async for row in contacts_queryset(user_id)])
+        if timeout:
+            await get_cache().aset(key, self._flags, timeout)
+
+    @property
+    def has_verified_phone(self):
+        self.load()
+        return self._flags[0]
+
+    @property
+    def has_verified_email(self):
+        self.load()
+        return self._flags[1]
+
+    @property
+    def phones(self):
+        self.load(contacts=True)
+        return self._contacts[PHONE]
+
+    @property
+    def emails(self):
+        self.load(contacts=True)
+        return self._contacts[EMAIL]
+
+
+def get_contact_status(request):
+    """Return ``request.phone_auth``, creating it when
+    ``ContactStatusMiddleware`` isn't installed."""
+
+    status = getattr(request, "phone_auth", None)
+    if status is None:
+        status = request.phone_auth = ContactStatus(request)
+    return status
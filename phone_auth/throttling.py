@@ -0,0 +1,229 @@
+import hashlib
+import math
+import time
+
+from . import app_settings
+from .app_settings import AuthenticationMethod
+from .identifiers import classify, parse_phone
+from .resolvers import get_cache
+
+RATE_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """Parse a rate such as ``"5/m"`` into ``(limit, window_in_seconds)``"""
+
+    limit, period = rate.split("/")
+    return int(limit), RATE_PERIODS[period[0]]
+
+
+class SlidingWindowCounter:
+    """Approximate sliding window counter stored in the cache.
+
+    Counts are kept per fixed window; the count of the previous window is
+    weighted by how much of it still overlaps the sliding window.
+    """
+
+    def __init__(self, key, rate):
+        self.key = key
+        self.limit, self.window = parse_rate(rate)
+
+    def keys(self, now):
+        bucket = int(now // self.window)
+        elapsed = now - bucket * self.window
+        return f"{self.key}:{bucket}", f"{self.key}:{bucket - 1}", elapsed
+
+    def retry_after(self, counts, now):
+        """Return the seconds to wait before the next attempt is allowed,
+        0 if it is allowed now."""
+
+        current_key, previous_key, elapsed = self.keys(now)
+        current = counts.get(current_key, 0)
+        previous = counts.get(previous_key, 0)
+        weight = 1 - elapsed / self.window
+        if current + previous * weight < self.limit:
+            return 0
+        if current >= self.limit:
+            # Wait for the next window, then for enough of this one to slide
+            # out.
+            wait = self.window - elapsed + self.window * (1 - self.limit / current)
+        else:
+            # Wait until enough of the previous window has slid out.
+            wait = self.window * (1 - (self.limit - current) / previous) - elapsed
+        return math.floor(wait) + 1
+
+    def hit(self, cache, now):
+        """Count an attempt in the current window and return the new count"""
+
+        current_key, _, _ = self.keys(now)
+        cache.add(current_key, 0, timeout=2 * self.window)
+        try:
+            return cache.incr(current_key)
+        except ValueError:
+            # The key expired between add() and incr().
+            cache.set(current_key, 1, timeout=2 * self.window)
+            return 1
+
+    async def ahit(self, cache, now):
+        current_key, _, _ = self.keys(now)
+        await cache.aadd(current_key, 0, timeout=2 * self.window)
+        try:
+            return await cache.aincr(current_key)
+        except ValueError:
+            await cache.aset(current_key, 1, timeout=2 * self.window)
+            return 1
+
+
+class Throttle:
+    """Sliding window throttle for one attempt, keyed per identifier, per
+    IP address and, for phone numbers, per country calling code.
+
+    ``rates`` maps any of ``"identifier"``, ``"ip"`` and ``"country"`` to a
+    rate such as ``"5/m"``; keys without a rate aren't throttled.
+    """
+
+    def __init__(self, scope, rates, request, login):
+        self.counters = []
+        self._counted_keys = []
+        identifier = classify(login)
+
+        values = {
+            "identifier": identifier.value if identifier else (login or "").lower(),
+            "ip": request.META.get("REMOTE_ADDR", ""),
+        }
+        if identifier and identifier.kind == AuthenticationMethod.PHONE:
+            values["country"] = str(parse_phone(identifier.value).country_code)
+
+        for name, value in values.items():
+            rate = rates.get(name)
+            if rate:
+                digest = hashlib.sha256(value.encode()).hexdigest()
+                key = f"phone_auth:throttle:{scope}:{name}:{digest}"
+                self.counters.append(SlidingWindowCounter(key, rate))
+
+    def _previous_keys(self, now):
+        return [counter.keys(now)[1] for counter in self.counters]
+
+    def _retry_after(self, counts, counted, now):
+        # Checked against the counts before this attempt, which concurrent
+        # attempts each see differently since the counters are incremented
+        # first.
+        for counter, count in zip(self.counters, counted):
+            counts[counter.keys(now)[0]] = count - 1
+        self._counted_keys = [counter.keys(now)[0] for counter in self.counters]
+        return max(counter.retry_after(counts, now) for counter in self.counters)
+
+    def acquire(self):
+        """Count an attempt and return 0 if it is allowed, or else the
+        seconds to wait before the next one. Refused attempts aren't
+        counted.
+
+        Counters are incremented before they are checked, so concurrent
+        attempts can't all pass the check before any of them is counted.
+        """
+
+        if not self.counters:
+            return 0
+        now = time.time()
+        cache = get_cache()
+        counts = cache.get_many(self._previous_keys(now))
+        counted = [counter.hit(cache, now) for counter in self.counters]
+        retry_after = self._retry_after(counts, counted, now)
+        if retry_after:
+            self.release()
+        return retry_after
+
+    async def aacquire(self):
+        if not self.counters:
+            return 0
+        now = time.time()
+        cache = get_cache()
+        counts = await cache.aget_many(self._previous_keys(now))
+        counted = [await counter.ahit(cache, now) for counter in self.counters]
+        retry_after = self._retry_after(counts, counted, now)
+        if retry_after:
+            await self.arelease()
+        return retry_after
+
+    def release(self):
+        """Uncount the attempt counted by ``acquire()``, e.g. a successful
+        login"""
+
+        cache = get_cache()
+        for key in self._counted_keys:
+            try:
+                cache.decr(key)
+            except ValueError:
+                # Expired meanwhile.
+                pass
+
+    async def arelease(self):
+        cache = get_cache()
+        for key in self._counted_keys:
+            try:
+                await cache.adecr(key)
+            except ValueError:
+                pass
+
+
+def coalesce_key(purpose, contact):
+    digest = hashlib.sha256(contact.encode()).hexdigest()
+    return f"phone_auth:coalesce:{purpose}:{digest}"
+
+
+def suppressed_key(purpose):
+    return f"phone_auth:coalesce:suppressed:{purpose}"
+
+
+def claim_send(purpose, contact):
+    """Return True if a ``purpose`` message may be sent to ``contact``, i.e.
+    none was sent in the last SEND_COALESCE_WINDOW seconds.
+
+    Sends refused inside the window are counted, see ``suppressed_sends()``.
+    """
+
+    window = app_settings.SEND_COALESCE_WINDOW
+    if not window:
+        return True
+    cache = get_cache()
+    if cache.add(coalesce_key(purpose, contact), 1, timeout=window):
+        return True
+    key = suppressed_key(purpose)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+    return False
+
+
+async def aclaim_send(purpose, contact):
+    window = app_settings.SEND_COALESCE_WINDOW
+    if not window:
+        return True
+    cache = get_cache()
+    if await cache.aadd(coalesce_key(purpose, contact), 1, timeout=window):
+        return True
+    key = suppressed_key(purpose)
+    await cache.aadd(key, 0, timeout=None)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, timeout=None)
+    return False
+
+
+def suppressed_sends(purpose):
+    """Return the number of ``purpose`` sends suppressed by ``claim_send()``"""
+
+    return get_cache().get(suppressed_key(purpose), 0)
+
+
+def login_throttle(request, login):
+    return Throttle("login", app_settings.LOGIN_THROTTLE_RATES, request, login)
+
+
+def password_reset_throttle(request, login):
+    return Throttle(
+        "password_reset", app_settings.PASSWORD_RESET_THROTTLE_RATES, request, login
+    )
@@ -1,73 +1,98 @@
 from django.urls import path
 
-from .views import (
-    AddEmailView,
-    AddPhoneView,
-    PhoneChangePasswordDoneView,
-    PhoneChangePasswordView,
-    PhoneEmailVerificationConfirmView,
-    PhoneEmailVerificationView,
-    PhoneLoginView,
-    PhoneLogoutView,
-    PhonePasswordConfirmView,
-    PhonePasswordResetCompleteView,
-    PhonePasswordResetDoneView,
-    PhonePasswordResetView,
-    PhoneSignupView,
-)
+from . import api_views, app_settings
+
+if app_settings.ASYNC_VIEWS:
+    from . import async_views as views
+else:
+    from . import views
 
 app_name = "phone_auth"
 
 urlpatterns = [
-    path("signup/", PhoneSignupView.as_view(), name="phone_signup"),
-    path("login/", PhoneLoginView.as_view(), name="phone_login"),
-    path("logout/", PhoneLogoutView.as_view(), name="phone_logout"),
+    path("signup/", views.PhoneSignupView.as_view(), name="phone_signup"),
+    path("login/", views.PhoneLoginView.as_view(), name="phone_login"),
+    path("logout/", views.PhoneLogoutView.as_view(), name="phone_logout"),
     path(
-        "password_reset/", PhonePasswordResetView.as_view(), name="phone_password_reset"
+        "password_reset/",
+        views.PhonePasswordResetView.as_view(),
+        name="phone_password_reset",
     ),
     path(
         "password_reset_done/",
-        PhonePasswordResetDoneView.as_view(),
+        views.PhonePasswordResetDoneView.as_view(),
         name="phone_password_reset_done",
     ),
     path(
         "password_reset_confirm/<uidb64>/<token>/",
-        PhonePasswordConfirmView.as_view(),
+        views.PhonePasswordConfirmView.as_view(),
         name="phone_password_reset_confirm",
     ),
     path(
         "password_reset_complete/",
-        PhonePasswordResetCompleteView.as_view(),
+        views.PhonePasswordResetCompleteView.as_view(),
         name="phone_password_reset_complete",
     ),
     path(
         "change_password/",
-        PhoneChangePasswordView.as_view(),
+        views.PhoneChangePasswordView.as_view(),
         name="phone_change_password",
     ),
     path(
         "change_password_done/",
-        PhoneChangePasswordDoneView.as_view(),
+        views.PhoneChangePasswordDoneView.as_view(),
         name="phone_change_password_done",
     ),
     path(
         "user_verification/",
-        PhoneEmailVerificationView.as_view(),
+        views.PhoneEmailVerificationView.as_view(),
         name="phone_email_verification",
     ),
     path(
         "user_verification_confirm/<idb64>/<token>/",
-        PhoneEmailVerificationConfirmView.as_view(),
+        views.PhoneEmailVerificationConfirmView.as_view(),
         name="phone_email_verification_confirm",
     ),
+    path(
+        "phone/verify/",
+        views.PhoneVerificationCodeView.as_view(),
+        name="phone_verification_code",
+    ),
     path(
         "phone/add/",
-        AddPhoneView.as_view(),
+        views.AddPhoneView.as_view(),
         name="add_phone",
     ),
     path(
         "email/add/",
-        AddEmailView.as_view(),
+        views.AddEmailView.as_view(),
         name="add_email",
     ),
+    path("api/signup/", api_views.SignupAPIView.as_view(), name="api_signup"),
+    path("api/login/", api_views.LoginAPIView.as_view(), name="api_login"),
+    path("api/logout/", api_views.LogoutAPIView.as_view(), name="api_logout"),
+    path("api/contacts/", api_views.ContactsAPIView.as_view(), name="api_contacts"),
+    path("api/phone/add/", api_views.AddPhoneAPIView.as_view(), name="api_add_phone"),
+    path("api/email/add/", api_views.AddEmailAPIView.as_view(), name="api_add_email"),
+    path(
+        "api/verification/",
+        api_views.VerificationAPIView.as_view(),
+        name="api_verification",
+    ),
+    path(
+        "api/phone/verify/",
+        api_views.VerificationCodeAPIView.as_view(),
+        name="api_verification_code",
+    ),
+    path("api/token/", api_views.TokenObtainView.as_view(), name="api_token"),
+    path(
+        "api/token/refresh/",
+        api_views.TokenRefreshView.as_view(),
+        name="api_token_refresh",
+    ),
+    path(
+        "api/token/revoke/",
+        api_views.TokenRevokeView.as_view(),
+        name="api_token_revoke",
+    ),
 ]
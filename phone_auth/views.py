@@ -32,11 +32,22 @@ from .forms import (
     PhoneLogoutForm,
     PhonePasswordResetForm,
     PhoneRegisterForm,
+    PhoneVerificationCodeForm,
 )
 from .models import EmailAddress, PhoneNumber
+from .throttling import login_throttle, password_reset_throttle
 from .tokens import phone_token_generator
 
 
+def throttled_response(request, template_name, form, retry_after):
+    """Render ``form`` with a "too many attempts" error and a 429 status"""
+
+    form.add_error(None, _("Too many attempts. Please try again later."))
+    response = render(request, template_name, context={"form": form}, status=429)
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
 class PhoneSignupView(AnonymousRequiredMixin, FormView):
     """Display the register form and handle user registration."""
 
@@ -70,8 +81,17 @@ class PhoneLoginView(AnonymousRequiredMixin, LoginView):
     def form_valid(self, form):
         """Security check complete. Log the user in."""
 
+        throttle = login_throttle(self.request, form.cleaned_data["login"])
+        retry_after = throttle.acquire()
+        if retry_after:
+            return throttled_response(
+                self.request, self.template_name, form, retry_after
+            )
+
         user = authenticate(self.request, **form.cleaned_data)
         if user is not None:
+            # Only failed logins are counted.
+            throttle.release()
             login(self.request, user)
         else:
             form.add_error("login", "Invalid Credentials")
@@ -89,13 +109,15 @@ class PhoneLogoutView(FormView):
 
     template_name = "phone_auth/logout.html"
     form_class = PhoneLogoutForm
-    success_url = _(app_settings.LOGOUT_REDIRECT_URL)
 
     @method_decorator(csrf_protect)
     @method_decorator(never_cache)
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
+    def get_success_url(self):
+        return app_settings.LOGOUT_REDIRECT_URL
+
     def form_valid(self, form):
         auth_logout(self.request)
         return super().form_valid(form)
@@ -113,6 +135,13 @@ class PhonePasswordResetView(FormView):
         return super().dispatch(*args, **kwargs)
 
     def form_valid(self, form):
+        throttle = password_reset_throttle(self.request, form.cleaned_data["login"])
+        retry_after = throttle.acquire()
+        if retry_after:
+            return throttled_response(
+                self.request, self.template_name, form, retry_after
+            )
+
         form.save()
         return super().form_valid(form)
 
@@ -168,10 +197,12 @@ class PhoneEmailVerificationView(LoginRequiredMixin, FormView):
 
     def get_context_data(self, **kwargs):
         context = super(PhoneEmailVerificationView, self).get_context_data()
+        # Evaluate once: the template may iterate over each list more than
+        # once.
         context.update(
             {
-                "email_addresses": self.request.user.emailaddress_set.all(),
-                "phone_numbers": self.request.user.phonenumber_set.all(),
+                "email_addresses": list(self.request.user.emailaddress_set.all()),
+                "phone_numbers": list(self.request.user.phonenumber_set.all()),
             }
         )
         if self.title is not None:
@@ -220,10 +251,10 @@ class PhoneEmailVerificationConfirmView(FormView):
             if is_valid_token:
                 if email_obj is not None:
                     email_obj.is_verified = True
-                    email_obj.save()
+                    email_obj.save(update_fields=["is_verified"])
                 if phone_obj is not None:
                     phone_obj.is_verified = True
-                    phone_obj.save()
+                    phone_obj.save(update_fields=["is_verified"])
                 self.validlink = True
 
         # Display the "Verification Failed/Passed" page.
@@ -238,9 +269,9 @@ class PhoneEmailVerificationConfirmView(FormView):
             method = uid[:5]
             pk = int(uid[5:])
             if method == "email":
-                email_obj = EmailAddress.objects.get(pk=pk)
+                email_obj = EmailAddress.objects.select_related("user").get(pk=pk)
             elif uid[:5] == "phone":
-                phone_obj = PhoneNumber.objects.get(pk=pk)
+                phone_obj = PhoneNumber.objects.select_related("user").get(pk=pk)
 
         except (
             TypeError,
@@ -262,6 +293,34 @@ class PhoneEmailVerificationConfirmView(FormView):
         return context
 
 
+class PhoneVerificationCodeView(LoginRequiredMixin, FormView):
+    """Verify a phone number with the code sent by the verify_phone_code
+    signal."""
+
+    template_name = "phone_auth/phone_verification_code.html"
+    form_class = PhoneVerificationCodeForm
+    success_url = reverse_lazy("phone_auth:phone_email_verification")
+
+    @method_decorator(csrf_protect)
+    @method_decorator(never_cache)
+    def dispatch(self, *args, **kwargs):
+        return super().dispatch(*args, **kwargs)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["user"] = self.request.user
+        return kwargs
+
+    def form_valid(self, form):
+        form.save()
+        if form.errors:
+            status = 429 if form.has_error("code", "throttled") else 400
+            return render(
+                self.request, self.template_name, context={"form": form}, status=status
+            )
+        return super().form_valid(form)
+
+
 class AddPhoneView(LoginRequiredMixin, FormView):
     """Add new phone"""
 
@@ -0,0 +1,17 @@
+from django.urls import include, path
+
+from phone_auth import async_views, urls
+
+# phone_auth.urls routed to the async views, whatever ASYNC_VIEWS is set to.
+async_urlpatterns = [
+    path(
+        str(pattern.pattern),
+        getattr(async_views, pattern.callback.view_class.__name__).as_view(),
+        name=pattern.name,
+    )
+    for pattern in urls.urlpatterns
+]
+
+urlpatterns = [
+    path("accounts/", include((async_urlpatterns, "phone_auth"))),
+]
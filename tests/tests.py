@@ -1,35 +1,113 @@
+import csv
+import json
+import os
+import pickle
 import string
-
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.auth.hashers import check_password, make_password
-from django.contrib.auth.models import User
+from django.contrib.auth.models import AnonymousUser, User
 from django.contrib.auth.tokens import default_token_generator
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, NotSupportedError, connection, models
+from django.db.migrations.state import ProjectState
 from django.http import HttpResponse
-from django.test import TestCase
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.views.generic import View
 
-from phone_auth import app_settings
+from phone_auth import app_settings, routers, urls
+from phone_auth.admin import EstimatedCountPaginator, PhoneNumberAdmin
+from phone_auth.api_views import APIView
 from phone_auth.app_settings import AuthenticationMethod
+from phone_auth.backend import CustomAuthBackend
+from phone_auth.bearer import TokenUser, issue_tokens, read_access_token
+from phone_auth.bloom import might_exist
+from phone_auth.checks import check_settings
 from phone_auth.decorators import (
     anonymous_required,
     verified_email_required,
     verified_phone_required,
 )
+from phone_auth.delivery import Message, close_backends, locmem, send_messages
+from phone_auth.delivery.httpsms import SmsBackend
+from phone_auth.exceptions import DeliveryError
+from phone_auth.forms import (
+    AddEmailForm,
+    PhoneRegisterForm,
+    PhoneValidationForm,
+    PhoneVerificationCodeForm,
+)
+from phone_auth.identifiers import classify, parse_phone
+from phone_auth.integrity import unique_violation_field, violated_constraint_names
+from phone_auth.middleware import BearerTokenMiddleware
 from phone_auth.mixins import (
     AnonymousRequiredMixin,
     VerifiedEmailRequiredMixin,
     VerifiedPhoneRequiredMixin,
 )
-from phone_auth.models import EmailAddress, PhoneNumber
-from phone_auth.tokens import phone_token_generator
+from phone_auth.models import (
+    EmailAddress,
+    LoginIdentifier,
+    OutboxMessage,
+    PhoneNumber,
+    RefreshToken,
+)
+from phone_auth.operations import AddIndexConcurrently
+from phone_auth.outbox import claim_messages, deliver
+from phone_auth.resolvers import identifier_cache_key, resolve_user, user_cache_keys
+from phone_auth.routers import (
+    PIN_COOKIE,
+    PrimaryPinningMiddleware,
+    ReplicaRouter,
+    pinned,
+)
+from phone_auth.signals import reset_password_phone, verify_phone, verify_phone_code
+from phone_auth.status import (
+    ContactStatus,
+    contact_status_cache_key,
+    get_contact_status,
+)
+from phone_auth.throttling import (
+    SlidingWindowCounter,
+    login_throttle,
+    suppressed_sends,
+)
+from phone_auth.tokens import (
+    PhoneVerificationCodeGenerator,
+    phone_code_generator,
+    phone_token_generator,
+)
 from phone_auth.validators import validate_username
 
 
-class AccountTests(TestCase):
+class UserTestCase(TestCase):
+    """Test case with a user, ``self.user``, owning an unverified phone
+    number and email address. The cache is cleared before each test."""
+
     data = {
         "phone": "+919876543210",
         "username": "test",
@@ -51,6 +129,11 @@ class AccountTests(TestCase):
             user=cls.user, email=user_data["email"]
         )
 
+    def setUp(self):
+        cache.clear()
+
+
+class AccountTests(UserTestCase):
     def test_phone_signup_view(self):
 
         url = reverse("phone_auth:phone_signup")
@@ -79,6 +162,44 @@ class AccountTests(TestCase):
         self.assertEqual(user.first_name, data["first_name"])
         self.assertEqual(user.last_name, data["last_name"])
 
+    def test_phone_register_form_uniqueness(self):
+        data = dict(self.data, confirm_password=self.data["password"])
+        form = PhoneRegisterForm(data)
+        # A single query checks phone, email and username
+        with self.assertNumQueries(1):
+            self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {"phone", "email", "username"})
+
+        data["email"] = self.data["email"].upper()
+        data["phone"] = "+919876543211"
+        form = PhoneRegisterForm(data)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(set(form.errors), {"email", "username"})
+
+    def test_phone_register_form_constraint_violation(self):
+        data = {
+            "phone": "+919999999999",
+            "username": "test1",
+            "email": "someone@register.com",
+            "first_name": "first",
+            "last_name": "last",
+            "password": "abcd@1234",
+            "confirm_password": "abcd@1234",
+        }
+        form = PhoneRegisterForm(data)
+        self.assertTrue(form.is_valid())
+        # Registered by someone else between validation and save
+        PhoneNumber.objects.create(user=self.user, phone=data["phone"])
+        form.save()
+        self.assertEqual(form.errors["phone"], ["Phone already exists"])
+        self.assertFalse(User.objects.filter(username="test1").exists())
+
+    def test_add_email_form_constraint_violation(self):
+        form = AddEmailForm({"email": self.data["email"].upper()})
+        self.assertTrue(form.is_valid())
+        form.save(self.user)
+        self.assertEqual(form.errors["email"], ["Email already exists"])
+
     def test_phone_login_view(self):
         url = reverse("phone_auth:phone_login")
         authentication_methods = app_settings.AUTHENTICATION_METHODS
@@ -106,6 +227,243 @@ class AccountTests(TestCase):
             self.assertEqual(response.status_code, 400)
             self.assertFalse(response.wsgi_request.user.is_authenticated)
 
+    @override_settings(LOGIN_IDENTIFIER_LOOKUPS=True)
+    def test_phone_login_view_with_identifier_lookups(self):
+        call_command("phone_auth_backfill_identifiers", stdout=StringIO())
+        url = reverse("phone_auth:phone_login")
+        for auth_method in app_settings.AUTHENTICATION_METHODS:
+            credentials = {
+                "login": self.data[auth_method].upper(),
+                "password": self.data["password"],
+            }
+            if auth_method == AuthenticationMethod.EMAIL:
+                response = self.client.post(url, credentials)
+                self.assertEqual(response.status_code, 302)
+                self.client.logout()
+
+            credentials["login"] = self.data[auth_method]
+            response = self.client.post(url, credentials)
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response.wsgi_request.user.is_authenticated)
+            self.client.logout()
+
+    def test_login_identifiers_not_written_when_disabled(self):
+        self.assertFalse(LoginIdentifier.objects.exists())
+        self.phone_obj.phone = "+919876543219"
+        self.phone_obj.save()
+        self.assertFalse(LoginIdentifier.objects.exists())
+
+    @override_settings(LOGIN_IDENTIFIER_LOOKUPS=True)
+    def test_login_identifier_sync(self):
+        call_command("phone_auth_backfill_identifiers", stdout=StringIO())
+        identifiers = LoginIdentifier.objects.filter(user=self.user)
+        self.assertEqual(
+            set(identifiers.values_list("kind", "value")),
+            {
+                (AuthenticationMethod.PHONE, self.data["phone"]),
+                (AuthenticationMethod.EMAIL, self.data["email"]),
+                (AuthenticationMethod.USERNAME, self.data["username"]),
+            },
+        )
+
+        self.phone_obj.phone = "+919876543219"
+        self.phone_obj.save()
+        self.user.username = "renamed"
+        self.user.save()
+        self.email_obj.delete()
+        self.assertEqual(
+            set(identifiers.values_list("kind", "value")),
+            {
+                (AuthenticationMethod.PHONE, "+919876543219"),
+                (AuthenticationMethod.USERNAME, "renamed"),
+            },
+        )
+
+        # Saves that don't change the identifier don't write it.
+        with self.assertNumQueries(1) as context:
+            LoginIdentifier.objects.sync(
+                AuthenticationMethod.USERNAME, self.user.pk, self.user.pk, "renamed"
+            )
+        self.assertTrue(context.captured_queries[0]["sql"].startswith("UPDATE"))
+
+        # A value claimed by another row keeps its identifier.
+        other = User.objects.create_user(username="other")
+        self.user.username = "OTHER"
+        self.user.save()
+        LoginIdentifier.objects.sync(
+            AuthenticationMethod.USERNAME, self.user.pk, self.user.pk, "other"
+        )
+        self.assertEqual(
+            identifiers.get(kind=AuthenticationMethod.USERNAME).value, "OTHER"
+        )
+        self.assertTrue(
+            LoginIdentifier.objects.filter(user=other, value="other").exists()
+        )
+
+    def test_backfill_identifiers(self):
+        call_command("phone_auth_backfill_identifiers", batch_size=1, stdout=StringIO())
+        self.assertEqual(LoginIdentifier.objects.filter(user=self.user).count(), 3)
+
+        # Left stale while LOGIN_IDENTIFIER_LOOKUPS was disabled.
+        LoginIdentifier.objects.filter(kind=AuthenticationMethod.PHONE).update(
+            value="+919876543219"
+        )
+        call_command("phone_auth_backfill_identifiers", clear=True, stdout=StringIO())
+        self.assertEqual(
+            LoginIdentifier.objects.get(kind=AuthenticationMethod.PHONE).value,
+            self.data["phone"],
+        )
+
+    @override_settings(INTEGER_PHONE_LOOKUPS=True)
+    def test_integer_phone_lookups(self):
+        self.assertEqual(
+            (self.phone_obj.country_code, self.phone_obj.national_number),
+            (91, 9876543210),
+        )
+        with self.assertNumQueries(1) as context:
+            user = resolve_user(classify(self.data["phone"]))
+        self.assertEqual(user, self.user)
+        self.assertIn('"country_code" = 91', context.captured_queries[0]["sql"])
+
+        form = PhoneRegisterForm(dict(self.data, confirm_password="abcd@1234"))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["phone"], ["Phone already exists"])
+
+        # Leading zeros would be lost: looked up by string.
+        italian = PhoneNumber.objects.create(user=self.user, phone="+390612345678")
+        self.assertIsNone(italian.country_code)
+        self.assertEqual(resolve_user(classify("+390612345678")), self.user)
+
+    def test_email_lookups_use_the_lower_expression(self):
+        with self.assertNumQueries(1) as context:
+            user = resolve_user(classify(self.data["email"].upper()))
+        self.assertEqual(user, self.user)
+        self.assertIn(
+            'LOWER("phone_auth_emailaddress"."email")',
+            context.captured_queries[0]["sql"],
+        )
+
+        form = PhoneRegisterForm(
+            dict(
+                self.data,
+                email=self.data["email"].upper(),
+                confirm_password="abcd@1234",
+            )
+        )
+        with CaptureQueriesContext(connection) as context:
+            self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["email"], ["Email already exists"])
+        self.assertTrue(
+            any(
+                'LOWER("phone_auth_emailaddress"."email")' in query["sql"]
+                for query in context
+            )
+        )
+
+    def test_backfill_phone_numbers(self):
+        PhoneNumber.objects.update(country_code=None, national_number=None)
+        call_command(
+            "phone_auth_backfill_phone_numbers", batch_size=1, stdout=StringIO()
+        )
+        self.phone_obj.refresh_from_db()
+        self.assertEqual(self.phone_obj.national_number, 9876543210)
+
+    async def test_aauthenticate(self):
+        backend = CustomAuthBackend()
+        for auth_method in app_settings.AUTHENTICATION_METHODS:
+            user = await backend.aauthenticate(
+                None, login=self.data[auth_method], password=self.data["password"]
+            )
+            self.assertEqual(user, self.user)
+
+            user = await backend.aauthenticate(
+                None, login=self.data[auth_method], password="inco@rrect0Pass"
+            )
+            self.assertIsNone(user)
+
+        user = await backend.aauthenticate(
+            None, login="nobody@example.com", password=self.data["password"]
+        )
+        self.assertIsNone(user)
+
+    @override_settings(LOGIN_THROTTLE_RATES={"identifier": "2/m", "country": "3/m"})
+    def test_phone_login_view_throttling(self):
+        url = reverse("phone_auth:phone_login")
+        credentials = {"login": self.data["phone"], "password": "inco@rrect0Pass"}
+        for _ in range(2):
+            response = self.client.post(url, credentials)
+            self.assertEqual(response.status_code, 400)
+
+        # Rejected even with the correct password
+        credentials["password"] = self.data["password"]
+        response = self.client.post(url, credentials)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+        # Other identifiers are still allowed, up to the country limit
+        credentials["login"] = "+919876543219"
+        response = self.client.post(url, credentials)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(url, credentials)
+        self.assertEqual(response.status_code, 429)
+
+        response = self.client.post(
+            url, {"login": self.data["email"], "password": self.data["password"]}
+        )
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(LOGIN_THROTTLE_RATES={"identifier": "2/m"})
+    def test_concurrent_logins_are_throttled(self):
+        request = RequestFactory().post("/")
+        # Attempts counted before any password is checked, as when they
+        # arrive at the same time.
+        throttles = [login_throttle(request, self.data["phone"]) for _ in range(4)]
+        allowed = [throttle.acquire() == 0 for throttle in throttles]
+        self.assertEqual(allowed, [True, True, False, False])
+
+        # Successful logins aren't counted.
+        throttles[0].release()
+        self.assertEqual(login_throttle(request, self.data["phone"]).acquire(), 0)
+        self.assertGreater(login_throttle(request, self.data["phone"]).acquire(), 0)
+
+    @override_settings(PASSWORD_RESET_THROTTLE_RATES={"ip": "1/h"})
+    def test_phone_password_reset_view_throttling(self):
+        url = reverse("phone_auth:phone_password_reset")
+        response = self.client.post(url, {"login": self.data["phone"]})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(url, {"login": self.data["email"]})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    @override_settings(SEND_COALESCE_WINDOW=60)
+    def test_repeated_sends_are_coalesced(self):
+        sent = []
+
+        def receiver(sender, **kwargs):
+            sent.append(kwargs)
+
+        reset_password_phone.connect(receiver)
+        self.addCleanup(reset_password_phone.disconnect, receiver)
+        verify_phone.connect(receiver)
+        self.addCleanup(verify_phone.disconnect, receiver)
+
+        url = reverse("phone_auth:phone_password_reset")
+        for login in (self.data["phone"], " +91 98765 43210 "):
+            response = self.client.post(url, {"login": login})
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(suppressed_sends("password_reset"), 1)
+
+        self.client.force_login(self.user)
+        url = reverse("phone_auth:phone_email_verification")
+        data = {"method": "phone", "pk": self.phone_obj.pk}
+        for _ in range(3):
+            response = self.client.post(url, data)
+            self.assertEqual(response.context["title"], "Phone Verification Sent")
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(suppressed_sends("verification"), 2)
+
     def test_phone_logout_view(self):
         # Login
         self.client.login(login=self.data["email"], password=self.data["password"])
@@ -159,6 +517,34 @@ class AccountTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertTrue(check_password(data["new_password"], user.password))
 
+    def test_export_command(self):
+        other = User.objects.create(username="other")
+        stdout = StringIO()
+        call_command(
+            "phone_auth_export", chunk_size=1, stdout=stdout, stderr=StringIO()
+        )
+        users = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([user["id"] for user in users], [self.user.pk, other.pk])
+        self.assertEqual(
+            users[0]["phones"], [{"phone": self.data["phone"], "is_verified": False}]
+        )
+        self.assertEqual(
+            users[0]["emails"], [{"email": self.data["email"], "is_verified": False}]
+        )
+        self.assertEqual(users[1]["phones"], [])
+
+        stdout = StringIO()
+        call_command(
+            "phone_auth_export",
+            format="csv",
+            since_id=self.user.pk,
+            stdout=stdout,
+            stderr=StringIO(),
+        )
+        rows = list(csv.DictReader(StringIO(stdout.getvalue())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["username"], "other")
+
     def test_phone_token_generator(self):
         # Test with email
         email_obj = self.user.emailaddress_set.all()[0]
@@ -272,6 +658,7 @@ class AccountTests(TestCase):
             # check with verified email
             self.email_obj.is_verified = True
             self.email_obj.save()
+            request = self.client.get("/").wsgi_request
             response = tview(request)
             self.assertEqual(response.status_code, 200)
 
@@ -296,6 +683,7 @@ class AccountTests(TestCase):
             # check with verified email
             self.phone_obj.is_verified = True
             self.phone_obj.save()
+            request = self.client.get("/").wsgi_request
             response = tview(request)
             self.assertEqual(response.status_code, 200)
 
@@ -337,6 +725,7 @@ class AccountTests(TestCase):
             # check with verified phone
             self.phone_obj.is_verified = True
             self.phone_obj.save()
+            request = self.client.get("/").wsgi_request
             response = Tview.as_view()(request)
             self.assertEqual(response.status_code, 200)
 
@@ -361,6 +750,7 @@ class AccountTests(TestCase):
             # check with verified email
             self.email_obj.is_verified = True
             self.email_obj.save()
+            request = self.client.get("/").wsgi_request
             response = Tview.as_view()(request)
             self.assertEqual(response.status_code, 200)
 
@@ -416,3 +806,1694 @@ class AccountTests(TestCase):
         self.assertEqual(response.status_code, 302)
 
         self.assertTrue(PhoneNumber.objects.filter(phone=data["phone"]).exists())
+
+
+@override_settings(ROOT_URLCONF="tests.async_urls")
+class AsyncViewTests(UserTestCase):
+    async def test_signup(self):
+        url = reverse("phone_auth:phone_signup")
+        data = {
+            "phone": "+919999999999",
+            "username": "test1",
+            "email": "someone@register.com",
+            "first_name": "first",
+            "last_name": "last",
+            "password": "abcd@1234",
+            "confirm_password": "abcd@1234",
+        }
+        response = await self.async_client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        user = await User.objects.aget(username="test1")
+        self.assertTrue(await user.acheck_password(data["password"]))
+        self.assertTrue(
+            await PhoneNumber.objects.filter(user=user, phone=data["phone"]).aexists()
+        )
+
+        response = await self.async_client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.context["form"].errors), {"phone", "email", "username"}
+        )
+
+    async def test_login_and_logout(self):
+        url = reverse("phone_auth:phone_login")
+        response = await self.async_client.post(
+            url, {"login": self.data["phone"], "password": "wrong"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.post(
+            url, {"login": self.data["email"], "password": self.data["password"]}
+        )
+        self.assertRedirects(
+            response, app_settings.LOGIN_REDIRECT_URL, fetch_redirect_response=False
+        )
+
+        # Logged in users are redirected away from the login page
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+        response = await self.async_client.post(reverse("phone_auth:phone_logout"))
+        self.assertEqual(response.status_code, 302)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    async def test_verification(self):
+        sent = []
+
+        async def receiver(sender, **kwargs):
+            sent.append(kwargs)
+
+        verify_phone.connect(receiver)
+        self.addCleanup(verify_phone.disconnect, receiver)
+
+        url = reverse("phone_auth:phone_email_verification")
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 302)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["phone_numbers"], [self.phone_obj])
+
+        response = await self.async_client.post(
+            url, {"method": "phone", "pk": self.phone_obj.pk}
+        )
+        self.assertEqual(response.context["title"], "Phone Verification Sent")
+        self.assertEqual(len(sent), 1)
+
+        response = await self.async_client.get(sent[0]["url"])
+        self.assertEqual(response.context["title"], "Verification successful")
+        phone_obj = await PhoneNumber.objects.aget(pk=self.phone_obj.pk)
+        self.assertTrue(phone_obj.is_verified)
+
+        # The token is single use
+        response = await self.async_client.get(sent[0]["url"])
+        self.assertEqual(response.context["title"], "Verification failed")
+
+    async def test_add_email(self):
+        await self.async_client.aforce_login(self.user)
+        url = reverse("phone_auth:add_email")
+        response = await self.async_client.post(url, {"email": "new@example.com"})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(
+            await EmailAddress.objects.filter(
+                user=self.user, email="new@example.com"
+            ).aexists()
+        )
+
+        response = await self.async_client.post(
+            url, {"email": self.data["email"].upper()}
+        )
+        self.assertEqual(
+            response.context["form"].errors["email"], ["Email already exists"]
+        )
+
+    async def test_password_reset(self):
+        sent = []
+
+        def receiver(sender, **kwargs):
+            sent.append(kwargs)
+
+        reset_password_phone.connect(receiver)
+        self.addCleanup(reset_password_phone.disconnect, receiver)
+
+        response = await self.async_client.post(
+            reverse("phone_auth:phone_password_reset"), {"login": self.data["phone"]}
+        )
+        self.assertRedirects(
+            response,
+            reverse("phone_auth:phone_password_reset_done"),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]["user"], self.user)
+
+
+class VerificationCodeTests(UserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse("phone_auth:phone_verification_code")
+
+    def test_code_generator(self):
+        generator = PhoneVerificationCodeGenerator()
+        generator._now = lambda: 1_000_000
+        code = generator.make_code(self.phone_obj)
+        self.assertRegex(code, r"^\d{6}$")
+        self.assertTrue(generator.check_code(self.phone_obj, code))
+        self.assertFalse(generator.check_code(self.phone_obj, "abcdef"))
+
+        # Accepted during the next window, not after
+        generator._now = lambda: 1_000_000 + app_settings.VERIFICATION_CODE_TIMEOUT
+        self.assertTrue(generator.check_code(self.phone_obj, code))
+        generator._now = lambda: 1_000_000 + 2 * app_settings.VERIFICATION_CODE_TIMEOUT
+        self.assertFalse(generator.check_code(self.phone_obj, code))
+
+        # Codes stop working once the phone is verified
+        generator._now = lambda: 1_000_000
+        self.phone_obj.is_verified = True
+        self.assertFalse(generator.check_code(self.phone_obj, code))
+
+    @override_settings(PHONE_VERIFICATION_METHOD="code")
+    def test_code_is_sent(self):
+        sent = []
+
+        def receiver(sender, **kwargs):
+            sent.append(kwargs)
+
+        verify_phone_code.connect(receiver)
+        self.addCleanup(verify_phone_code.disconnect, receiver)
+
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse("phone_auth:phone_email_verification"),
+            {"method": "phone", "pk": self.phone_obj.pk},
+        )
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]["phone"], self.data["phone"])
+        self.assertTrue(
+            phone_code_generator.check_code(self.phone_obj, sent[0]["code"])
+        )
+
+        response = self.client.post(self.url, {"code": sent[0]["code"]})
+        self.assertRedirects(
+            response,
+            reverse("phone_auth:phone_email_verification"),
+            fetch_redirect_response=False,
+        )
+        self.phone_obj.refresh_from_db()
+        self.assertTrue(self.phone_obj.is_verified)
+
+    @override_settings(VERIFICATION_CODE_MAX_ATTEMPTS=2)
+    def test_attempts_are_capped(self):
+        self.client.force_login(self.user)
+        code = phone_code_generator.make_code(self.phone_obj)
+        wrong = str((int(code) + 1) % 10**6).zfill(6)
+        for _ in range(2):
+            response = self.client.post(self.url, {"code": wrong})
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(self.url, {"code": code})
+        self.assertEqual(response.status_code, 429)
+        self.phone_obj.refresh_from_db()
+        self.assertFalse(self.phone_obj.is_verified)
+
+    @override_settings(VERIFICATION_CODE_MAX_ATTEMPTS=1)
+    def test_concurrent_attempts_are_capped(self):
+        code = phone_code_generator.make_code(self.phone_obj)
+        check_code = phone_code_generator.check_code
+        concurrent = PhoneVerificationCodeForm(self.user, {"code": code})
+        self.assertTrue(concurrent.is_valid())
+
+        def check_code_meanwhile(phone_obj, value):
+            # Another request guessing while this one is being checked.
+            self.assertIsNone(concurrent.save())
+            return check_code(phone_obj, value)
+
+        form = PhoneVerificationCodeForm(self.user, {"code": "000000"})
+        self.assertTrue(form.is_valid())
+        with mock.patch.object(
+            phone_code_generator, "check_code", side_effect=check_code_meanwhile
+        ):
+            self.assertIsNone(form.save())
+        self.assertTrue(concurrent.has_error("code", "throttled"))
+
+    @override_settings(ROOT_URLCONF="tests.async_urls")
+    async def test_async_view(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(self.url, {"code": "x"})
+        self.assertEqual(response.status_code, 400)
+
+        code = phone_code_generator.make_code(self.phone_obj)
+        response = await self.async_client.post(self.url, {"code": code})
+        self.assertEqual(response.status_code, 302)
+        phone_obj = await PhoneNumber.objects.aget(pk=self.phone_obj.pk)
+        self.assertTrue(phone_obj.is_verified)
+
+
+@override_settings(SIGNAL_DISPATCH="outbox")
+class OutboxTests(UserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sent = []
+        reset_password_phone.connect(self.receiver)
+        self.addCleanup(reset_password_phone.disconnect, self.receiver)
+
+    def receiver(self, sender, **kwargs):
+        self.sent.append(kwargs)
+
+    def request_reset(self):
+        self.client.post(
+            reverse("phone_auth:phone_password_reset"), {"login": self.data["phone"]}
+        )
+
+    def test_signal_is_queued_and_dispatched(self):
+        self.request_reset()
+        self.assertEqual(self.sent, [])
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.signal, "reset_password_phone")
+
+        call_command("phone_auth_dispatch", once=True, stdout=StringIO())
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0]["user"], self.user)
+        self.assertEqual(self.sent[0]["phone"], self.data["phone"])
+        self.assertTrue(self.sent[0]["url"].startswith("/accounts/"))
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_claimed_messages_are_leased(self):
+        self.request_reset()
+        self.assertEqual(len(claim_messages(10)), 1)
+        self.assertEqual(claim_messages(10), [])
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_delivery_is_retried(self):
+        def failing_receiver(sender, **kwargs):
+            raise ConnectionError("gateway down")
+
+        reset_password_phone.connect(failing_receiver)
+        self.addCleanup(reset_password_phone.disconnect, failing_receiver)
+        self.request_reset()
+
+        (message,) = claim_messages(10)
+        self.assertFalse(deliver(message))
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 1)
+        self.assertIn("gateway down", message.last_error)
+        self.assertGreater(message.available_at, timezone.now())
+
+        with self.assertLogs("phone_auth.outbox", "ERROR"):
+            self.assertFalse(deliver(message))
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 2)
+        self.assertIsNone(message.available_at)
+        # Reset links aren't kept in failed messages.
+        self.assertEqual(message.payload, {})
+
+    def test_unknown_sender_counts_as_a_failed_attempt(self):
+        self.request_reset()
+        OutboxMessage.objects.update(sender="phone_auth.forms.RenamedForm")
+        (message,) = claim_messages(10)
+        self.assertFalse(deliver(message))
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 1)
+        self.assertIn("RenamedForm", message.last_error)
+        self.assertEqual(self.sent, [])
+
+
+class ContactStatusTests(UserTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        PhoneNumber.objects.create(
+            user=cls.user, phone="+919876543211", is_verified=True
+        )
+
+    def get_request(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        return request
+
+    def test_contacts_are_loaded_with_one_query(self):
+        status = ContactStatus(self.get_request())
+        with self.assertNumQueries(1):
+            self.assertTrue(status.has_verified_phone)
+            self.assertFalse(status.has_verified_email)
+
+        status = ContactStatus(self.get_request())
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                sorted(status.phones),
+                [("+919876543210", False), ("+919876543211", True)],
+            )
+            self.assertEqual(status.emails, [(self.data["email"], False)])
+            self.assertTrue(status.has_verified_phone)
+
+        request = self.get_request()
+        request.user = AnonymousUser()
+        with self.assertNumQueries(0):
+            self.assertFalse(ContactStatus(request).has_verified_phone)
+
+    @override_settings(CONTACT_STATUS_CACHE_TIMEOUT=300)
+    def test_verified_flags_are_cached(self):
+        @verified_phone_required
+        @verified_email_required
+        def tview(request):
+            return HttpResponse()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(tview(self.get_request()).status_code, 302)
+        with self.assertNumQueries(0):
+            self.assertEqual(tview(self.get_request()).status_code, 302)
+
+        # Saving a contact invalidates the cached flags
+        self.email_obj.is_verified = True
+        self.email_obj.save()
+        self.assertEqual(tview(self.get_request()).status_code, 200)
+        self.email_obj.delete()
+        self.assertEqual(tview(self.get_request()).status_code, 302)
+
+    async def test_aload(self):
+        request = self.get_request()
+
+        async def auser():
+            return self.user
+
+        request.auser = auser
+        status = ContactStatus(request)
+        await status.aload(contacts=True)
+        self.assertTrue(status.has_verified_phone)
+        self.assertEqual(len(status.phones), 2)
+
+
+@override_settings(USER_CACHE_TIMEOUT=60)
+class UserCacheTests(UserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.backend = CustomAuthBackend()
+
+    def test_get_user_is_cached(self):
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.date_joined, self.user.date_joined)
+        self.assertEqual(
+            user.get_session_auth_hash(), self.user.get_session_auth_hash()
+        )
+        # The password hash isn't cached, only loaded on use.
+        _, row_key = user_cache_keys(self.user.pk)
+        self.assertNotIn(self.user.password, cache.get(row_key)[2])
+        self.assertIn("password", user.get_deferred_fields())
+        with self.assertNumQueries(1):
+            self.assertEqual(user.password, self.user.password)
+
+        # Once cached, session auth runs no user query
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("phone_auth:phone_logout"))
+        self.assertEqual(response.wsgi_request.user, self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("phone_auth:phone_logout"))
+            self.assertEqual(response.wsgi_request.user, self.user)
+        table = User._meta.db_table
+        self.assertFalse(
+            [query for query in context.captured_queries if table in query["sql"]]
+        )
+
+    def test_password_change_keeps_the_session(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("phone_auth:phone_change_password"))
+        data = {
+            "old_password": self.data["password"],
+            "new_password1": "new@pass1234",
+            "new_password2": "new@pass1234",
+        }
+        response = self.client.post(reverse("phone_auth:phone_change_password"), data)
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(reverse("phone_auth:phone_change_password"))
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+
+        user = self.backend.get_user(self.user.pk)
+        self.assertEqual(pickle.loads(pickle.dumps(user)), user)
+
+    def test_invalidation(self):
+        self.backend.get_user(self.user.pk)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password("new@pass1234")
+        user.save()
+        with self.assertNumQueries(1):
+            cached = self.backend.get_user(self.user.pk)
+        self.assertTrue(cached.check_password("new@pass1234"))
+
+        user.is_active = False
+        user.save(update_fields=["is_active"])
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+        user.delete()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_stale_row_is_ignored(self):
+        # Read by a request before the user changed, cached after.
+        version_key, row_key = user_cache_keys(self.user.pk)
+        self.backend.get_user(self.user.pk)
+        stale = cache.get(row_key)
+        User.objects.get(pk=self.user.pk).save()
+        cache.set(row_key, stale)
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.user.pk)
+
+    def test_invalidated_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=self.user.pk).save()
+            # Cached by a request reading the row before the commit.
+            self.backend.get_user(self.user.pk)
+            with self.assertNumQueries(0):
+                self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.user.pk)
+
+
+class BearerTokenTests(UserTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.phone_obj.is_verified = True
+        cls.phone_obj.save()
+
+    def obtain(self, **data):
+        return self.client.post(
+            reverse("phone_auth:api_token"),
+            json.dumps(data),
+            content_type="application/json",
+        )
+
+    def refresh(self, refresh_token):
+        return self.client.post(
+            reverse("phone_auth:api_token_refresh"), {"refresh_token": refresh_token}
+        )
+
+    def test_obtain(self):
+        response = self.obtain(login=self.data["phone"], password=self.data["password"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b": ", response.content)
+        tokens = response.json()
+        self.assertEqual(tokens["token_type"], "Bearer")
+        user = read_access_token(tokens["access_token"])
+        self.assertEqual(user, TokenUser(self.user.pk, True, False))
+        self.assertEqual(user.verified_flags, (True, False))
+        self.assertTrue(user.is_active)
+        self.assertEqual(user.get_user(), self.user)
+
+        response = self.obtain(login=self.data["phone"], password="inco@rrect0Pass")
+        self.assertEqual(response.json(), {"error": "invalid_credentials"})
+        response = self.client.post(
+            reverse("phone_auth:api_token"), "{", content_type="application/json"
+        )
+        self.assertEqual(response.json(), {"error": "invalid_json"})
+
+    def test_token_requests_need_no_query(self):
+        access_token = issue_tokens(self.user)["access_token"]
+
+        class TokenView(APIView):
+            http_method_names = ["get"]
+
+            def get(self, request):
+                status = get_contact_status(request)
+                return HttpResponse(f"{request.user.pk} {status.has_verified_phone}")
+
+        view = TokenView.as_view()
+        middleware = BearerTokenMiddleware(view)
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        request.user = AnonymousUser()
+        with self.assertNumQueries(0):
+            self.assertIsNone(middleware.process_request(request))
+            self.assertIsNone(middleware.process_view(request, view, (), {}))
+            response = view(request)
+        self.assertEqual(response.content, f"{self.user.pk} True".encode())
+
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION="Bearer forged")
+        response = middleware(request)
+        self.assertEqual(response.status_code, 401)
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            request = RequestFactory().get(
+                "/", HTTP_AUTHORIZATION=f"Bearer {access_token}"
+            )
+            self.assertEqual(middleware(request).status_code, 401)
+
+    def test_html_views_get_the_user_instance(self):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {issue_tokens(self.user)['access_token']}"
+        }
+        url = reverse("phone_auth:phone_email_verification")
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["user"], self.user)
+
+        response = self.client.post(
+            url, {"method": "phone", "pk": self.phone_obj.pk}, **headers
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(
+            reverse("phone_auth:add_phone"), {"phone": "+12125552368"}, **headers
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(
+            PhoneNumber.objects.filter(user=self.user, phone="+12125552368").exists()
+        )
+
+        # Deactivated users are anonymous, like with a session.
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 302)
+
+    def test_refresh_tokens_rotate(self):
+        first = issue_tokens(self.user)["refresh_token"]
+        response = self.refresh(first)
+        self.assertEqual(response.status_code, 200)
+        second = response.json()["refresh_token"]
+        self.assertNotEqual(second, first)
+
+        # Reusing a refresh token revokes its whole family.
+        self.assertEqual(self.refresh(first).json(), {"error": "invalid_grant"})
+        self.assertEqual(self.refresh(second).json(), {"error": "invalid_grant"})
+        self.assertFalse(RefreshToken.objects.exists())
+
+    def test_password_change_and_revoke(self):
+        refresh_token = issue_tokens(self.user)["refresh_token"]
+        self.user.set_password("new@pass1234")
+        self.user.save()
+        self.assertEqual(self.refresh(refresh_token).status_code, 400)
+
+        refresh_token = issue_tokens(self.user)["refresh_token"]
+        response = self.client.post(
+            reverse("phone_auth:api_token_revoke"), {"refresh_token": refresh_token}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(refresh_token).status_code, 400)
+
+
+class APITests(UserTestCase):
+    def post(self, name, data=None, **extra):
+        return self.client.post(
+            reverse(f"phone_auth:{name}"),
+            json.dumps(data or {}),
+            content_type="application/json",
+            **extra,
+        )
+
+    def test_signup(self):
+        data = dict(self.data, confirm_password=self.data["password"])
+        response = self.post("api_signup", data)
+        self.assertEqual(
+            response.json(),
+            {
+                "error": "invalid",
+                "fields": {
+                    "phone": ["unique"],
+                    "email": ["unique"],
+                    "username": ["unique"],
+                },
+            },
+        )
+        self.assertEqual(response.templates, [])
+
+        data.update(
+            phone="+919999999999", username="test1", email="someone@register.com"
+        )
+        response = self.post("api_signup", dict(data, confirm_password="x"))
+        self.assertEqual(
+            response.json()["fields"], {"confirm_password": ["password_mismatch"]}
+        )
+        response = self.post("api_signup", data)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(User.objects.filter(username="test1").exists())
+
+    def test_session(self):
+        response = self.client.get(reverse("phone_auth:api_contacts"))
+        self.assertEqual(response.json(), {"error": "not_authenticated"})
+        response = self.post(
+            "api_login", {"login": self.data["email"], "password": "wrong"}
+        )
+        self.assertEqual(response.json(), {"error": "invalid_credentials"})
+        response = self.post(
+            "api_login",
+            {"login": self.data["email"], "password": self.data["password"]},
+        )
+        self.assertEqual(response.json(), {"user_id": self.user.pk})
+
+        response = self.client.get(reverse("phone_auth:api_contacts"))
+        self.assertEqual(
+            response.content,
+            b'{"phones":[{"id":%d,"phone":"+919876543210","verified":false}],'
+            b'"emails":[{"id":%d,"email":"someone@example.com","verified":false}]}'
+            % (self.phone_obj.pk, self.email_obj.pk),
+        )
+
+        self.post("api_logout")
+        response = self.client.get(reverse("phone_auth:api_contacts"))
+        self.assertEqual(response.status_code, 401)
+
+    def test_csrf(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.force_login(self.user)
+        data = {"phone": "+919999999999"}
+        self.assertEqual(self.post("api_add_phone", data).status_code, 403)
+
+        access_token = issue_tokens(self.user)["access_token"]
+        response = self.post(
+            "api_add_phone", data, HTTP_AUTHORIZATION=f"Bearer {access_token}"
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_contacts_with_token(self):
+        headers = {
+            "HTTP_AUTHORIZATION": f"Bearer {issue_tokens(self.user)['access_token']}"
+        }
+        response = self.post("api_add_email", {"email": "new@example.com"}, **headers)
+        self.assertEqual(response.status_code, 201)
+        response = self.post("api_add_email", {"email": self.data["email"]}, **headers)
+        self.assertEqual(response.json()["fields"], {"email": ["unique"]})
+
+        data = {"method": "phone", "pk": self.phone_obj.pk}
+        response = self.post("api_verification", data, **headers)
+        self.assertEqual(response.json(), {})
+        response = self.post("api_verification", dict(data, pk=0), **headers)
+        self.assertEqual(response.json(), {"error": "not_found"})
+
+        response = self.post("api_verification_code", {"code": "1"}, **headers)
+        self.assertEqual(response.json()["fields"], {"code": ["invalid"]})
+        with override_settings(VERIFICATION_CODE_MAX_ATTEMPTS=1):
+            response = self.post("api_verification_code", {"code": "1"}, **headers)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json(), {"error": "throttled"})
+        code = phone_code_generator.make_code(self.phone_obj)
+        response = self.post("api_verification_code", {"code": code}, **headers)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.post("api_verification", data, **headers)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {"error": "already_verified"})
+
+
+class DeliveryTests(UserTestCase):
+    def setUp(self):
+        super().setUp()
+        locmem.outbox.clear()
+        self.addCleanup(close_backends)
+
+    @override_settings(
+        DELIVERY_BACKENDS={
+            "sms": {"BACKEND": "phone_auth.delivery.locmem.DeliveryBackend"},
+            "email": {
+                "BACKEND": "phone_auth.delivery.mail.EmailBackend",
+                "OPTIONS": {"backend": "django.core.mail.backends.locmem.EmailBackend"},
+            },
+        },
+        DELIVERY_BASE_URL="https://example.com",
+    )
+    def test_reset_and_verification_are_delivered(self):
+        url = reverse("phone_auth:phone_password_reset")
+        self.client.post(url, {"login": self.data["phone"]})
+        (message,) = locmem.outbox
+        self.assertEqual(message.to, self.data["phone"])
+        self.assertRegex(message.body, r"https://example.com/accounts/\S+/$")
+
+        self.client.post(url, {"login": self.data["email"]})
+        (email,) = mail.outbox
+        self.assertEqual(email.to, [self.data["email"]])
+        self.assertEqual(email.subject, "Reset your password")
+        self.assertIn("https://example.com/accounts/", email.body)
+
+        self.client.force_login(self.user)
+        with override_settings(PHONE_VERIFICATION_METHOD="code"):
+            self.client.post(
+                reverse("phone_auth:phone_email_verification"),
+                {"method": "phone", "pk": self.phone_obj.pk},
+            )
+        code = phone_code_generator.make_code(self.phone_obj)
+        self.assertEqual(locmem.outbox[-1].body, f"Your verification code is {code}")
+
+    def test_country_routing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sms.jsonl")
+            backends = {
+                "sms": {
+                    "BACKEND": "phone_auth.delivery.locmem.DeliveryBackend",
+                    "COUNTRIES": {
+                        "44": {
+                            "BACKEND": "phone_auth.delivery.filebased.DeliveryBackend",
+                            "OPTIONS": {"path": path},
+                        },
+                    },
+                },
+            }
+            messages = [
+                Message("sms", "+447911123456", "", "one"),
+                Message("sms", "+919876543210", "", "two"),
+                Message("sms", "+447911123457", "", "three"),
+                Message("email", "someone@example.com", "", "no backend"),
+            ]
+            with override_settings(DELIVERY_BACKENDS=backends):
+                self.assertEqual(send_messages(messages), 3)
+                close_backends()
+            with open(path) as f:
+                self.assertEqual(
+                    [json.loads(line)["body"] for line in f], ["one", "three"]
+                )
+        self.assertEqual([message.body for message in locmem.outbox], ["two"])
+
+    def test_http_sms_backend(self):
+        requests = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                requests.append((self.client_address, json.loads(body)))
+                status = 500 if len(requests) > 3 else 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        backend = SmsBackend(
+            f"http://127.0.0.1:{server.server_port}/send", batch_size=2
+        )
+        self.addCleanup(backend.close)
+        messages = [Message("sms", f"+91987654321{i}", "", str(i)) for i in range(5)]
+        self.assertEqual(backend.send_messages(messages), 5)
+        self.assertEqual([len(body["messages"]) for _, body in requests], [2, 2, 1])
+        # The connection is kept alive between batches
+        self.assertEqual(len({address for address, _ in requests}), 1)
+
+        with self.assertRaises(DeliveryError):
+            backend.send_messages(messages[:1])
+        backend.fail_silently = True
+        self.assertEqual(backend.send_messages(messages[:1]), 0)
+
+
+QUERY_BUDGETS = {
+    # URL name: {path: (max queries, max seconds)}. Query counts include
+    # savepoints and the session and auth middleware queries.
+    "phone_signup": {"get": (0, 0.2), "success": (6, 0.5), "failure": (1, 0.2)},
+    "phone_login": {"get": (0, 0.2), "success": (9, 0.5), "failure": (1, 0.2)},
+    "phone_logout": {"get": (0, 0.2), "success": (4, 0.2)},
+    "phone_password_reset": {"success": (1, 0.2), "failure": (1, 0.2)},
+    "phone_password_reset_done": {"get": (0, 0.2)},
+    "phone_password_reset_confirm": {"success": (5, 0.2), "failure": (1, 0.2)},
+    "phone_password_reset_complete": {"get": (0, 0.2)},
+    "phone_change_password": {"get": (2, 0.2), "success": (12, 0.5)},
+    "phone_change_password_done": {"get": (2, 0.2)},
+    "phone_email_verification": {"get": (4, 0.2), "success": (5, 0.2)},
+    "phone_email_verification_confirm": {"success": (2, 0.2), "failure": (1, 0.2)},
+    "phone_verification_code": {"success": (4, 0.2), "failure": (3, 0.2)},
+    "add_phone": {"success": (5, 0.2), "failure": (6, 0.2)},
+    "add_email": {"success": (5, 0.2), "failure": (6, 0.2)},
+    "api_signup": {"success": (6, 0.5), "failure": (1, 0.2)},
+    "api_login": {"success": (9, 0.5), "failure": (1, 0.2)},
+    "api_logout": {"success": (4, 0.2)},
+    "api_contacts": {"get": (4, 0.2)},
+    "api_add_phone": {"success": (5, 0.2), "failure": (6, 0.2)},
+    "api_add_email": {"success": (5, 0.2), "failure": (6, 0.2)},
+    "api_verification": {"success": (3, 0.2)},
+    "api_verification_code": {"success": (4, 0.2), "failure": (3, 0.2)},
+    "api_token": {"success": (3, 0.2), "failure": (1, 0.2)},
+    "api_token_refresh": {"success": (6, 0.2), "failure": (3, 0.2)},
+    "api_token_revoke": {"success": (2, 0.2)},
+}
+# Wall time budgets depend on the machine, so they are only checked when
+# LATENCY_BUDGETS is set; LATENCY_BUDGET_SCALE scales them for slow machines.
+LATENCY_BUDGETS = bool(os.environ.get("LATENCY_BUDGETS"))
+LATENCY_BUDGET_SCALE = float(os.environ.get("LATENCY_BUDGET_SCALE", 1))
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class QueryBudgetTests(UserTestCase):
+    """Query count and wall time budgets for every URL in phone_auth.urls.
+
+    Query budgets are the queries each view needs; lower one when a change
+    saves queries. Password hashing is swapped for a fast hasher so the
+    opt-in wall time budgets measure phone_auth rather than the hasher's
+    work factor.
+    """
+
+    @contextmanager
+    def assertWithinBudget(self, name, path):
+        queries, seconds = QUERY_BUDGETS[name][path]
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - start
+        executed = "\n".join(query["sql"] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context),
+            queries,
+            f"{name} ({path}) ran {len(context)} queries:\n{executed}",
+        )
+        if LATENCY_BUDGETS:
+            self.assertLessEqual(
+                elapsed,
+                seconds * LATENCY_BUDGET_SCALE,
+                f"{name} ({path}) took {elapsed:.3f}s",
+            )
+
+    def get(self, name, path, *args, status=200):
+        url = reverse(f"phone_auth:{name}", args=args)
+        with self.assertWithinBudget(name, path):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def post(self, name, path, data, *args, status=302):
+        url = reverse(f"phone_auth:{name}", args=args)
+        with self.assertWithinBudget(name, path):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_every_url_has_a_budget(self):
+        self.assertEqual(
+            set(QUERY_BUDGETS), {pattern.name for pattern in urls.urlpatterns}
+        )
+
+    def test_signup(self):
+        self.get("phone_signup", "get")
+        data = {
+            "phone": "+919999999999",
+            "username": "test1",
+            "email": "someone@register.com",
+            "first_name": "first",
+            "last_name": "last",
+            "password": "abcd@1234",
+            "confirm_password": "abcd@1234",
+        }
+        self.post("phone_signup", "success", data)
+        self.post("phone_signup", "failure", data, status=200)
+
+    def test_login_logout(self):
+        self.get("phone_login", "get")
+        self.post(
+            "phone_login",
+            "failure",
+            {"login": self.data["phone"], "password": "wrong"},
+            status=400,
+        )
+        self.post(
+            "phone_login",
+            "success",
+            {"login": self.data["phone"], "password": self.data["password"]},
+        )
+        self.get("phone_logout", "get")
+        self.post("phone_logout", "success", {})
+
+    def test_password_reset(self):
+        self.post("phone_password_reset", "success", {"login": self.data["phone"]})
+        self.post("phone_password_reset", "failure", {"login": "+919876543211"})
+        self.get("phone_password_reset_done", "get")
+
+        uidb64 = urlsafe_base64_encode(force_bytes(self.user.pk))
+        token = default_token_generator.make_token(self.user)
+        self.get("phone_password_reset_confirm", "failure", uidb64, "wrong")
+        self.get("phone_password_reset_confirm", "success", uidb64, token, status=302)
+        self.get("phone_password_reset_complete", "get")
+
+    def test_change_password(self):
+        self.client.force_login(self.user)
+        self.get("phone_change_password", "get")
+        self.post(
+            "phone_change_password",
+            "success",
+            {
+                "old_password": self.data["password"],
+                "new_password1": "efgh@5678",
+                "new_password2": "efgh@5678",
+            },
+        )
+        self.get("phone_change_password_done", "get")
+
+    def test_verification(self):
+        self.client.force_login(self.user)
+        self.get("phone_email_verification", "get")
+        self.post(
+            "phone_email_verification",
+            "success",
+            {"method": "phone", "pk": self.phone_obj.pk},
+            status=200,
+        )
+
+        idb64 = urlsafe_base64_encode(force_bytes(f"phone{self.phone_obj.pk}"))
+        token = phone_token_generator(
+            email_address_obj=None, phone_number_obj=self.phone_obj
+        ).make_token(self.user)
+        self.get("phone_email_verification_confirm", "failure", idb64, "wrong")
+        self.get("phone_email_verification_confirm", "success", idb64, token)
+
+    def test_verification_code(self):
+        self.client.force_login(self.user)
+        self.post("phone_verification_code", "failure", {"code": "1"}, status=400)
+        code = phone_code_generator.make_code(self.phone_obj)
+        self.post("phone_verification_code", "success", {"code": code})
+
+    def test_add_phone_and_email(self):
+        self.client.force_login(self.user)
+        self.post("add_phone", "success", {"phone": "+919999999999"})
+        self.post("add_phone", "failure", {"phone": self.data["phone"]}, status=200)
+        self.post("add_email", "success", {"email": "new@example.com"})
+        self.post("add_email", "failure", {"email": self.data["email"]}, status=200)
+
+    def test_api(self):
+        data = {
+            "phone": "+919999999999",
+            "username": "test1",
+            "email": "someone@register.com",
+            "first_name": "first",
+            "last_name": "last",
+            "password": "abcd@1234",
+            "confirm_password": "abcd@1234",
+        }
+        self.post("api_signup", "success", data, status=201)
+        self.post("api_signup", "failure", data, status=400)
+        self.post(
+            "api_login",
+            "failure",
+            {"login": self.data["phone"], "password": "wrong"},
+            status=400,
+        )
+        self.post(
+            "api_login",
+            "success",
+            {"login": self.data["phone"], "password": self.data["password"]},
+            status=200,
+        )
+        self.get("api_contacts", "get")
+        self.post("api_add_phone", "success", {"phone": "+919999999998"}, status=201)
+        self.post("api_add_phone", "failure", {"phone": self.data["phone"]}, status=400)
+        self.post("api_add_email", "success", {"email": "new@example.com"}, status=201)
+        self.post("api_add_email", "failure", {"email": self.data["email"]}, status=400)
+        self.post(
+            "api_verification",
+            "success",
+            {"method": "phone", "pk": self.phone_obj.pk},
+            status=200,
+        )
+        self.post("api_verification_code", "failure", {"code": "1"}, status=400)
+        code = phone_code_generator.make_code(self.phone_obj)
+        self.post("api_verification_code", "success", {"code": code}, status=200)
+        self.post("api_logout", "success", {}, status=200)
+
+    def test_api_tokens(self):
+        self.post(
+            "api_token",
+            "failure",
+            {"login": self.data["phone"], "password": "wrong"},
+            status=400,
+        )
+        response = self.post(
+            "api_token",
+            "success",
+            {"login": self.data["phone"], "password": self.data["password"]},
+            status=200,
+        )
+        refresh_token = response.json()["refresh_token"]
+        response = self.post(
+            "api_token_refresh",
+            "success",
+            {"refresh_token": refresh_token},
+            status=200,
+        )
+        self.post(
+            "api_token_refresh",
+            "failure",
+            {"refresh_token": "wrong"},
+            status=400,
+        )
+        self.post(
+            "api_token_revoke",
+            "success",
+            {"refresh_token": response.json()["refresh_token"]},
+            status=200,
+        )
+
+
+@override_settings(IDENTIFIER_CACHE_TIMEOUT=300)
+class IdentifierCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="cached", password="!")
+        cls.phone_obj = PhoneNumber.objects.create(user=cls.user, phone="+919876543210")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_resolve_user_is_cached(self):
+        identifier = classify("+919876543210")
+        with self.assertNumQueries(2):
+            self.assertEqual(resolve_user(identifier), self.user)
+        # Only the user row is fetched on a cache hit.
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_user(identifier), self.user)
+
+    def test_negative_entries(self):
+        identifier = classify("+919876543211")
+        self.assertIsNone(resolve_user(identifier))
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve_user(identifier))
+
+        PhoneNumber.objects.create(user=self.user, phone="+919876543211")
+        self.assertEqual(resolve_user(identifier), self.user)
+
+    def test_negative_entry_cached_before_commit(self):
+        identifier = classify("+919876543211")
+        with self.captureOnCommitCallbacks(execute=True):
+            PhoneNumber.objects.create(user=self.user, phone="+919876543211")
+            # Cached by a request that doesn't see the new row yet.
+            cache.set(identifier_cache_key(identifier.kind, identifier.value), 0)
+        self.assertEqual(resolve_user(identifier), self.user)
+
+    def test_invalidation(self):
+        old_identifier = classify("+919876543210")
+        new_identifier = classify("+919876543212")
+        self.assertEqual(resolve_user(old_identifier), self.user)
+        self.assertIsNone(resolve_user(new_identifier))
+
+        self.phone_obj.phone = "+919876543212"
+        self.phone_obj.save()
+        self.assertIsNone(resolve_user(old_identifier))
+        self.assertEqual(resolve_user(new_identifier), self.user)
+
+        self.phone_obj.delete()
+        self.assertIsNone(resolve_user(new_identifier))
+
+        username = classify("cached")
+        self.assertEqual(resolve_user(username), self.user)
+        self.user.delete()
+        self.assertIsNone(resolve_user(username))
+
+
+class BloomFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="bloom", password="!")
+        PhoneNumber.objects.create(user=cls.user, phone="+919876543210")
+        EmailAddress.objects.create(user=cls.user, email="Bloom@example.com")
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        path = os.path.join(tmp_dir.name, "identifiers.bloom")
+        settings_override = override_settings(BLOOM_FILTER_PATH=path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.build()
+
+    def build(self):
+        call_command(
+            "phone_auth_build_bloom_filter",
+            capacity=1000,
+            reload_wait=0,
+            stdout=StringIO(),
+        )
+
+    def test_membership(self):
+        self.assertTrue(might_exist(AuthenticationMethod.PHONE, "+919876543210"))
+        self.assertTrue(might_exist(AuthenticationMethod.EMAIL, "bloom@example.com"))
+        self.assertTrue(might_exist(AuthenticationMethod.USERNAME, "bloom"))
+        self.assertFalse(might_exist(AuthenticationMethod.PHONE, "+919876543211"))
+        self.assertFalse(might_exist(AuthenticationMethod.USERNAME, "unknown"))
+
+    def test_definite_misses_skip_queries(self):
+        backend = CustomAuthBackend()
+        with self.assertNumQueries(0):
+            self.assertIsNone(
+                backend.authenticate(None, login="+919876543211", password="pass")
+            )
+        with self.assertNumQueries(1):
+            self.assertIsNone(
+                backend.authenticate(None, login="bloom", password="pass")
+            )
+
+    def test_updated_from_signals(self):
+        self.assertFalse(might_exist(AuthenticationMethod.PHONE, "+919876543211"))
+        PhoneNumber.objects.create(user=self.user, phone="+919876543211")
+        self.assertTrue(might_exist(AuthenticationMethod.PHONE, "+919876543211"))
+
+    def test_rebuild_keeps_rows_edited_during_the_build(self):
+        def edit(seconds):
+            # Running processes add the edit to the previous file.
+            User.objects.filter(pk=self.user.pk).update(username="renamed")
+
+        with mock.patch(
+            "phone_auth.management.commands.phone_auth_build_bloom_filter.time.sleep",
+            side_effect=edit,
+        ):
+            self.build()
+        self.assertTrue(might_exist(AuthenticationMethod.USERNAME, "renamed"))
+
+
+class ImportCommandTests(TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+
+    def write_jsonl(self, rows):
+        path = os.path.join(self.tmp_dir, "users.jsonl")
+        with open(path, "w") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        return path
+
+    def test_import(self):
+        existing = User.objects.create(username="existing")
+        PhoneNumber.objects.create(user=existing, phone="+919000000009")
+
+        path = self.write_jsonl(
+            [
+                {
+                    "phone": "+919000000001",
+                    "email": "Alice@example.com",
+                    "username": "alice",
+                    "password": make_password("abcd@1234"),
+                    "phone_verified": True,
+                },
+                {"phone": "+919000000002", "password": make_password("abcd@1234")},
+                {"phone": "12345", "password": make_password("abcd@1234")},
+                {"phone": "+919000000009", "password": make_password("abcd@1234")},
+                {"phone": "+919000000003", "password": "plaintext"},
+            ]
+        )
+        errors_path = os.path.join(self.tmp_dir, "errors.csv")
+        checkpoint_path = os.path.join(self.tmp_dir, "checkpoint.json")
+        options = {
+            "hashed": True,
+            "batch_size": 2,
+            "errors": errors_path,
+            "checkpoint": checkpoint_path,
+            "stdout": StringIO(),
+        }
+        call_command("phone_auth_import", path, **options)
+
+        alice = User.objects.get(username="alice")
+        self.assertTrue(check_password("abcd@1234", alice.password))
+        self.assertTrue(alice.phonenumber_set.get().is_verified)
+        self.assertFalse(alice.emailaddress_set.get().is_verified)
+        self.assertEqual(LoginIdentifier.objects.filter(user=alice).count(), 3)
+        self.assertTrue(PhoneNumber.objects.filter(phone="+919000000002").exists())
+        self.assertEqual(User.objects.count(), 3)
+
+        with open(errors_path) as f:
+            errors = list(csv.reader(f))
+        self.assertEqual(
+            errors,
+            [
+                ["row", "error"],
+                ["3", "Invalid phone"],
+                ["4", "Phone already exists"],
+                ["5", "Unknown password hash format"],
+            ],
+        )
+
+        # Resuming from the checkpoint doesn't process any row again, and
+        # keeps the errors of the earlier rows.
+        with open(path, "a") as f:
+            f.write(json.dumps({"phone": "", "password": "!"}) + "\n")
+        call_command("phone_auth_import", path, **options)
+        self.assertEqual(User.objects.count(), 3)
+        with open(errors_path) as f:
+            self.assertEqual(list(csv.reader(f)), errors + [["6", "Invalid phone"]])
+
+    def test_import_hashes_plaintext_passwords(self):
+        path = self.write_jsonl([{"phone": "+919000000001", "password": "abcd@1234"}])
+        call_command(
+            "phone_auth_import", path, workers=1, stdout=StringIO(), stderr=StringIO()
+        )
+        user = PhoneNumber.objects.get(phone="+919000000001").user
+        self.assertTrue(check_password("abcd@1234", user.password))
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", password="abcd@1234")
+        users = User.objects.bulk_create([User(username=f"user{i}") for i in range(30)])
+        PhoneNumber.objects.bulk_create(
+            [
+                PhoneNumber(user=user, phone=f"+9190000000{i:02d}")
+                for i, user in enumerate(users)
+            ]
+            + [PhoneNumber(user=users[0], phone="+447911123456", is_verified=True)]
+        )
+        EmailAddress.objects.bulk_create(
+            [
+                EmailAddress(user=user, email=f"User{i}@example.com")
+                for i, user in enumerate(users)
+            ]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse("admin:phone_auth_phonenumber_changelist")
+
+    def test_changelist(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # No query per row for the users
+        self.assertLess(len(queries), 10)
+        cl = response.context["cl"]
+        self.assertEqual(len(cl.result_list), 31)
+        self.assertEqual(cl.result_count, 31)
+        self.assertIsNone(cl.next_after)
+        self.assertNotContains(response, "Next page")
+
+    def test_prefix_indexes_use_pattern_ops_on_postgresql(self):
+        index = next(
+            index
+            for index in EmailAddress._meta.indexes
+            if index.name == "phone_auth_email_prefix_idx"
+        )
+        editor = connection.schema_editor(collect_sql=True)
+        self.assertNotIn(
+            "varchar_pattern_ops", str(index.create_sql(EmailAddress, editor))
+        )
+        with mock.patch.object(connection, "vendor", "postgresql"):
+            sql = str(index.create_sql(EmailAddress, editor))
+        self.assertIn('(LOWER("email") varchar_pattern_ops)', sql)
+
+    def test_email_unique_fallback_without_expression_indexes(self):
+        constraints = {c.name: c for c in EmailAddress._meta.constraints}
+        fallback = constraints["phone_auth_emailaddress_email_exact_uniq"]
+        expression = constraints["phone_auth_emailaddress_email_uniq"]
+        editor = connection.schema_editor(collect_sql=True)
+        self.assertIsNone(fallback.create_sql(EmailAddress, editor))
+        self.assertIsNotNone(expression.create_sql(EmailAddress, editor))
+        with mock.patch.object(
+            connection.features, "supports_expression_indexes", False
+        ):
+            self.assertIn('("email")', str(fallback.create_sql(EmailAddress, editor)))
+            self.assertIsNone(expression.create_sql(EmailAddress, editor))
+
+    def test_keyset_pagination(self):
+        with mock.patch.object(PhoneNumberAdmin, "list_per_page", 20):
+            response = self.client.get(self.url)
+            cl = response.context["cl"]
+            self.assertEqual(len(cl.result_list), 20)
+            self.assertContains(response, "Next page")
+
+            response = self.client.get(self.url + cl.next_page_url())
+            pks = [obj.pk for obj in response.context["cl"].result_list]
+        self.assertEqual(len(pks), 11)
+        self.assertLess(max(pks), cl.next_after)
+        self.assertIsNone(response.context["cl"].next_after)
+
+    def test_search_and_filters(self):
+        response = self.client.get(self.url, {"q": "+91 90000 0001"})
+        self.assertEqual(
+            sorted(str(obj.phone) for obj in response.context["cl"].result_list),
+            [f"+9190000000{i}" for i in range(10, 20)],
+        )
+        response = self.client.get(self.url, {"country_code": "44"})
+        (phone,) = response.context["cl"].result_list
+        self.assertEqual(str(phone.phone), "+447911123456")
+        response = self.client.get(self.url, {"is_verified__exact": "1"})
+        self.assertEqual(len(response.context["cl"].result_list), 1)
+
+        url = reverse("admin:phone_auth_emailaddress_changelist")
+        response = self.client.get(url, {"q": "USER2"})
+        self.assertEqual(len(response.context["cl"].result_list), 11)
+
+        # Nothing but digits can match a phone number: no query for the rows.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {"q": "+ abc"})
+        self.assertEqual(list(response.context["cl"].result_list), [])
+        self.assertFalse(
+            any("phone_auth_phonenumber" in query["sql"] for query in queries)
+        )
+
+    def test_filtered_counts_are_capped_on_large_tables(self):
+        with mock.patch(
+            "phone_auth.admin.estimated_count", return_value=10**7
+        ), mock.patch.object(EstimatedCountPaginator, "count_cap", 5):
+            response = self.client.get(self.url)
+            self.assertEqual(response.context["cl"].result_count, 10**7)
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.url, {"q": "+91"})
+            self.assertEqual(response.context["cl"].result_count, 5)
+            self.assertTrue(
+                any(
+                    "COUNT(*)" in query["sql"] and "LIMIT 5" in query["sql"]
+                    for query in queries
+                )
+            )
+
+    @override_settings(SIGNAL_DISPATCH="outbox", CONTACT_STATUS_CACHE_TIMEOUT=300)
+    def test_actions(self):
+        pks = list(PhoneNumber.objects.values_list("pk", flat=True)[:5])
+        user_id = PhoneNumber.objects.get(pk=pks[0]).user_id
+        cache.set(contact_status_cache_key(user_id), (False, False))
+
+        data = {"action": "mark_verified", "_selected_action": pks}
+        with self.assertNumQueries(6):
+            # Session, user, changelist page and count, then the users of
+            # the selection and a single update
+            self.client.post(self.url, data)
+        self.assertEqual(
+            PhoneNumber.objects.filter(pk__in=pks, is_verified=True).count(), 5
+        )
+        self.assertIsNone(cache.get(contact_status_cache_key(user_id)))
+
+        data["action"] = "mark_unverified"
+        self.client.post(self.url, data)
+        self.assertFalse(PhoneNumber.objects.filter(pk__in=pks, is_verified=True))
+
+        data["action"] = "resend_verification"
+        self.client.post(self.url, data)
+        self.assertEqual(OutboxMessage.objects.filter(signal="verify_phone").count(), 5)
+
+
+class VerificationCampaignTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            user = User.objects.create(username=f"user{i}")
+            PhoneNumber.objects.create(
+                user=user, phone=f"+91900000000{i}", is_verified=i == 0
+            )
+            EmailAddress.objects.create(user=user, email=f"user{i}@example.com")
+        inactive = User.objects.create(username="inactive", is_active=False)
+        PhoneNumber.objects.create(user=inactive, phone="+919000000009")
+
+    def setUp(self):
+        locmem.outbox.clear()
+        self.addCleanup(close_backends)
+
+    @override_settings(
+        DELIVERY_BACKENDS={
+            "sms": {"BACKEND": "phone_auth.delivery.locmem.DeliveryBackend"}
+        },
+    )
+    def test_campaign(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            options = {
+                "contacts": "phone",
+                "chunk_size": 3,
+                "batch_size": 2,
+                "checkpoint": os.path.join(tmp, "campaign.json"),
+                "stdout": StringIO(),
+            }
+            call_command("phone_auth_verification_campaign", **options)
+            self.assertEqual(
+                sorted(message.to for message in locmem.outbox),
+                [f"+91900000000{i}" for i in range(1, 5)],
+            )
+            self.assertIn("/accounts/user_verification_confirm/", locmem.outbox[0].body)
+
+            # Resuming from the checkpoint sends nothing again
+            call_command("phone_auth_verification_campaign", **options)
+            self.assertEqual(len(locmem.outbox), 4)
+
+    @override_settings(SIGNAL_DISPATCH="outbox")
+    def test_campaign_outbox(self):
+        with self.assertNumQueries(4):
+            call_command(
+                "phone_auth_verification_campaign", batch_size=10, stdout=StringIO()
+            )
+        self.assertEqual(OutboxMessage.objects.filter(signal="verify_phone").count(), 4)
+        self.assertEqual(OutboxMessage.objects.filter(signal="verify_email").count(), 5)
+
+    def test_rate(self):
+        with mock.patch("time.sleep") as sleep:
+            call_command(
+                "phone_auth_verification_campaign",
+                contacts="email",
+                rate=2,
+                stdout=StringIO(),
+            )
+        # Batches are capped at 2 messages, and all but the first wait
+        self.assertEqual(sleep.call_count, 2)
+
+
+class AddIndexConcurrentlyTests(TransactionTestCase):
+    def setUp(self):
+        self.operation = AddIndexConcurrently(
+            "emailaddress",
+            models.Index(fields=["is_verified"], name="phone_auth_test_idx"),
+        )
+        self.from_state = ProjectState.from_apps(apps)
+        self.to_state = self.from_state.clone()
+        self.operation.state_forwards("phone_auth", self.to_state)
+
+    def index_names(self):
+        with connection.cursor() as cursor:
+            return set(
+                connection.introspection.get_constraints(
+                    cursor, EmailAddress._meta.db_table
+                )
+            )
+
+    def test_apply_and_reverse(self):
+        with connection.schema_editor(atomic=False) as editor:
+            self.operation.database_forwards(
+                "phone_auth", editor, self.from_state, self.to_state
+            )
+        self.assertIn("phone_auth_test_idx", self.index_names())
+
+        with connection.schema_editor(atomic=False) as editor:
+            self.operation.database_backwards(
+                "phone_auth", editor, self.to_state, self.from_state
+            )
+        self.assertNotIn("phone_auth_test_idx", self.index_names())
+
+    def test_concurrently_on_postgresql(self):
+        editor = mock.Mock(connection=mock.Mock(vendor="postgresql"))
+        editor.connection.in_atomic_block = False
+        self.operation.database_forwards(
+            "phone_auth", editor, self.from_state, self.to_state
+        )
+        editor.add_index.assert_called_once_with(
+            mock.ANY, self.operation.index, concurrently=True
+        )
+        self.operation.database_backwards(
+            "phone_auth", editor, self.to_state, self.from_state
+        )
+        editor.remove_index.assert_called_once_with(
+            mock.ANY, self.operation.index, concurrently=True
+        )
+
+        editor.connection.in_atomic_block = True
+        with self.assertRaises(NotSupportedError):
+            self.operation.database_forwards(
+                "phone_auth", editor, self.from_state, self.to_state
+            )
+
+
+class IntegrityErrorMappingTests(SimpleTestCase):
+    fields = {
+        "phone": (PhoneNumber, "phone"),
+        "email": (EmailAddress, "email"),
+        "username": (User, "username"),
+    }
+
+    def test_sqlite(self):
+        exc = IntegrityError("UNIQUE constraint failed: phone_auth_phonenumber.phone")
+        self.assertEqual(unique_violation_field(exc, self.fields), "phone")
+        exc = IntegrityError(
+            "UNIQUE constraint failed: index 'phone_auth_emailaddress_email_uniq'"
+        )
+        self.assertEqual(unique_violation_field(exc, self.fields), "email")
+        exc = IntegrityError("UNIQUE constraint failed: auth_user.username")
+        self.assertEqual(unique_violation_field(exc, self.fields), "username")
+        exc = IntegrityError(
+            "UNIQUE constraint failed: phone_auth_phonenumber.country_code, "
+            "phone_auth_phonenumber.national_number"
+        )
+        self.assertEqual(unique_violation_field(exc, self.fields), "phone")
+
+    def test_postgresql(self):
+        class Diag:
+            constraint_name = "auth_user_username_key"
+            table_name = "auth_user"
+            message_detail = "Key (username)=(test) already exists."
+
+        class DriverError(Exception):
+            diag = Diag()
+
+        exc = IntegrityError("duplicate key value violates unique constraint")
+        exc.__cause__ = DriverError()
+        self.assertIn("auth_user.username", violated_constraint_names(exc))
+        self.assertEqual(unique_violation_field(exc, self.fields), "username")
+
+        Diag.constraint_name = "phone_auth_emailaddress_email_uniq"
+        Diag.table_name = "phone_auth_emailaddress"
+        Diag.message_detail = "Key (lower(email::text))=(a@b.com) already exists."
+        self.assertEqual(unique_violation_field(exc, self.fields), "email")
+
+    def test_mysql(self):
+        exc = IntegrityError(
+            1062,
+            "Duplicate entry '+919876543210' for key "
+            "'phone_auth_phonenumber.phone_auth_phonenumber_phone_uniq'",
+        )
+        self.assertEqual(unique_violation_field(exc, self.fields), "phone")
+        exc = IntegrityError(1062, "Duplicate entry 'test' for key 'username'")
+        self.assertEqual(unique_violation_field(exc, self.fields), "username")
+        # MariaDB: the column fallback of the LOWER(email) constraint.
+        exc = IntegrityError(
+            1062,
+            "Duplicate entry 'a@b.com' for key "
+            "'phone_auth_emailaddress_email_exact_uniq'",
+        )
+        self.assertEqual(unique_violation_field(exc, self.fields), "email")
+
+    def test_unknown(self):
+        exc = IntegrityError("NOT NULL constraint failed: auth_user.password")
+        self.assertIsNone(unique_violation_field(exc, self.fields))
+
+
+@override_settings(REPLICA_DATABASES=["replica"])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        for var in (routers._pinned, routers._written):
+            self.addCleanup(var.reset, var.set(False))
+
+    def test_reads_go_to_replicas_until_a_write(self):
+        self.assertEqual(self.router.db_for_read(PhoneNumber), "replica")
+        self.assertEqual(self.router.db_for_read(User), "replica")
+        self.assertIsNone(self.router.db_for_read(Session))
+
+        self.assertEqual(self.router.db_for_write(PhoneNumber), "default")
+        self.assertEqual(self.router.db_for_read(EmailAddress), "default")
+
+        with override_settings(REPLICA_DATABASES=[]):
+            self.assertIsNone(self.router.db_for_read(PhoneNumber))
+            self.assertIsNone(self.router.db_for_write(PhoneNumber))
+
+    def test_pinned_block(self):
+        with pinned():
+            self.assertEqual(self.router.db_for_read(PhoneNumber), "default")
+        self.assertEqual(self.router.db_for_read(PhoneNumber), "replica")
+
+    def test_migrations_skip_replicas(self):
+        self.assertIs(self.router.allow_migrate("replica", "phone_auth"), False)
+        self.assertIsNone(self.router.allow_migrate("default", "phone_auth"))
+
+    def test_middleware_pins_the_client_after_a_write(self):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(PhoneNumber))
+            if request.method == "POST":
+                self.router.db_for_write(PhoneNumber)
+            return HttpResponse()
+
+        middleware = PrimaryPinningMiddleware(view)
+        factory = RequestFactory()
+
+        response = middleware(factory.post("/"))
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 10)
+
+        request = factory.get("/")
+        request.COOKIES[PIN_COOKIE] = "1"
+        response = middleware(request)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        middleware(factory.get("/"))
+        self.assertEqual(reads, ["replica", "default", "replica"])
+
+
+class AppSettingsTests(SimpleTestCase):
+    def test_snapshot(self):
+        self.assertIsInstance(app_settings.AUTHENTICATION_METHODS, frozenset)
+        with self.assertRaises(AttributeError):
+            app_settings.LOGIN_REDIRECT_URL = "/"
+        with self.assertRaises(TypeError):
+            app_settings.LOGIN_THROTTLE_RATES["ip"] = "1/m"
+
+        with override_settings(REGISTER_EMAIL_REQUIRED=False):
+            self.assertIs(app_settings.REGISTER_EMAIL_REQUIRED, False)
+            self.assertFalse(PhoneRegisterForm().fields["email"].required)
+        self.assertIs(app_settings.REGISTER_EMAIL_REQUIRED, True)
+        self.assertTrue(PhoneRegisterForm().fields["email"].required)
+
+    def test_checks(self):
+        self.assertEqual(check_settings(None), [])
+        with override_settings(AUTHENTICATION_METHODS=set(), SIGNAL_DISPATCH="celery"):
+            errors = check_settings(None)
+        self.assertEqual(
+            [error.id for error in errors], ["phone_auth.E001", "phone_auth.E003"]
+        )
+        with override_settings(AUTHENTICATION_METHODS={"phone", "nickname"}):
+            (error,) = check_settings(None)
+        self.assertEqual(error.id, "phone_auth.E002")
+
+
+class SlidingWindowCounterTests(SimpleTestCase):
+    def test_retry_after(self):
+        counter = SlidingWindowCounter("key", "10/m")
+        now = 60 * 100 + 15
+        current_key, previous_key, elapsed = counter.keys(now)
+        self.assertEqual(elapsed, 15)
+
+        self.assertEqual(counter.retry_after({}, now), 0)
+        self.assertEqual(counter.retry_after({current_key: 9}, now), 0)
+        self.assertEqual(counter.retry_after({current_key: 10}, now), 46)
+        self.assertEqual(counter.retry_after({current_key: 20}, now), 76)
+        # 4 + 8 * 0.75 = 10 attempts in the sliding window
+        counts = {current_key: 4, previous_key: 8}
+        self.assertEqual(counter.retry_after(counts, now), 1)
+        counts = {current_key: 2, previous_key: 12}
+        self.assertEqual(counter.retry_after(counts, now), 6)
+
+
+class IdentifierClassificationTests(SimpleTestCase):
+    def test_classify(self):
+        identifier = classify(" +919876543210 ")
+        self.assertEqual(identifier.kind, AuthenticationMethod.PHONE)
+        self.assertEqual(identifier.value, "+919876543210")
+        self.assertEqual(identifier.raw, "+919876543210")
+
+        identifier = classify("Someone@Example.com")
+        self.assertEqual(identifier.kind, AuthenticationMethod.EMAIL)
+        self.assertEqual(identifier.value, "someone@example.com")
+
+        identifier = classify("some.user_name")
+        self.assertEqual(identifier.kind, AuthenticationMethod.USERNAME)
+        self.assertEqual(identifier.value, "some.user_name")
+
+        self.assertIsNone(classify(""))
+        self.assertIsNone(classify(None))
+        self.assertIsNone(classify("not a valid login!"))
+        self.assertIsNone(classify("+91987"))
+
+    def test_classify_phone_like_the_form(self):
+        values = [
+            "+919876543210",
+            "+91 98765-43210",
+            "(+91) 98765 43210",
+            "tel:+919876543210",
+            "tel:+1-800-356-9377;ext=12",
+            "+1-800-FLOWERS",
+            "+91 98765 43210 ext. 5",
+            "\uff0b\uff19\uff11\uff19\uff18\uff17\uff16\uff15\uff14\uff13\uff12\uff11\uff10",
+            "+91987",
+            "user9876543210",
+            "test",
+            "someone@example.com",
+        ]
+        for value in values:
+            with self.subTest(value=value):
+                form = PhoneValidationForm({"phone": value})
+                identifier = classify(value, {AuthenticationMethod.PHONE})
+                if form.is_valid():
+                    self.assertEqual(
+                        identifier.value, form.cleaned_data["phone"].as_e164
+                    )
+                else:
+                    self.assertIsNone(identifier)
+        self.assertEqual(classify("tel:+919876543210").value, "+919876543210")
+        self.assertEqual(classify("+1-800-FLOWERS").value, "+18003569377")
+
+    def test_classify_with_methods(self):
+        methods = {AuthenticationMethod.EMAIL, AuthenticationMethod.USERNAME}
+        self.assertIsNone(classify("+919876543210", methods))
+        self.assertEqual(
+            classify("someone@example.com", methods).kind, AuthenticationMethod.EMAIL
+        )
+        self.assertIsNone(classify("test", {AuthenticationMethod.PHONE}))
+
+    def test_parse_phone_is_memoized(self):
+        self.assertIs(parse_phone("+919876543210"), parse_phone("+919876543210"))
+        self.assertIsNone(parse_phone("+91987"))